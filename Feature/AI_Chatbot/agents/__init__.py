@@ -1,10 +1,24 @@
 """AI Chatbot Agents"""
 
-from .router_agent import RouterAgent
-from .transaction_analyst import TransactionAnalystAgent
-from .budget_advisor import BudgetAdvisorAgent
-from .spending_insights import SpendingInsightsAgent
-from .goal_tracker import GoalTrackerAgent
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .router_agent import RouterAgent
+    from .transaction_analyst import TransactionAnalystAgent
+    from .budget_advisor import BudgetAdvisorAgent
+    from .spending_insights import SpendingInsightsAgent
+    from .goal_tracker import GoalTrackerAgent
+
+# Agents pull in the Gemini SDK; import them on first access so that
+# importing the package (e.g. for agents.shared) stays cheap
+_LAZY_EXPORTS = {
+    'RouterAgent': '.router_agent',
+    'TransactionAnalystAgent': '.transaction_analyst',
+    'BudgetAdvisorAgent': '.budget_advisor',
+    'SpendingInsightsAgent': '.spending_insights',
+    'GoalTrackerAgent': '.goal_tracker'
+}
 
 __all__ = [
     'RouterAgent',
@@ -13,3 +27,11 @@ __all__ = [
     'SpendingInsightsAgent',
     'GoalTrackerAgent'
 ]
+
+
+def __getattr__(name: str):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
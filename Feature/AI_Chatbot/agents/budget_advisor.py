@@ -3,20 +3,15 @@ Budget Advisor Agent
 Tracks budget utilization, burn rate, projections
 """
 
-import logging
-from typing import Dict, Any
-from .shared import UserContext, QueryOptions, AgentResponse, FileSearchClient
+from .shared import UserContext, QueryOptions, AgentResponse, SpecialistAgent
 
-logger = logging.getLogger(__name__)
 
-
-class BudgetAdvisorAgent:
+class BudgetAdvisorAgent(SpecialistAgent):
     """Agent specialized in budget tracking and advice"""
     
-    def __init__(self, file_search_client: FileSearchClient):
-        self.client = file_search_client
-        self.name = "BudgetAdvisor"
-        logger.info(f"Initialized {self.name}")
+    name = "BudgetAdvisor"
+    query_type = "budget_analysis"
+    confidence = 0.9
     
     def advise(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
         """
@@ -30,8 +25,14 @@ class BudgetAdvisorAgent:
         Returns:
             AgentResponse with advice
         """
-        logger.info(f"[{self.name}] Advising: {query}")
-        
+        return self.run(user_context, query, options)
+    
+    async def aadvise(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
+        """Async variant of advise()"""
+        return await self.arun(user_context, query, options)
+    
+    def build_query(self, user_context: UserContext, query: str) -> str:
+        """Wrap the query in the BudgetAdvisor prompt"""
         # Enhance query for budget-specific analysis
         if user_context.language == "vi":
             enhanced_query = f"""Phân tích ngân sách - TRẢ LỜI NGẮN GỌN.
@@ -61,37 +62,4 @@ Use budgets.json for budget amounts and transactions CSV for actual spending.
 Be specific with numbers and percentages.
 """
         
-        try:
-            result = self.client.query(
-                user_context=user_context,
-                query_text=enhanced_query,
-                options=options
-            )
-            
-            if result['success']:
-                return AgentResponse(
-                    success=True,
-                    agent=self.name,
-                    response=result['result'],
-                    confidence=0.9,
-                    metadata={
-                        "query_type": "budget_analysis",
-                        "stores_queried": result.get('stores', [])
-                    }
-                )
-            else:
-                return AgentResponse(
-                    success=False,
-                    agent=self.name,
-                    response="",
-                    error=result.get('error', 'Unknown error')
-                )
-        
-        except Exception as e:
-            logger.error(f"[{self.name}] Error: {e}")
-            return AgentResponse(
-                success=False,
-                agent=self.name,
-                response="",
-                error=str(e)
-            )
+        return enhanced_query
@@ -7,14 +7,13 @@ Use this file to test and debug the GuardAgent and other agents.
 import os
 import sys
 from typing import List, Dict, Any
-from dotenv import load_dotenv
 
-# Add current directory to path for imports
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Add AI_Chatbot directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from guard_agent import GuardAgent
-from utils import get_chatbot_response_gemini
-from google import genai
+from agents.guard_agent import GuardAgent
+from agents.utils import get_chatbot_response_gemini
+from agents.shared.genai_client import get_client
 
 class AgentTester:
     """
@@ -32,16 +31,13 @@ class AgentTester:
             print(f"❌ Failed to initialize GuardAgent: {e}")
             self.guard_agent = None
 
-        # Initialize Gemini client for direct testing
+        # Shared Gemini client for direct testing
         try:
-            load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
-            api_key = os.getenv("GEMINI_API_KEY")
-            if api_key:
-                self.gemini_client = genai.Client(api_key=api_key)
-                print("✅ Gemini client initialized successfully")
-            else:
-                print("❌ GEMINI_API_KEY not found")
-                self.gemini_client = None
+            self.gemini_client = get_client()
+            print("✅ Gemini client initialized successfully")
+        except ValueError:
+            print("❌ GEMINI_API_KEY not found")
+            self.gemini_client = None
         except Exception as e:
             print(f"❌ Failed to initialize Gemini client: {e}")
             self.gemini_client = None
@@ -3,20 +3,15 @@ Goal Tracker Agent
 Tracks financial goals, progress, and provides recommendations
 """
 
-import logging
-from typing import Dict, Any
-from .shared import UserContext, QueryOptions, AgentResponse, FileSearchClient
+from .shared import UserContext, QueryOptions, AgentResponse, SpecialistAgent
 
-logger = logging.getLogger(__name__)
 
-
-class GoalTrackerAgent:
+class GoalTrackerAgent(SpecialistAgent):
     """Agent specialized in financial goal tracking"""
     
-    def __init__(self, file_search_client: FileSearchClient):
-        self.client = file_search_client
-        self.name = "GoalTracker"
-        logger.info(f"Initialized {self.name}")
+    name = "GoalTracker"
+    query_type = "goal_tracking"
+    confidence = 0.9
     
     def track(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
         """
@@ -30,8 +25,14 @@ class GoalTrackerAgent:
         Returns:
             AgentResponse with goal tracking info
         """
-        logger.info(f"[{self.name}] Tracking: {query}")
-        
+        return self.run(user_context, query, options)
+    
+    async def atrack(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
+        """Async variant of track()"""
+        return await self.arun(user_context, query, options)
+    
+    def build_query(self, user_context: UserContext, query: str) -> str:
+        """Wrap the query in the GoalTracker prompt"""
         # Enhance query for goal tracking
         if user_context.language == "vi":
             enhanced_query = f"""Theo dõi mục tiêu - TRẢ LỜI NGẮN GỌN.
@@ -62,37 +63,4 @@ Use goals.json for goal details and income data from transactions.
 Be encouraging but realistic.
 """
         
-        try:
-            result = self.client.query(
-                user_context=user_context,
-                query_text=enhanced_query,
-                options=options
-            )
-            
-            if result['success']:
-                return AgentResponse(
-                    success=True,
-                    agent=self.name,
-                    response=result['result'],
-                    confidence=0.9,
-                    metadata={
-                        "query_type": "goal_tracking",
-                        "stores_queried": result.get('stores', [])
-                    }
-                )
-            else:
-                return AgentResponse(
-                    success=False,
-                    agent=self.name,
-                    response="",
-                    error=result.get('error', 'Unknown error')
-                )
-        
-        except Exception as e:
-            logger.error(f"[{self.name}] Error: {e}")
-            return AgentResponse(
-                success=False,
-                agent=self.name,
-                response="",
-                error=str(e)
-            )
+        return enhanced_query
@@ -3,53 +3,24 @@ Guard Agent - Content filtering for personal finance chatbot
 Filters out non-finance related queries
 """
 
-import os
 import json
 import logging
 import re
-from typing import Dict, Any
-from dotenv import load_dotenv
-from google import genai
+from typing import Dict, Any, Optional
+from google.genai import types
 
-load_dotenv()
+from .shared.cassette import get_model_client
+from .shared.deadline import LatencyTracker, acall_with_deadline, call_with_deadline, is_timeout
+from .shared.genai_client import with_timeout
+from .shared.tracing import tracer
+from .shared.usage import record_usage
 
 logger = logging.getLogger(__name__)
 
-
-class GuardAgent:
-    """
-    Guard Agent for filtering user queries.
-    Only allows personal finance-related questions.
-    """
-    
-    def __init__(self, model_name: str = "gemini-2.5-flash"):
-        """
-        Initialize GuardAgent with Gemini client
-        
-        Args:
-            model_name: Gemini model for filtering
-        """
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment")
-        
-        self.client = genai.Client(api_key=api_key)
-        self.model_name = model_name
-        
-        logger.info(f"Initialized GuardAgent with model {model_name}")
-    
-    def filter_message(self, user_input: str) -> Dict[str, Any]:
-        """
-        Filter user message to check if finance-related
-        
-        Args:
-            user_input: User's query
-        
-        Returns:
-            Dict with decision, reason, and message
-        """
-        # System prompt for filtering
-        system_prompt = """
+# Static scope rules shared by the filter and the pre-flight call.
+# Sent once per request as a system instruction instead of being
+# concatenated into the user content.
+_SCOPE_RULES = """
 Bạn là một bộ lọc nội dung cho ứng dụng quản lý tài chính cá nhân tiếng Việt.
 Nhiệm vụ: Xác định câu hỏi có LIÊN QUAN đến quản lý tài chính cá nhân hay không.
 
@@ -83,67 +54,262 @@ LƯU Ý QUAN TRỌNG:
 - "Thời tiết hôm nay?" → NOT ALLOWED (hoàn toàn không liên quan)
 - "Chuyến du lịch Nha Trang tốn bao nhiêu?" → ALLOWED (hỏi về CHI PHÍ)
 - "xin chào", "hi", "hello" → ALLOWED (chào hỏi lịch sự)
+"""
 
+GUARD_SYSTEM_PROMPT = _SCOPE_RULES + """
 Trả về JSON (KHÔNG thêm text nào khác):
 {
   "decision": "allowed" hoặc "not allowed",
   "reason": "Lý do ngắn gọn (tiếng Việt)"
 }
 """
+
+PREFLIGHT_SYSTEM_PROMPT = _SCOPE_RULES + """
+Ngoài quyết định, hãy phân loại câu hỏi:
+- intent: "budget" (ngân sách, vượt/còn lại), "goals" (mục tiêu, tiết kiệm, quỹ dự phòng),
+  "insights" (xu hướng, so sánh, bất thường), "transactions" (giao dịch, số tiền cụ thể, mặc định)
+- period: tháng được hỏi dạng YYYY-MM, hoặc chuỗi rỗng nếu không nói rõ
+- language: "vi" nếu câu hỏi bằng tiếng Việt, "en" nếu bằng tiếng Anh
+"""
+
+INTENTS = ("transactions", "budget", "goals", "insights")
+
+PREFLIGHT_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "decision": types.Schema(type=types.Type.STRING, enum=["allowed", "not allowed"]),
+        "reason": types.Schema(type=types.Type.STRING),
+        "intent": types.Schema(type=types.Type.STRING, enum=list(INTENTS)),
+        "period": types.Schema(type=types.Type.STRING),
+        "language": types.Schema(type=types.Type.STRING, enum=["vi", "en"]),
+    },
+    required=["decision", "reason", "intent", "period", "language"],
+)
+
+
+class GuardAgent:
+    """
+    Guard Agent for filtering user queries.
+    Only allows personal finance-related questions.
+    """
+    
+    def __init__(self, model_name: str = "gemini-2.5-flash"):
+        """
+        Initialize GuardAgent with Gemini client
         
-        try:
-            # Call Gemini API
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=f"{system_prompt}\n\nCâu hỏi người dùng: {user_input}",
-                config={"temperature": 0}
-            )
+        Args:
+            model_name: Gemini model for filtering
+        """
+        self.client = get_model_client()
+        self.model_name = model_name
+        
+        # Request configs are static, build them once
+        self._filter_config = types.GenerateContentConfig(
+            system_instruction=GUARD_SYSTEM_PROMPT,
+            temperature=0
+        )
+        self._preflight_config = types.GenerateContentConfig(
+            system_instruction=PREFLIGHT_SYSTEM_PROMPT,
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=PREFLIGHT_SCHEMA
+        )
+        
+        # Per-call latency history: sets the hedge delay (shared/deadline.py)
+        self._filter_latency = LatencyTracker('guard.filter')
+        self._preflight_latency = LatencyTracker('guard.preflight')
+        
+        logger.info(f"Initialized GuardAgent with model {model_name}")
+    
+    def filter_message(self, user_input: str) -> Dict[str, Any]:
+        """
+        Filter user message to check if finance-related
+        
+        Args:
+            user_input: User's query
+        
+        Returns:
+            Dict with decision, reason, and message
+        """
+        with tracer.span('guard.filter', model=self.model_name) as span:
+            try:
+                # Call Gemini API
+                response = call_with_deadline(
+                    lambda timeout: self.client.models.generate_content(
+                        **self._request(user_input, self._filter_config, timeout)
+                    ),
+                    self._filter_latency
+                )
+                verdict = self._filter_verdict(response)
             
-            response_text = response.text.strip()
+            except Exception as e:
+                verdict = self._error_verdict(e)
             
-            # Parse JSON response
+            return self._finish(span, verdict)
+    
+    async def afilter_message(self, user_input: str) -> Dict[str, Any]:
+        """Async variant of filter_message()"""
+        with tracer.span('guard.filter', model=self.model_name) as span:
             try:
-                # Try direct parsing
-                result = json.loads(response_text)
-            except json.JSONDecodeError:
-                # Extract JSON from markdown or mixed text
-                json_match = re.search(r'\{[^{}]*\}', response_text, re.DOTALL)
-                if json_match:
-                    try:
-                        result = json.loads(json_match.group(0))
-                    except json.JSONDecodeError:
-                        # Fallback: reject if can't parse
-                        logger.warning(f"JSON parse failed: {response_text[:100]}")
-                        return {
-                            "decision": "not allowed",
-                            "reason": f"Parse error: {response_text[:50]}..."
-                        }
-                else:
-                    # No JSON found
-                    logger.warning(f"No JSON in response: {response_text[:100]}")
+                response = await acall_with_deadline(
+                    lambda timeout: self.client.aio.models.generate_content(
+                        **self._request(user_input, self._filter_config, timeout)
+                    ),
+                    self._filter_latency
+                )
+                verdict = self._filter_verdict(response)
+            
+            except Exception as e:
+                verdict = self._error_verdict(e)
+            
+            return self._finish(span, verdict)
+    
+    def _request(self, user_input: str, config: types.GenerateContentConfig, timeout: Optional[float]) -> Dict[str, Any]:
+        """generate_content arguments shared by the sync and async calls"""
+        return {
+            "model": self.model_name,
+            "contents": f"Câu hỏi người dùng: {user_input}",
+            "config": with_timeout(config, timeout)
+        }
+    
+    def _filter_verdict(self, response: Any) -> Dict[str, Any]:
+        """Record the filter call's token usage and parse its verdict"""
+        record_usage(response.usage_metadata, self.model_name, agent='GuardAgent')
+        return self._parse_filter_response(response.text)
+    
+    def _finish(self, span: Any, verdict: Dict[str, Any]) -> Dict[str, Any]:
+        """Tag the span with the verdict fields it has and return it"""
+        span.set(**{key: verdict[key] for key in ("decision", "intent", "timed_out") if key in verdict})
+        return verdict
+    
+    def _parse_filter_response(self, response_text: str) -> Dict[str, Any]:
+        """Parse the free-form JSON verdict, rejecting anything malformed"""
+        response_text = response_text.strip()
+        
+        # Parse JSON response
+        try:
+            # Try direct parsing
+            result = json.loads(response_text)
+        except json.JSONDecodeError:
+            # Extract JSON from markdown or mixed text
+            json_match = re.search(r'\{[^{}]*\}', response_text, re.DOTALL)
+            if json_match:
+                try:
+                    result = json.loads(json_match.group(0))
+                except json.JSONDecodeError:
+                    # Fallback: reject if can't parse
+                    logger.warning(f"JSON parse failed: {response_text[:100]}")
                     return {
                         "decision": "not allowed",
-                        "reason": "No valid JSON response"
+                        "reason": f"Parse error: {response_text[:50]}..."
                     }
-            
-            # Validate result
-            if "decision" not in result:
-                logger.warning(f"No 'decision' field in: {result}")
+            else:
+                # No JSON found
+                logger.warning(f"No JSON in response: {response_text[:100]}")
                 return {
                     "decision": "not allowed",
-                    "reason": "Invalid response format"
+                    "reason": "No valid JSON response"
                 }
-            
-            logger.debug(f"Filter result: {result['decision']} - {result.get('reason', '')}")
-            return result
         
-        except Exception as e:
-            # On error, reject to be safe
-            logger.error(f"GuardAgent error: {e}")
+        # Validate result
+        if "decision" not in result:
+            logger.warning(f"No 'decision' field in: {result}")
             return {
                 "decision": "not allowed",
-                "reason": f"Error: {str(e)}"
+                "reason": "Invalid response format"
             }
+        
+        logger.debug(f"Filter result: {result['decision']} - {result.get('reason', '')}")
+        return result
+    
+    def _error_verdict(self, error: Exception) -> Dict[str, Any]:
+        # On error, reject to be safe
+        logger.error(f"GuardAgent error: {error}")
+        tracer.current().set(error=type(error).__name__)
+        return {
+            "decision": "not allowed",
+            "reason": f"Error: {str(error)}",
+            "timed_out": is_timeout(error)
+        }
+    
+    def preflight(self, user_input: str) -> Dict[str, Any]:
+        """
+        Single structured call returning the guard verdict and routing hints
+        
+        The response schema guarantees well-formed JSON, so no text
+        fallback parsing is needed.
+        
+        Args:
+            user_input: User's query
+        
+        Returns:
+            Dict with decision, reason, intent, period (YYYY-MM or '') and language
+        """
+        with tracer.span('guard.preflight', model=self.model_name) as span:
+            try:
+                response = call_with_deadline(
+                    lambda timeout: self.client.models.generate_content(
+                        **self._request(user_input, self._preflight_config, timeout)
+                    ),
+                    self._preflight_latency
+                )
+                verdict = self._preflight_verdict(response)
+            
+            except Exception as e:
+                verdict = self._error_preflight(e)
+            
+            return self._finish(span, verdict)
+    
+    async def apreflight(self, user_input: str) -> Dict[str, Any]:
+        """Async variant of preflight()"""
+        with tracer.span('guard.preflight', model=self.model_name) as span:
+            try:
+                response = await acall_with_deadline(
+                    lambda timeout: self.client.aio.models.generate_content(
+                        **self._request(user_input, self._preflight_config, timeout)
+                    ),
+                    self._preflight_latency
+                )
+                verdict = self._preflight_verdict(response)
+            
+            except Exception as e:
+                verdict = self._error_preflight(e)
+            
+            return self._finish(span, verdict)
+    
+    def _preflight_verdict(self, response: Any) -> Dict[str, Any]:
+        """Record the pre-flight call's token usage and read its verdict"""
+        record_usage(response.usage_metadata, self.model_name, agent='GuardAgent')
+        result = response.parsed
+        if not isinstance(result, dict):
+            result = json.loads(response.text)
+        return self._normalize_preflight(result)
+    
+    def _error_preflight(self, error: Exception) -> Dict[str, Any]:
+        # Same rejection as the filter, with default routing hints
+        return {
+            **self._error_verdict(error),
+            "intent": "transactions",
+            "period": "",
+            "language": "vi"
+        }
+    
+    def _normalize_preflight(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Clamp pre-flight fields to known values"""
+        intent = result.get("intent")
+        period = result.get("period") or ""
+        language = result.get("language")
+        
+        normalized = {
+            "decision": result.get("decision", "not allowed"),
+            "reason": result.get("reason", ""),
+            "intent": intent if intent in INTENTS else "transactions",
+            "period": period if re.fullmatch(r"\d{4}-\d{2}", period) else "",
+            "language": language if language in ("vi", "en") else "vi"
+        }
+        
+        logger.debug(f"Preflight result: {normalized}")
+        return normalized
     
     def is_allowed(self, user_input: str) -> bool:
         """
@@ -158,6 +324,11 @@ Trả về JSON (KHÔNG thêm text nào khác):
         result = self.filter_message(user_input)
         return result.get("decision") == "allowed"
     
+    async def ais_allowed(self, user_input: str) -> bool:
+        """Async variant of is_allowed()"""
+        result = await self.afilter_message(user_input)
+        return result.get("decision") == "allowed"
+    
     def get_rejection_message(self, language: str = "vi") -> str:
         """
         Get rejection message in specified language
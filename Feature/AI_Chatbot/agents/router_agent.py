@@ -2,11 +2,19 @@
 Router Agent - Orchestrates query routing to specialist agents
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Generator, List, Optional, Tuple
 from datetime import datetime
 
-from .shared import UserContext, QueryOptions, AgentResponse, FileSearchClient
+from .shared import (
+    UserContext, QueryOptions, AgentResponse, FileSearchClient, IntentMatcher, SpecialistAgent, tracer
+)
+from .shared.streams import isolated_stream
+from .shared.usage import usage_scope
 from .transaction_analyst import TransactionAnalystAgent
 from .budget_advisor import BudgetAdvisorAgent
 from .spending_insights import SpendingInsightsAgent
@@ -14,29 +22,47 @@ from .goal_tracker import GoalTrackerAgent
 
 logger = logging.getLogger(__name__)
 
+# Specialist agent class per intent label
+SPECIALISTS = {
+    'budget': BudgetAdvisorAgent,
+    'goals': GoalTrackerAgent,
+    'insights': SpendingInsightsAgent,
+    'transactions': TransactionAnalystAgent
+}
+
 
 class RouterAgent:
     """
     Main orchestrator that routes queries to appropriate specialist agents
     """
     
-    def __init__(self, file_search_client: FileSearchClient):
+    def __init__(self, file_search_client: FileSearchClient, max_workers: int = 4):
+        """
+        Args:
+            file_search_client: Client shared by all specialist agents
+            max_workers: Thread pool size for multi-intent fan-out
+        """
         self.client = file_search_client
         self.name = "Router"
         
-        # Initialize specialist agents
-        self.transaction_analyst = TransactionAnalystAgent(file_search_client)
-        self.budget_advisor = BudgetAdvisorAgent(file_search_client)
-        self.spending_insights = SpendingInsightsAgent(file_search_client)
-        self.goal_tracker = GoalTrackerAgent(file_search_client)
+        # Shared pool for concurrent specialist calls (threads start lazily)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+        
+        # Keyword tables are compiled once per router
+        self.intent_matcher = IntentMatcher()
         
-        logger.info(f"Initialized {self.name} with 4 specialist agents")
+        # Specialist agents are created on first use
+        self._agents: Dict[str, SpecialistAgent] = {}
+        self._agents_lock = threading.Lock()
+        
+        logger.info(f"Initialized {self.name} with {len(SPECIALISTS)} specialist agents")
     
     def route_query(
         self,
         user_context: UserContext,
         query: str,
-        options: Optional[QueryOptions] = None
+        options: Optional[QueryOptions] = None,
+        intent: Optional[str] = None
     ) -> AgentResponse:
         """
         Route query to appropriate agent based on intent
@@ -45,6 +71,8 @@ class RouterAgent:
             user_context: User context
             query: User's natural language query
             options: Query options
+            intent: Pre-classified intent (e.g. from GuardAgent.preflight);
+                keyword matching is used when omitted
         
         Returns:
             AgentResponse from selected agent
@@ -54,87 +82,223 @@ class RouterAgent:
         
         logger.info(f"[{self.name}] Routing query: {query}")
         
-        # Classify intent
-        agent = self._classify_intent(query)
+        with tracer.span('router.route'):
+            intents, agents = self._select_agents(query, options, intent)
+            
+            if len(agents) == 1:
+                return self._run_agent(agents[0], user_context, query, options)
+            
+            # Fan out: latency is the slowest agent rather than the sum
+            futures = self._submit_agents(agents, user_context, query, options)
+            responses = [future.result() for future in futures]
+            
+            return self._merge_responses(intents, responses)
+    
+    async def aroute_query(
+        self,
+        user_context: UserContext,
+        query: str,
+        options: Optional[QueryOptions] = None,
+        intent: Optional[str] = None
+    ) -> AgentResponse:
+        """
+        Async variant of route_query(); fan-out uses asyncio.gather
+        instead of the thread pool
+        """
+        if options is None:
+            options = QueryOptions()
         
-        logger.info(f"[{self.name}] Selected agent: {agent.name}")
+        logger.info(f"[{self.name}] Routing query (async): {query}")
+        
+        with tracer.span('router.route'):
+            intents, agents = self._select_agents(query, options, intent)
+            
+            responses = await asyncio.gather(*[
+                self._arun_agent(agent, user_context, query, options)
+                for agent in agents
+            ])
+            
+            if len(responses) == 1:
+                return responses[0]
+            
+            return self._merge_responses(intents, list(responses))
+    
+    def route_query_stream(
+        self,
+        user_context: UserContext,
+        query: str,
+        options: Optional[QueryOptions] = None,
+        intent: Optional[str] = None
+    ) -> Generator[str, None, AgentResponse]:
+        """
+        Streaming variant of route_query()
+        
+        Single-agent answers are streamed chunk by chunk. Multi-intent
+        answers have to be merged, so they are yielded once when complete.
+        Returns the final AgentResponse when exhausted.
+        """
+        return isolated_stream(self._route_query_stream(user_context, query, options, intent))
+    
+    def _route_query_stream(
+        self,
+        user_context: UserContext,
+        query: str,
+        options: Optional[QueryOptions],
+        intent: Optional[str]
+    ) -> Generator[str, None, AgentResponse]:
+        if options is None:
+            options = QueryOptions()
+        
+        logger.info(f"[{self.name}] Routing query (stream): {query}")
+        
+        with tracer.span('router.route', stream=True):
+            intents, agents = self._select_agents(query, options, intent)
+            
+            if len(agents) == 1:
+                with tracer.span('router.agent', agent=agents[0].name), usage_scope(agent=agents[0].name):
+                    try:
+                        return (yield from agents[0].run_stream(user_context, query, options))
+                    except Exception as e:
+                        return self._routing_error(e)
+            
+            futures = self._submit_agents(agents, user_context, query, options)
+            response = self._merge_responses(intents, [future.result() for future in futures])
+            if response.success:
+                yield response.response
+            return response
+    
+    def _select_agents(
+        self,
+        query: str,
+        options: QueryOptions,
+        intent: Optional[str]
+    ) -> Tuple[List[str], List[SpecialistAgent]]:
+        """Resolve the intents to answer and their specialist agents"""
+        if intent:
+            intents = [intent]
+        else:
+            intents = self.intent_matcher.detect(query, limit=max(1, options.max_fan_out))
         
-        # Route to appropriate agent
-        try:
-            if isinstance(agent, BudgetAdvisorAgent):
-                return agent.advise(user_context, query, options)
-            elif isinstance(agent, GoalTrackerAgent):
-                return agent.track(user_context, query, options)
-            elif isinstance(agent, SpendingInsightsAgent):
-                return agent.analyze(user_context, query, options)
-            else:  # TransactionAnalystAgent (default)
-                return agent.analyze(user_context, query, options)
+        agents = [self._agent_for_intent(i) for i in intents]
+        logger.info(f"[{self.name}] Selected agents: {[agent.name for agent in agents]}")
+        tracer.current().set(intents=intents, classified=intent is None)
+        return intents, agents
+    
+    def _submit_agents(
+        self,
+        agents: List[SpecialistAgent],
+        user_context: UserContext,
+        query: str,
+        options: QueryOptions
+    ) -> List[Future]:
+        """Run agents on the thread pool, each in a copy of the caller's context (keeps trace parents)"""
+        return [
+            self.executor.submit(contextvars.copy_context().run, self._run_agent, agent, user_context, query, options)
+            for agent in agents
+        ]
+    
+    def _run_agent(
+        self,
+        agent: SpecialistAgent,
+        user_context: UserContext,
+        query: str,
+        options: QueryOptions
+    ) -> AgentResponse:
+        """Call a specialist agent, turning exceptions into a failed response"""
+        with tracer.span('router.agent', agent=agent.name), usage_scope(agent=agent.name):
+            try:
+                return agent.run(user_context, query, options)
+            except Exception as e:
+                return self._routing_error(e)
+    
+    async def _arun_agent(
+        self,
+        agent: SpecialistAgent,
+        user_context: UserContext,
+        query: str,
+        options: QueryOptions
+    ) -> AgentResponse:
+        """Async variant of _run_agent()"""
+        with tracer.span('router.agent', agent=agent.name), usage_scope(agent=agent.name):
+            try:
+                return await agent.arun(user_context, query, options)
+            except Exception as e:
+                return self._routing_error(e)
+    
+    def _routing_error(self, error: Exception) -> AgentResponse:
+        logger.error(f"[{self.name}] Routing error: {error}")
+        return AgentResponse(
+            success=False,
+            agent=self.name,
+            response="",
+            error=f"Failed to route query: {str(error)}"
+        )
+    
+    def _merge_responses(self, intents: List[str], responses: List[AgentResponse]) -> AgentResponse:
+        """Combine specialist answers into one response, one section per agent"""
+        succeeded = [r for r in responses if r.success]
         
-        except Exception as e:
-            logger.error(f"[{self.name}] Routing error: {e}")
+        if not succeeded:
             return AgentResponse(
                 success=False,
                 agent=self.name,
                 response="",
-                error=f"Failed to route query: {str(e)}"
+                metadata={"timed_out": any((r.metadata or {}).get("timed_out") for r in responses)},
+                error="; ".join(f"{r.agent}: {r.error}" for r in responses)
             )
+        
+        if len(succeeded) == 1:
+            sections = succeeded[0].response
+        else:
+            sections = "\n\n".join(f"[{r.agent}]\n{r.response}" for r in succeeded)
+        
+        return AgentResponse(
+            success=True,
+            agent="+".join(r.agent for r in succeeded),
+            response=sections,
+            confidence=min(r.confidence for r in succeeded),
+            metadata={
+                "query_type": "multi_intent",
+                "intents": intents,
+                "responses": [r.to_dict() for r in responses]
+            }
+        )
+    
+    def _agent_for_intent(self, intent: str) -> SpecialistAgent:
+        """Map an intent label to its specialist agent (created on first use)"""
+        if intent not in SPECIALISTS:
+            intent = 'transactions'
+        
+        agent = self._agents.get(intent)
+        if agent is None:
+            with self._agents_lock:
+                agent = self._agents.get(intent)
+                if agent is None:
+                    agent = SPECIALISTS[intent](self.client)
+                    self._agents[intent] = agent
+        return agent
+    
+    @property
+    def transaction_analyst(self) -> SpecialistAgent:
+        return self._agent_for_intent('transactions')
+    
+    @property
+    def budget_advisor(self) -> SpecialistAgent:
+        return self._agent_for_intent('budget')
+    
+    @property
+    def spending_insights(self) -> SpecialistAgent:
+        return self._agent_for_intent('insights')
     
-    def _classify_intent(self, query: str) -> Any:
+    @property
+    def goal_tracker(self) -> SpecialistAgent:
+        return self._agent_for_intent('goals')
+    
+    def _classify_intent(self, query: str) -> SpecialistAgent:
         """
         Classify user intent and select appropriate agent
         
-        Uses keyword matching for fast, reliable routing
-        Supports both Vietnamese and English
+        Uses the precompiled keyword matcher for fast, reliable routing
+        Supports both Vietnamese (with or without diacritics) and English
         """
-        query_lower = query.lower()
-        
-        # Budget-related keywords (Vietnamese + English)
-        budget_keywords = [
-            # English
-            'budget', 'over', 'under', 'left', 'remaining',
-            'budget limit', 'overspending', 'burn rate',
-            'how much can i spend', 'monthly budget',
-            # Vietnamese
-            'ngân sách', 'vượt', 'dưới', 'còn lại', 'còn',
-            'giới hạn ngân sách', 'chi tiêu quá', 'tốc độ chi',
-            'tôi có thể chi', 'ngân sách tháng', 'chi quá',
-            'vượt ngân sách', 'trong ngân sách'
-        ]
-        
-        if any(keyword in query_lower for keyword in budget_keywords):
-            return self.budget_advisor
-        
-        # Goal-related keywords (Vietnamese + English)
-        goal_keywords = [
-            # English
-            'goal', 'save', 'saving', 'target', 'emergency fund',
-            'contribution', 'on track', 'achieve', 'progress toward',
-            # Vietnamese
-            'mục tiêu', 'tiết kiệm', 'dự trữ', 'quỹ khẩn cấp',
-            'quỹ dự phòng', 'đóng góp', 'đúng hướng', 'đạt được',
-            'tiến độ', 'quỹ dự trữ', 'kế hoạch tiết kiệm',
-            'tiết kiệm tháng', 'tiết kiệm hàng tháng'
-        ]
-        
-        if any(keyword in query_lower for keyword in goal_keywords):
-            return self.goal_tracker
-        
-        # Insights/trends keywords (Vietnamese + English)
-        insights_keywords = [
-            # English
-            'trend', 'pattern', 'compare', 'last month', 'this month vs',
-            'month over month', 'spending habits', 'insight',
-            'why did', 'how come', 'unusual', 'anomaly',
-            # Vietnamese
-            'xu hướng', 'mẫu hình', 'so sánh', 'tháng trước',
-            'tháng này vs', 'tháng này so với', 'thói quen chi tiêu',
-            'nhận xét', 'tại sao', 'làm sao', 'bất thường',
-            'khác thường', 'phân tích', 'chi tiết'
-        ]
-        
-        if any(keyword in query_lower for keyword in insights_keywords):
-            return self.spending_insights
-        
-        # Default to transaction analyst for specific queries
-        # (transactions, amounts, categories, dates, etc.)
-        return self.transaction_analyst
+        return self._agent_for_intent(self.intent_matcher.classify(query))
@@ -1,5 +1,8 @@
 """Shared utilities for agents"""
 
+import importlib
+from typing import TYPE_CHECKING
+
 from .types import UserContext, QueryOptions, AgentResponse
 from .formatters import (
     format_currency,
@@ -10,13 +13,36 @@ from .formatters import (
     format_table,
     summarize_transactions
 )
-from .file_search_client import FileSearchClient
+from .intent_matcher import IntentMatcher
+from .mapping_store import MappingStore, MappingWatcher, open_mapping_store
+from .tracing import tracer
+
+if TYPE_CHECKING:
+    from .file_search_client import FileSearchClient
+    from .genai_client import get_client, ClientSettings
+    from .base_agent import SpecialistAgent
+
+# These import the Gemini SDK (~0.5 s); load them on first access
+_LAZY_EXPORTS = {
+    'FileSearchClient': '.file_search_client',
+    'get_client': '.genai_client',
+    'ClientSettings': '.genai_client',
+    'SpecialistAgent': '.base_agent'
+}
 
 __all__ = [
     'UserContext',
     'QueryOptions',
     'AgentResponse',
     'FileSearchClient',
+    'get_client',
+    'ClientSettings',
+    'IntentMatcher',
+    'MappingStore',
+    'MappingWatcher',
+    'open_mapping_store',
+    'tracer',
+    'SpecialistAgent',
     'format_currency',
     'format_percentage',
     'format_date',
@@ -25,3 +51,11 @@ __all__ = [
     'format_table',
     'summarize_transactions'
 ]
+
+
+def __getattr__(name: str):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
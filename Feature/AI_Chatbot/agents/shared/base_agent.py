@@ -0,0 +1,138 @@
+"""
+Base class for specialist agents
+Shared query/response handling with sync and async entry points
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Generator, Optional
+
+from .types import UserContext, QueryOptions, AgentResponse
+from .deadline import is_timeout
+from .file_search_client import FileSearchClient
+
+logger = logging.getLogger(__name__)
+
+
+class SpecialistAgent(ABC):
+    """
+    Base for agents that answer by querying the user's files
+
+    Subclasses set name, query_type and confidence, and implement
+    build_query() to wrap the user's question in an agent-specific prompt.
+    """
+
+    name = "Specialist"
+    query_type = "general"
+    confidence = 0.9
+
+    def __init__(self, file_search_client: FileSearchClient):
+        self.client = file_search_client
+        logger.info(f"Initialized {self.name}")
+
+    @abstractmethod
+    def build_query(self, user_context: UserContext, query: str) -> str:
+        """Agent-specific prompt for the user's question"""
+
+    def run(self, user_context: UserContext, query: str, options: Optional[QueryOptions] = None) -> AgentResponse:
+        """
+        Answer a query (blocking)
+
+        Args:
+            user_context: User context
+            query: Natural language query
+            options: Query options
+
+        Returns:
+            AgentResponse with the answer
+        """
+        logger.info(f"[{self.name}] Running: {query}")
+
+        try:
+            result = self.client.query(
+                user_context=user_context,
+                query_text=self.build_query(user_context, query),
+                options=options
+            )
+            return self._to_response(result)
+
+        except Exception as e:
+            return self._error_response(e)
+
+    async def arun(self, user_context: UserContext, query: str, options: Optional[QueryOptions] = None) -> AgentResponse:
+        """Async variant of run(), awaits the Gemini call instead of blocking"""
+        logger.info(f"[{self.name}] Running (async): {query}")
+
+        try:
+            result = await self.client.aquery(
+                user_context=user_context,
+                query_text=self.build_query(user_context, query),
+                options=options
+            )
+            return self._to_response(result)
+
+        except Exception as e:
+            return self._error_response(e)
+
+    def run_stream(
+        self,
+        user_context: UserContext,
+        query: str,
+        options: Optional[QueryOptions] = None
+    ) -> Generator[str, None, AgentResponse]:
+        """
+        Streaming variant of run()
+
+        Yields text chunks as they arrive and returns the complete
+        AgentResponse (full text plus timing metadata) when exhausted.
+        """
+        logger.info(f"[{self.name}] Running (stream): {query}")
+
+        try:
+            result = yield from self.client.query_stream(
+                user_context=user_context,
+                query_text=self.build_query(user_context, query),
+                options=options
+            )
+            return self._to_response(result)
+
+        except Exception as e:
+            return self._error_response(e)
+
+    def _to_response(self, result: Dict[str, Any]) -> AgentResponse:
+        """Convert a FileSearchClient result into an AgentResponse"""
+        if result['success']:
+            metadata = {
+                "query_type": self.query_type,
+                "stores_queried": result.get('stores', [])
+            }
+            # Model-side stream timings (chat-level timings include the guard)
+            for timing in ('ttft_ms', 'total_ms'):
+                if timing in result:
+                    metadata[f"model_{timing}"] = result[timing]
+
+            return AgentResponse(
+                success=True,
+                agent=self.name,
+                response=result['result'],
+                confidence=self.confidence,
+                metadata=metadata
+            )
+
+        return AgentResponse(
+            success=False,
+            agent=self.name,
+            response="",
+            metadata={"timed_out": result.get('timed_out', False)},
+            error=result.get('error', 'Unknown error')
+        )
+
+    def _error_response(self, error: Exception) -> AgentResponse:
+        logger.error(f"[{self.name}] Error: {error}")
+        return AgentResponse(
+            success=False,
+            agent=self.name,
+            response="",
+            metadata={"timed_out": is_timeout(error)},
+            error=str(error)
+        )
@@ -0,0 +1,304 @@
+"""
+Record/replay of Gemini calls
+In record mode, every generate_content call made by FileSearchClient and
+GuardAgent is appended to a JSONL cassette. Each line holds a fingerprint
+of the request, the response and its latency. In replay mode the cassette
+answers those calls instead of Gemini, after the recorded latency, so
+benchmarks get the same responses and timings on every run and need no
+network or API key.
+
+Prompts embed the active month, so each interaction also records the
+month it was recorded in; during replay the chatbot uses that month
+instead of the calendar (see Cassette.month), and a cassette keeps
+matching after the month changes.
+
+Off unless configured with configure() or CHATBOT_CASSETTE=<file>
+(CHATBOT_CASSETTE_MODE=record|replay, default replay). Like
+genai_client.configure(), this must happen before the chatbot builds its
+clients.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODES = ('record', 'replay')
+
+# Not part of a recorded response: HTTP headers, and the schema-parsed
+# value (restored separately because pydantic cannot rebuild a bare dict)
+_EXCLUDED_FIELDS = {'sdk_http_response', 'parsed'}
+
+
+class CassetteMissError(LookupError):
+    """Replay found no recorded response for a request"""
+
+
+def _normalize(value: Any) -> Any:
+    """JSON-able form of a request value, without file URIs or HTTP options"""
+    if hasattr(value, 'model_dump'):
+        value = value.model_dump(mode='json', exclude_none=True)
+    if isinstance(value, dict):
+        # Uploaded files get new URIs every 48 h; the MIME types and the
+        # number of parts still identify the request. Per-call timeouts
+        # (deadline.py) vary from call to call.
+        return {key: _normalize(item) for key, item in value.items() if key not in ('file_uri', 'http_options')}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def request_fingerprint(model: str, contents: Any, config: Any = None, stream: bool = False) -> str:
+    """Stable hash of a generate_content request"""
+    payload = {
+        "model": model,
+        "contents": _normalize(contents),
+        "config": _normalize(config) or None,  # A config holding only HTTP options counts as none
+        "stream": stream
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+def _preview(contents: Any) -> str:
+    """Start of the request's first text part, to make cassettes readable"""
+    if isinstance(contents, str):
+        return contents[:120]
+    for part in getattr(contents, 'parts', None) or []:
+        if part.text:
+            return part.text[:120]
+    return ""
+
+
+def _dump_response(response: Any) -> Dict[str, Any]:
+    data = response.model_dump(mode='json', exclude_none=True, exclude=_EXCLUDED_FIELDS)
+    if isinstance(response.parsed, (dict, list)):
+        data['parsed'] = response.parsed
+    return data
+
+
+def _load_response(data: Dict[str, Any]) -> Any:
+    from google.genai import types
+
+    data = dict(data)
+    parsed = data.pop('parsed', None)
+    response = types.GenerateContentResponse.model_validate(data)
+    if parsed is not None:
+        response.parsed = parsed
+    return response
+
+
+class Cassette:
+    """
+    Recorded Gemini interactions
+
+    A request recorded several times is replayed in recording order,
+    wrapping around after the last one. Only successful calls are
+    recorded, so failures are not replayed.
+    """
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.path: Optional[str] = None
+        self.speed = 1.0
+        self.month: Optional[str] = None  # Active month (YYYY-MM) pinned during replay
+        self._fd: Optional[int] = None
+        self._interactions: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, path: Optional[str], mode: str = 'replay', speed: float = 1.0):
+        """
+        Start recording to or replaying from a cassette
+
+        Args:
+            path: JSONL cassette (None turns record/replay off)
+            mode: 'record' (append calls to path) or 'replay' (answer calls from path)
+            speed: Replay latency multiplier (0 = no delay, 1 = as recorded)
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._interactions = {}
+            self._cursors = {}
+            self.path = path
+            self.speed = speed
+            self.month = None
+            self.mode = mode if path else None
+
+            if self.mode == 'record':
+                # One write() per interaction on an O_APPEND descriptor, as in tracing
+                self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            elif self.mode == 'replay':
+                self._interactions = self._load(path)
+
+        if self.mode:
+            logger.info(f"Cassette {self.mode}: {path}")
+
+    def _load(self, path: str) -> Dict[str, List[Dict[str, Any]]]:
+        interactions: Dict[str, List[Dict[str, Any]]] = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    interactions.setdefault(entry['fingerprint'], []).append(entry)
+                    # Cassettes recorded before months were stored leave it unpinned
+                    self.month = entry.get('month', self.month)
+        logger.info(f"Loaded {sum(map(len, interactions.values()))} recorded calls from {path}")
+        return interactions
+
+    def lookup(self, fingerprint: str, preview: str = "") -> Dict[str, Any]:
+        """Next recorded interaction for a request fingerprint"""
+        with self._lock:
+            entries = self._interactions.get(fingerprint)
+            if not entries:
+                raise CassetteMissError(f"No recorded response for request {fingerprint} ({preview[:60]!r})")
+            index = self._cursors.get(fingerprint, 0)
+            self._cursors[fingerprint] = index + 1
+        return entries[index % len(entries)]
+
+    def record(self, fingerprint: str, model: str, preview: str, chunks: List[Tuple[float, Any]]):
+        """
+        Append one interaction
+
+        Args:
+            fingerprint: request_fingerprint() of the request
+            model: Model name
+            preview: Start of the request text
+            chunks: (ms since the call started, response) per response or stream chunk
+        """
+        entry = {
+            "fingerprint": fingerprint,
+            "month": time.strftime('%Y-%m'),  # Same local clock as the chatbot's active month
+            "model": model,
+            "request": preview,
+            "latency_ms": round(chunks[-1][0], 1) if chunks else 0.0,
+            "chunks": [{"offset_ms": round(offset, 1), "response": _dump_response(response)} for offset, response in chunks]
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            if self._fd is not None:
+                os.write(self._fd, line)
+
+    def delay(self, ms: float) -> float:
+        """Seconds to wait for a recorded latency"""
+        return max(0.0, ms * self.speed / 1000)
+
+
+cassette = Cassette()
+
+if os.getenv('CHATBOT_CASSETTE'):
+    cassette.configure(os.getenv('CHATBOT_CASSETTE'), mode=os.getenv('CHATBOT_CASSETTE_MODE', 'replay'))
+
+
+class _Models:
+    """client.models stand-in: records through to Gemini, or replays (models=None)"""
+
+    def __init__(self, cassette: Cassette, models: Any = None):
+        self._cassette = cassette
+        self._models = models
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None) -> Any:
+        fingerprint = request_fingerprint(model, contents, config)
+
+        if self._models is None:
+            entry = self._cassette.lookup(fingerprint, _preview(contents))
+            time.sleep(self._cassette.delay(entry['latency_ms']))
+            return _load_response(entry['chunks'][-1]['response'])
+
+        start = time.perf_counter()
+        response = self._models.generate_content(model=model, contents=contents, config=config)
+        self._cassette.record(fingerprint, model, _preview(contents), [((time.perf_counter() - start) * 1000, response)])
+        return response
+
+    def generate_content_stream(self, *, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        fingerprint = request_fingerprint(model, contents, config, stream=True)
+
+        if self._models is None:
+            entry = self._cassette.lookup(fingerprint, _preview(contents))
+            start = time.perf_counter()
+            for chunk in entry['chunks']:
+                wait = self._cassette.delay(chunk['offset_ms']) - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+                yield _load_response(chunk['response'])
+            return
+
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+            chunks.append(((time.perf_counter() - start) * 1000, chunk))
+            yield chunk
+        # Streams abandoned by the caller are not recorded
+        self._cassette.record(fingerprint, model, _preview(contents), chunks)
+
+
+class _AsyncModels:
+    """client.aio.models stand-in"""
+
+    def __init__(self, cassette: Cassette, models: Any = None):
+        self._cassette = cassette
+        self._models = models
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None) -> Any:
+        fingerprint = request_fingerprint(model, contents, config)
+
+        if self._models is None:
+            import asyncio
+
+            entry = self._cassette.lookup(fingerprint, _preview(contents))
+            await asyncio.sleep(self._cassette.delay(entry['latency_ms']))
+            return _load_response(entry['chunks'][-1]['response'])
+
+        start = time.perf_counter()
+        response = await self._models.generate_content(model=model, contents=contents, config=config)
+        self._cassette.record(fingerprint, model, _preview(contents), [((time.perf_counter() - start) * 1000, response)])
+        return response
+
+
+class _Aio:
+    def __init__(self, models: _AsyncModels):
+        self.models = models
+
+
+class CassetteClient:
+    """
+    The part of genai.Client used for generation (models, aio.models),
+    recording to or replaying from a cassette
+
+    Args:
+        cassette: Cassette in record or replay mode
+        client: Real client to record (None replays)
+    """
+
+    def __init__(self, cassette: Cassette, client: Any = None):
+        self.models = _Models(cassette, client.models if client is not None else None)
+        self.aio = _Aio(_AsyncModels(cassette, client.aio.models if client is not None else None))
+
+
+def get_model_client(api_key: Optional[str] = None) -> Any:
+    """
+    Client for generate_content calls: the shared genai.Client, wrapped
+    for recording, or a replaying stand-in that needs no API key
+
+    Args:
+        api_key: Gemini API key; defaults to GEMINI_API_KEY
+    """
+    if cassette.mode == 'replay':
+        return CassetteClient(cassette)
+
+    from .genai_client import get_client
+
+    client = get_client(api_key)
+    if cassette.mode == 'record':
+        return CassetteClient(cassette, client)
+    return client
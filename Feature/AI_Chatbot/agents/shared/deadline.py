@@ -0,0 +1,228 @@
+"""
+Request deadlines and hedged Gemini calls
+A chat turn runs under a deadline (a contextvar, so it follows the turn
+into agent threads and tasks). Each stage can take a share of the time
+left. Gemini calls pass what remains as their HTTP timeout and fail with
+DeadlineExceeded once it is spent, so a stuck call cannot hold a turn
+indefinitely. The HTTP timeout only bounds each connect and read, so an
+answer that keeps trickling could outlast it: blocking calls run on a
+worker thread that the caller stops waiting for at the deadline, and
+async calls are cancelled.
+
+Async calls can also be hedged: if a call is still running after the
+recent p95 latency of its call site, a second identical call is started,
+and whichever finishes first wins. Hedging is off unless enabled with
+hedging.configure() or CHATBOT_HEDGE=1. It trades extra Gemini calls for
+a shorter tail.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)  # time.monotonic() value
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request deadline passed before a stage finished"""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Run the block under a deadline `seconds` from now
+
+    Nested scopes can only shorten the deadline; None keeps the current one.
+    """
+    if seconds is None:
+        yield
+        return
+
+    current = _deadline.get()
+    deadline = time.monotonic() + max(0.0, seconds)
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (None without one)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def share(fraction: float) -> Optional[float]:
+    """A stage's budget: fraction of the time left (None without a deadline)"""
+    left = remaining()
+    return None if left is None else left * fraction
+
+
+def expired() -> bool:
+    """True once the current deadline has passed"""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def is_timeout(error: BaseException) -> bool:
+    """Deadline, asyncio and HTTP client timeouts"""
+    if isinstance(error, TimeoutError):
+        return True
+    import httpx
+
+    return isinstance(error, httpx.TimeoutException)
+
+
+class LatencyTracker:
+    """Recent successful latencies of one call site"""
+
+    def __init__(self, name: str, window: int = 200):
+        self.name = name
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        """Nearest-rank percentile in seconds, None with fewer than min_samples"""
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class HedgePolicy:
+    """When async Gemini calls are hedged"""
+
+    def __init__(self, enabled: bool = False, percentile: float = 95.0, min_samples: int = 20):
+        self.configure(enabled, percentile, min_samples)
+
+    def configure(self, enabled: bool = True, percentile: float = 95.0, min_samples: int = 20):
+        """
+        Args:
+            enabled: Send a second call for slow ones
+            percentile: Latency percentile after which the second call is sent
+            min_samples: Successful calls a site needs before it is hedged
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+
+    def delay(self, tracker: LatencyTracker) -> Optional[float]:
+        """Seconds to wait before hedging a call (None = do not hedge)"""
+        if not self.enabled:
+            return None
+        return tracker.percentile(self.percentile, self.min_samples)
+
+
+hedging = HedgePolicy(enabled=os.getenv('CHATBOT_HEDGE', '0') not in ('', '0'))
+
+# Runs blocking calls that have a deadline (see call_with_deadline)
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CHATBOT_DEADLINE_WORKERS', '32')),
+    thread_name_prefix="deadline"
+)
+
+
+def call_with_deadline(call: Callable[[Optional[float]], Any], tracker: LatencyTracker) -> Any:
+    """
+    Make a blocking Gemini call within the current deadline
+
+    The HTTP timeout applies per connect/read, so under a deadline the
+    call runs on a worker thread and the caller waits at most the time
+    left. A call still running then is abandoned; its thread ends at the
+    next HTTP timeout and the result is dropped.
+
+    Args:
+        call: Makes the call given its timeout in seconds (None = no limit)
+        tracker: Latency history of the call site
+    """
+    timeout = remaining()
+    if timeout is None:
+        start = time.monotonic()
+        result = call(None)
+        tracker.record(time.monotonic() - start)
+        return result
+    if timeout <= 0:
+        raise DeadlineExceeded(f"{tracker.name}: request deadline exceeded")
+
+    def attempt() -> Any:
+        # Queued behind busy workers until the deadline: not worth sending
+        left = remaining()
+        if left <= 0:
+            raise DeadlineExceeded(f"{tracker.name}: request deadline exceeded")
+        start = time.monotonic()
+        result = call(left)
+        tracker.record(time.monotonic() - start)
+        return result
+
+    # The worker keeps the deadline and the current trace span
+    future = _executor.submit(copy_context().run, attempt)
+    try:
+        return future.result(timeout=remaining())
+    except FutureTimeout:
+        future.cancel()
+        raise DeadlineExceeded(f"{tracker.name}: request deadline exceeded") from None
+
+
+async def acall_with_deadline(call: Callable[[Optional[float]], Awaitable[Any]], tracker: LatencyTracker) -> Any:
+    """
+    Async variant of call_with_deadline(); cancels the call when the
+    deadline passes and hedges it under the hedging policy
+    """
+    import asyncio
+
+    timeout = remaining()
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded(f"{tracker.name}: request deadline exceeded")
+
+    started = {}
+
+    def start_attempt() -> asyncio.Future:
+        task = asyncio.ensure_future(call(remaining()))
+        started[task] = time.monotonic()
+        return task
+
+    pending = {start_attempt()}
+    error: Optional[BaseException] = None
+    try:
+        delay = hedging.delay(tracker)
+        if delay is not None and (timeout is None or delay < timeout):
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                logger.info(f"Hedging {tracker.name}: no response after {delay * 1000:.0f} ms (p{hedging.percentile:g})")
+                tracer.count('chatbot_hedged_total', call=tracker.name)
+                pending.add(start_attempt())
+
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{tracker.name}: request deadline exceeded")
+
+            for task in done:
+                if task.exception() is None:
+                    tracker.record(time.monotonic() - started[task])
+                    return task.result()
+                error = task.exception()
+
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -3,36 +3,114 @@ FileSearch client wrapper for agents
 (Modified for Long Context Window)
 """
 
-import os
+import time
 import logging
-from typing import Dict, List, Optional, Any
-from dotenv import load_dotenv
-from google import genai
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Any, Tuple, Generator
 from google.genai import types
 
 from .types import UserContext, QueryOptions
-
-load_dotenv()
+from .cassette import get_model_client
+from .deadline import DeadlineExceeded, LatencyTracker, acall_with_deadline, call_with_deadline, expired, is_timeout, remaining
+from .genai_client import with_timeout
+from .streams import isolated_stream
+from .tracing import tracer
+from .usage import record_usage
 
 logger = logging.getLogger(__name__)
 
+# Per-language instructions wrapped around the question ({query})
+_INSTRUCTIONS = {
+    "vi": """Ngữ cảnh: Tháng {month}. Tiền tệ: {currency}.
+
+Câu hỏi: {query}
+
+Yêu cầu trả lời:
+- Trả lời NGẮN GỌN, TÓM TẮT (2-4 câu hoặc dạng bullet points)
+- Chỉ đưa số liệu QUAN TRỌNG nhất
+- Tập trung vào tháng {month}
+- Trả lời bằng TIẾNG VIỆT
+- Dùng bullet points (•) cho danh sách
+- Không giải thích dài dòng
+- Số tiền: {currency} (VD: $70.50)
+""",
+    "en": """Context: Current month is {month}. User currency is {currency}.
+
+User question: {query}
+
+Instructions:
+- Focus on data from {month} unless the user asks about a different period
+- All amounts should be in {currency}
+- Respond in ENGLISH
+- Be specific with numbers and dates
+- If data is unavailable, clearly state that
+"""
+}
+
+_QUERY_SLOT = "\x00query\x00"
+
+
+@lru_cache(maxsize=256)
+def instruction_frame(language: str, month: str, currency: str) -> Tuple[str, str]:
+    """Static text before and after the question for a language/month/currency"""
+    template = _INSTRUCTIONS["vi" if language == "vi" else "en"]
+    prefix, suffix = template.format(month=month, currency=currency, query=_QUERY_SLOT).split(_QUERY_SLOT)
+    return prefix, suffix
+
+
+def resolve_mime_type(resource: Dict[str, str]) -> str:
+    """MIME type sent for a file resource (stored type, else guessed from the name)"""
+    name = resource.get('name', '')
+    stored_mime = resource.get('mime_type')
+    
+    # Use stored mime type if available, otherwise guess
+    if stored_mime:
+        mime_type = stored_mime
+    else:
+        mime_type = "text/plain"
+        if name.lower().endswith(".json"): 
+            mime_type = "application/json"
+        elif name.lower().endswith(".csv"): 
+            mime_type = "text/csv"
+        elif name.lower().endswith(".pdf"):
+            mime_type = "application/pdf"
+    
+    # Override unsupported mime types
+    if mime_type == "application/json":
+        mime_type = "text/plain"
+    
+    return mime_type
+
 
 class FileSearchClient:
     """Wrapper for Gemini Long Context operations"""
     
-    def __init__(self, api_key: Optional[str] = None, knowledge_store_id: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        knowledge_store_id: Optional[str] = None,
+        template_cache_size: int = 10000
+    ):
         """
         Initialize client
         knowledge_store_id is kept for compatibility but not used as a store ID.
         We rely on UserContext to pass file URIs.
-        """
-        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found")
         
-        self.client = genai.Client(api_key=self.api_key)
+        File parts are built once per (user, data fingerprint) and reused
+        across requests; template_cache_size bounds how many users are kept.
+        """
+        self.client = get_model_client(api_key)
         self.knowledge_store_id = knowledge_store_id
         
+        self._file_parts: OrderedDict = OrderedDict()
+        self._file_parts_size = template_cache_size
+        self._file_parts_lock = threading.Lock()
+        
+        # Latency history of generate calls: sets the hedge delay (deadline.py)
+        self._latency = LatencyTracker('file_search.generate')
+        
         logger.info("Initialized FileSearchClient (Long Context Mode)")
     
     def query(
@@ -47,110 +125,209 @@ class FileSearchClient:
         if options is None:
             options = QueryOptions()
         
-        # Collect file resources
-        file_resources = []
+        logger.info(f"Querying for user {user_context.user_name}: {query_text}")
         
-        # Add user files
-        if user_context.file_resources:
-            file_resources.extend(user_context.file_resources)
+        with tracer.span('file_search.generate', model=options.model) as span:
+            try:
+                request, files_used = self._request(user_context, query_text, options, span)
+                
+                response = call_with_deadline(
+                    lambda timeout: self.client.models.generate_content(**request, config=with_timeout(None, timeout)),
+                    self._latency
+                )
+                
+                return self._completed(user_context, options, response.text, response.usage_metadata, files_used)
+            
+            except Exception as e:
+                return self._failure(user_context, e)
+    
+    def query_stream(
+        self,
+        user_context: UserContext,
+        query_text: str,
+        options: Optional[QueryOptions] = None
+    ) -> Generator[str, None, Dict[str, Any]]:
+        """
+        Streaming variant of query()
         
-        # Enhance query
-        enhanced_query = self._enhance_query(query_text, user_context)
+        Yields text chunks as they arrive; the generator's return value is
+        the same result dict as query(), plus ttft_ms and total_ms.
+        """
+        return isolated_stream(self._query_stream(user_context, query_text, options))
+    
+    def _query_stream(
+        self,
+        user_context: UserContext,
+        query_text: str,
+        options: Optional[QueryOptions]
+    ) -> Generator[str, None, Dict[str, Any]]:
+        if options is None:
+            options = QueryOptions()
         
-        logger.info(f"Querying for user {user_context.user_name}: {query_text}")
-        logger.debug(f"Files: {len(file_resources)}")
+        logger.info(f"Querying (stream) for user {user_context.user_name}: {query_text}")
         
-        try:
-            # Construct parts list
-            parts = []
-            
-            # Add text query part
-            parts.append(types.Part(text=enhanced_query))
-            
-            # Add file parts
-            for res in file_resources:
-                uri = res.get('uri')
-                name = res.get('name', '')
-                stored_mime = res.get('mime_type')
+        start = time.perf_counter()
+        ttft_ms = None
+        chunks = []
+        usage = None
+        
+        with tracer.span('file_search.generate', model=options.model, stream=True) as span:
+            try:
+                request, files_used = self._request(user_context, query_text, options, span)
                 
-                # Use stored mime type if available, otherwise guess
-                if stored_mime:
-                    mime_type = stored_mime
-                else:
-                    mime_type = "text/plain"
-                    if name.lower().endswith(".json"): 
-                        mime_type = "application/json"
-                    elif name.lower().endswith(".csv"): 
-                        mime_type = "text/csv"
-                    elif name.lower().endswith(".pdf"):
-                        mime_type = "application/pdf"
+                if expired():
+                    raise DeadlineExceeded("file_search.generate: request deadline exceeded")
                 
-                # Override unsupported mime types
-                if mime_type == "application/json":
-                    mime_type = "text/plain"
+                for chunk in self.client.models.generate_content_stream(**request, config=with_timeout(None, remaining())):
+                    # The HTTP timeout bounds each read; also stop a stream
+                    # that keeps trickling past the deadline
+                    if expired():
+                        raise DeadlineExceeded("file_search.generate: request deadline exceeded")
+                    # Usage is reported on the last chunk(s)
+                    usage = chunk.usage_metadata or usage
+                    text = chunk.text
+                    if not text:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - start) * 1000
+                    chunks.append(text)
+                    yield text
                 
-                # Create file part
-                parts.append(types.Part.from_uri(file_uri=uri, mime_type=mime_type))
-
-            # Create content object
-            content = types.Content(role="user", parts=parts)
-
-            response = self.client.models.generate_content(
-                model=options.model,
-                contents=content  # Pass single Content object
-            )
-            
-            result_text = response.text
+                span.set(ttft_ms=ttft_ms)
+                
+                result = self._completed(user_context, options, "".join(chunks), usage, files_used)
+                result['ttft_ms'] = ttft_ms
+                result['total_ms'] = (time.perf_counter() - start) * 1000
+                
+                logger.info(f"Stream complete: first chunk {ttft_ms or 0:.0f} ms, total {result['total_ms']:.0f} ms")
+                return result
             
-            logger.info(f"Query successful: {len(result_text)} chars")
+            except Exception as e:
+                return self._failure(user_context, e)
+    
+    async def aquery(
+        self,
+        user_context: UserContext,
+        query_text: str,
+        options: Optional[QueryOptions] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of query() using the SDK's async client
+        """
+        if options is None:
+            options = QueryOptions()
+        
+        logger.info(f"Querying (async) for user {user_context.user_name}: {query_text}")
+        
+        with tracer.span('file_search.generate', model=options.model) as span:
+            try:
+                request, files_used = self._request(user_context, query_text, options, span)
+                
+                response = await acall_with_deadline(
+                    lambda timeout: self.client.aio.models.generate_content(**request, config=with_timeout(None, timeout)),
+                    self._latency
+                )
+                
+                return self._completed(user_context, options, response.text, response.usage_metadata, files_used)
             
-            return {
-                "success": True,
-                "result": result_text,
-                "user_id": user_context.user_id,
-                "files_used": len(file_resources)
-            }
-        
-        except Exception as e:
-            logger.error(f"Query failed: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "user_id": user_context.user_id
-            }
+            except Exception as e:
+                return self._failure(user_context, e)
+    
+    def _request(
+        self,
+        user_context: UserContext,
+        query_text: str,
+        options: QueryOptions,
+        span: Any
+    ) -> Tuple[Dict[str, Any], int]:
+        """
+        generate_content arguments (all but the per-call config) shared by
+        query(), aquery() and query_stream(), and the number of files sent
+        """
+        content, files_used = self._build_content(user_context, query_text)
+        span.set(files=files_used)
+        # Pass single Content object
+        return {"model": options.model, "contents": content}, files_used
+    
+    def _build_content(self, user_context: UserContext, query_text: str) -> Tuple[types.Content, int]:
+        """
+        Build the request content: enhanced query followed by file parts
+        
+        Only the query part is new per call; file parts and the instruction
+        text around the query come from caches.
+        """
+        file_parts = self._get_file_parts(user_context)
+        
+        parts = [types.Part(text=self._enhance_query(query_text, user_context)), *file_parts]
+        
+        # Create content object
+        return types.Content(role="user", parts=parts), len(file_parts)
+    
+    def _get_file_parts(self, user_context: UserContext) -> Tuple[types.Part, ...]:
+        """File parts for a user, built once per data fingerprint and file URIs"""
+        file_resources = user_context.file_resources or []
+        
+        # The fingerprint hashes file content; a refresh re-uploads the same
+        # content under new URIs and deletes the old files, so the URIs are
+        # part of the key too
+        uris = tuple(res.get('uri') for res in file_resources)
+        key = (user_context.user_id, user_context.fingerprint, uris)
+        
+        with self._file_parts_lock:
+            file_parts = self._file_parts.get(key)
+            if file_parts is not None:
+                self._file_parts.move_to_end(key)
+        
+        tracer.cache('file_parts', file_parts is not None)
+        if file_parts is not None:
+            return file_parts
+        
+        logger.debug(f"Building file parts for {user_context.user_id}: {len(file_resources)} files")
+        file_parts = tuple(
+            types.Part.from_uri(file_uri=res.get('uri'), mime_type=resolve_mime_type(res))
+            for res in file_resources
+        )
+        
+        with self._file_parts_lock:
+            self._file_parts[key] = file_parts
+            while len(self._file_parts) > self._file_parts_size:
+                self._file_parts.popitem(last=False)
+        return file_parts
+    
+    def _completed(
+        self,
+        user_context: UserContext,
+        options: QueryOptions,
+        result_text: str,
+        usage: Any,
+        files_used: int
+    ) -> Dict[str, Any]:
+        """Record a completed call's token usage and build its result dict"""
+        record_usage(usage, options.model, user_id=user_context.user_id)
+        logger.info(f"Query successful: {len(result_text)} chars")
+        
+        return {
+            "success": True,
+            "result": result_text,
+            "user_id": user_context.user_id,
+            "files_used": files_used
+        }
+    
+    def _failure(self, user_context: UserContext, error: Exception) -> Dict[str, Any]:
+        """Result dict for a failed query"""
+        logger.error(f"Query failed: {error}")
+        tracer.current().set(error=type(error).__name__)
+        return {
+            "success": False,
+            "error": str(error),
+            "user_id": user_context.user_id,
+            "timed_out": is_timeout(error)
+        }
 
     def _enhance_query(self, query: str, context: UserContext) -> str:
         """Enhance query with user context"""
-        
-        # Language-specific instructions
-        if context.language == "vi":
-            instructions = f"""Ngữ cảnh: Tháng {context.active_month}. Tiền tệ: {context.currency}.
-
-Câu hỏi: {query}
-
-Yêu cầu trả lời:
-- Trả lời NGẮN GỌN, TÓM TẮT (2-4 câu hoặc dạng bullet points)
-- Chỉ đưa số liệu QUAN TRỌNG nhất
-- Tập trung vào tháng {context.active_month}
-- Trả lời bằng TIẾNG VIỆT
-- Dùng bullet points (•) cho danh sách
-- Không giải thích dài dòng
-- Số tiền: {context.currency} (VD: $70.50)
-"""
-        else:
-            instructions = f"""Context: Current month is {context.active_month}. User currency is {context.currency}.
-
-User question: {query}
-
-Instructions:
-- Focus on data from {context.active_month} unless the user asks about a different period
-- All amounts should be in {context.currency}
-- Respond in ENGLISH
-- Be specific with numbers and dates
-- If data is unavailable, clearly state that
-"""
-        
-        return instructions
+        prefix, suffix = instruction_frame(context.language, context.active_month, context.currency)
+        return prefix + query + suffix
     
     def get_user_store_id(self, user_id: str, store_mapping: Dict[str, Any]) -> Optional[str]:
         """Get store ID (kept for interface compatibility)"""
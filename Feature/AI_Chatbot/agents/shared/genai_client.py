@@ -0,0 +1,159 @@
+"""
+Process-wide Gemini client provider
+One genai.Client per API key, shared by every component so HTTP connections
+(and their TLS sessions) are pooled and kept alive across calls
+"""
+
+import os
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClientSettings:
+    """HTTP settings applied to shared clients (env vars in parentheses)"""
+    timeout_ms: int = 60000  # Per-request timeout (GEMINI_TIMEOUT_MS)
+    max_connections: int = 20  # Connection pool size (GEMINI_MAX_CONNECTIONS)
+    max_keepalive_connections: int = 10  # Idle connections kept open (GEMINI_MAX_KEEPALIVE)
+    keepalive_expiry: float = 30.0  # Seconds an idle connection is kept (GEMINI_KEEPALIVE_EXPIRY)
+    base_url: Optional[str] = None  # API endpoint override, e.g. a local fake_gemini.py server (GEMINI_BASE_URL)
+
+    @classmethod
+    def from_env(cls) -> 'ClientSettings':
+        defaults = cls()
+        return cls(
+            timeout_ms=int(os.getenv('GEMINI_TIMEOUT_MS', defaults.timeout_ms)),
+            max_connections=int(os.getenv('GEMINI_MAX_CONNECTIONS', defaults.max_connections)),
+            max_keepalive_connections=int(os.getenv('GEMINI_MAX_KEEPALIVE', defaults.max_keepalive_connections)),
+            keepalive_expiry=float(os.getenv('GEMINI_KEEPALIVE_EXPIRY', defaults.keepalive_expiry)),
+            base_url=os.getenv('GEMINI_BASE_URL') or defaults.base_url
+        )
+
+
+_settings: Optional[ClientSettings] = None
+_clients: Dict[str, genai.Client] = {}
+_lock = threading.Lock()
+
+
+def get_api_key(api_key: Optional[str] = None) -> str:
+    """Explicit key, else GEMINI_API_KEY from the environment / .env"""
+    api_key = api_key or os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found")
+    return api_key
+
+
+def configure(settings: ClientSettings):
+    """
+    Override client settings for this process
+
+    Must be called before the first get_client(); clients that already
+    exist keep their settings.
+    """
+    global _settings
+    with _lock:
+        _settings = settings
+        if _clients:
+            logger.warning("Client settings changed after clients were created")
+
+
+def get_settings() -> ClientSettings:
+    global _settings
+    if _settings is None:
+        _settings = ClientSettings.from_env()
+    return _settings
+
+
+def get_client(api_key: Optional[str] = None) -> genai.Client:
+    """
+    Shared genai.Client for the given (or default) API key
+
+    Args:
+        api_key: Gemini API key; defaults to GEMINI_API_KEY
+
+    Returns:
+        Process-wide client instance
+    """
+    api_key = get_api_key(api_key)
+
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _build_client(api_key, get_settings())
+            _clients[api_key] = client
+    return client
+
+
+def _build_client(api_key: str, settings: ClientSettings) -> genai.Client:
+    limits = httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_keepalive_connections,
+        keepalive_expiry=settings.keepalive_expiry
+    )
+
+    # Explicit transports carry the pool limits. A custom async transport
+    # also keeps the SDK on httpx instead of its unbounded aiohttp session.
+    http_options = types.HttpOptions(
+        base_url=settings.base_url,
+        timeout=settings.timeout_ms,
+        client_args={'transport': httpx.HTTPTransport(limits=limits)},
+        async_client_args={'transport': httpx.AsyncHTTPTransport(limits=limits)}
+    )
+
+    logger.info(
+        f"Created shared Gemini client (timeout={settings.timeout_ms}ms, "
+        f"max_connections={settings.max_connections}"
+        f"{', base_url=' + settings.base_url if settings.base_url else ''})"
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def close_clients():
+    """Close pooled connections of all shared clients (sync side)"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.debug(f"Error closing client: {e}")
+
+
+def with_timeout(
+    config: Optional[types.GenerateContentConfig],
+    timeout: Optional[float]
+) -> Optional[types.GenerateContentConfig]:
+    """
+    Request config carrying a per-call HTTP timeout
+
+    Args:
+        config: Request config (None for calls that send none)
+        timeout: Seconds; None keeps the client's timeout
+
+    Returns:
+        A copy of config with the timeout, or config unchanged
+    """
+    if timeout is None:
+        return config
+
+    http_options = types.HttpOptions(timeout=max(1, int(timeout * 1000)))
+    if config is None:
+        return types.GenerateContentConfig(http_options=http_options)
+    return config.model_copy(update={'http_options': http_options})
@@ -0,0 +1,242 @@
+"""
+Keyword-based intent matcher for query routing
+Compiles all keyword tables once and scores every intent in one pass over the query
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Tuple
+
+
+# Keyword tables (Vietnamese + English)
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    'budget': [
+        # English
+        'budget', 'budgets', 'over', 'under', 'left', 'remaining',
+        'budget limit', 'overspending', 'overspent', 'burn rate',
+        'how much can i spend', 'monthly budget',
+        # Vietnamese
+        'ngân sách', 'vượt', 'dưới', 'còn lại', 'còn',
+        'giới hạn ngân sách', 'chi tiêu quá', 'tốc độ chi',
+        'tôi có thể chi', 'ngân sách tháng', 'chi quá',
+        'vượt ngân sách', 'trong ngân sách'
+    ],
+    'goals': [
+        # English
+        'goal', 'goals', 'save', 'saved', 'saving', 'savings', 'target', 'targets',
+        'emergency fund', 'contribution', 'contributions', 'on track', 'achieve',
+        'progress toward',
+        # Vietnamese
+        'mục tiêu', 'tiết kiệm', 'dự trữ', 'quỹ khẩn cấp',
+        'quỹ dự phòng', 'đóng góp', 'đúng hướng', 'đạt được',
+        'tiến độ', 'quỹ dự trữ', 'kế hoạch tiết kiệm',
+        'tiết kiệm tháng', 'tiết kiệm hàng tháng'
+    ],
+    'insights': [
+        # English
+        'trend', 'trends', 'pattern', 'patterns', 'compare', 'last month', 'this month vs',
+        'month over month', 'spending habits', 'insight', 'insights',
+        'why did', 'how come', 'unusual', 'anomaly', 'anomalies',
+        # Vietnamese
+        'xu hướng', 'mẫu hình', 'so sánh', 'tháng trước',
+        'tháng này vs', 'tháng này so với', 'thói quen chi tiêu',
+        'nhận xét', 'tại sao', 'làm sao', 'bất thường',
+        'khác thường', 'phân tích', 'chi tiết'
+    ]
+}
+
+# Tie-break order, same precedence as the original if/elif chain
+INTENT_PRIORITY = ('budget', 'goals', 'insights')
+
+# Used when no keyword matches (transactions, amounts, categories, dates, etc.)
+DEFAULT_INTENT = 'transactions'
+
+# Words joining two questions; secondary intents are only kept for compound queries
+CONJUNCTIONS = frozenset(['and', 'also', 'plus', 'both', 'và', 'va', 'cũng', 'cung'])
+
+
+def _build_diacritic_table() -> Dict[int, str]:
+    """Translation table for precomposed Latin letters (covers all Vietnamese)"""
+    table = {ord('đ'): 'd', ord('Đ'): 'D'}
+    for start, end in ((0x00C0, 0x024F), (0x1E00, 0x1EFF)):
+        for code in range(start, end + 1):
+            char = chr(code)
+            base = ''.join(
+                ch for ch in unicodedata.normalize('NFD', char) if not unicodedata.combining(ch)
+            )
+            if base != char and base.isascii():
+                table[code] = base
+    return table
+
+
+_DIACRITIC_TABLE = _build_diacritic_table()
+_DIACRITIC_CHARS = frozenset(chr(code) for code in _DIACRITIC_TABLE)
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def strip_diacritics(text: str) -> str:
+    """Remove Vietnamese diacritics ('còn lại' -> 'con lai', 'đ' -> 'd')"""
+    return text.translate(_DIACRITIC_TABLE)
+
+
+def _normalize(text: str) -> str:
+    """Lowercase and NFC-compose (decomposed input would miss the table)"""
+    if not text.isascii() and not unicodedata.is_normalized('NFC', text):
+        text = unicodedata.normalize('NFC', text)
+    return text.lower()
+
+
+def _tokenize(text: str) -> List[str]:
+    """
+    Same words as _WORD_RE.findall(text), about twice as fast
+
+    \\w is str.isalnum() plus '_', so whitespace-separated tokens that are
+    alphanumeric are already words; only tokens carrying punctuation go
+    through the regex.
+    """
+    words = []
+    for token in text.split():
+        if token.isalnum():
+            words.append(token)
+        else:
+            words += _WORD_RE.findall(token)
+    return words
+
+
+class IntentMatcher:
+    """
+    Multi-pattern keyword matcher
+
+    All keywords are compiled once into a trie keyed by whole words, so a
+    query is tokenized once and scanned left to right taking the longest
+    keyword at each position (Aho-Corasick over word tokens). Matching on
+    tokens gives word-boundary awareness for free: 'over' no longer matches
+    'overview' and 'under' no longer matches 'understand'.
+
+    Two tries are kept: one for accented text and one for text typed
+    without diacritics. Accented queries only match accented keywords, so
+    'con' (child) is not confused with 'còn' (remaining).
+    """
+
+    # Trie node key holding the intent of a keyword ending at that node
+    _END = ''
+
+    def __init__(self, keywords: Dict[str, List[str]] = None):
+        if keywords is None:
+            keywords = INTENT_KEYWORDS
+
+        self._accented_trie: Dict[str, Any] = {}
+        self._plain_trie: Dict[str, Any] = {}
+
+        for intent, intent_keywords in keywords.items():
+            for keyword in intent_keywords:
+                words = _WORD_RE.findall(_normalize(keyword))
+                self._insert(self._accented_trie, words, intent)
+                self._insert(self._plain_trie, [strip_diacritics(w) for w in words], intent)
+
+        priority = list(INTENT_PRIORITY) + [
+            intent for intent in keywords if intent not in INTENT_PRIORITY
+        ]
+        self._priority = {intent: i for i, intent in enumerate(priority)}
+
+    @classmethod
+    def _insert(cls, trie: Dict[str, Any], words: List[str], intent: str):
+        """Add a keyword; the first table that defines it wins"""
+        node = trie
+        for word in words:
+            node = node.setdefault(word, {})
+        node.setdefault(cls._END, intent)
+
+    def _words(self, query: str) -> Tuple[List[str], Dict[str, Any]]:
+        """Words of the normalized query and the trie to scan them with"""
+        text = _normalize(query)
+        if text.isascii() or _DIACRITIC_CHARS.isdisjoint(text):
+            return _tokenize(text), self._plain_trie
+        return _tokenize(text), self._accented_trie
+
+    def _scan(self, words: List[str], trie: Dict[str, Any]) -> Dict[str, float]:
+        """Count leftmost-longest, non-overlapping keyword matches per intent"""
+        end_key = self._END
+        scores: Dict[str, float] = {}
+        i = 0
+        count = len(words)
+
+        while i < count:
+            node = trie.get(words[i])
+            i += 1
+            if node is None:
+                continue
+
+            best_end, best_intent = i, node.get(end_key)
+            j = i
+            while j < count:
+                node = node.get(words[j])
+                if node is None:
+                    break
+                j += 1
+                intent = node.get(end_key)
+                if intent is not None:
+                    best_end, best_intent = j, intent
+
+            if best_intent is not None:
+                scores[best_intent] = scores.get(best_intent, 0.0) + 1.0
+                i = best_end
+
+        return scores
+
+    def _rank(self, scores: Dict[str, float]) -> List[Tuple[str, float]]:
+        return sorted(
+            scores.items(),
+            key=lambda item: (-item[1], self._priority.get(item[0], len(self._priority)))
+        )
+
+    def score(self, query: str) -> Dict[str, float]:
+        """
+        Score every intent in a single scan of the query
+
+        Args:
+            query: User's natural language query
+
+        Returns:
+            Dict of intent -> number of matched keywords (only intents that matched)
+        """
+        return self._scan(*self._words(query))
+
+    def rank(self, query: str) -> List[Tuple[str, float]]:
+        """Matched intents ordered by score, ties broken by routing priority"""
+        return self._rank(self.score(query))
+
+    def detect(self, query: str, limit: int = 1) -> List[str]:
+        """
+        Intents a query asks about, best first
+
+        Secondary intents are only returned when the query joins clauses
+        ("am I over budget AND on track for my goal?"), so that a single
+        question touching two keyword tables is not fanned out.
+
+        Args:
+            query: User's natural language query
+            limit: Maximum number of intents to return
+
+        Returns:
+            Non-empty list of intents
+        """
+        words, trie = self._words(query)
+        ranked = self._rank(self._scan(words, trie))
+        if not ranked:
+            return [DEFAULT_INTENT]
+
+        intents = [ranked[0][0]]
+        if limit > 1 and len(ranked) > 1 and not CONJUNCTIONS.isdisjoint(words):
+            intents.extend(intent for intent, _ in ranked[1:limit])
+
+        return intents
+
+    def classify(self, query: str) -> str:
+        """Best matching intent, or DEFAULT_INTENT when nothing matches"""
+        scores = self.score(query)
+        if len(scores) <= 1:
+            # Nearly every query: no ranking needed
+            return next(iter(scores), DEFAULT_INTENT)
+        return self._rank(scores)[0][0]
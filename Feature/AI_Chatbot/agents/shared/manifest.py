@@ -0,0 +1,82 @@
+"""
+Export manifests and data fingerprints
+The data cleaner writes a manifest.json into every store directory listing
+the content hash of each exported file. A store's fingerprint is derived
+from those hashes, so it changes exactly when the store's content changes.
+"""
+
+import json
+import hashlib
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+MANIFEST_NAME = 'manifest.json'
+EXPORT_SUFFIXES = ('.json', '.csv', '.md')
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def data_fingerprint(file_hashes: Dict[str, str]) -> str:
+    """
+    Fingerprint of a set of files
+
+    Args:
+        file_hashes: file name -> content SHA-256
+
+    Returns:
+        16 hex chars, independent of file order
+    """
+    digest = hashlib.sha256()
+    for name in sorted(file_hashes):
+        digest.update(f"{name}:{file_hashes[name]}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def combine_fingerprints(fingerprints: Iterable[Optional[str]]) -> str:
+    """Single fingerprint for data drawn from several stores"""
+    return hashlib.sha256("|".join(fp or "" for fp in fingerprints).encode()).hexdigest()[:16]
+
+
+def build_manifest(store_dir: Path, suffixes: Iterable[str] = EXPORT_SUFFIXES) -> Dict[str, Any]:
+    """
+    Write manifest.json for a store directory
+
+    Args:
+        store_dir: Exported store directory
+        suffixes: File suffixes that belong to the store
+
+    Returns:
+        The manifest: {"fingerprint", "generated_at", "files": {name: {sha256, size_bytes}}}
+    """
+    suffixes = set(suffixes)
+    files = {
+        path.name: {"sha256": file_sha256(path), "size_bytes": path.stat().st_size}
+        for path in sorted(Path(store_dir).iterdir())
+        if path.is_file() and path.suffix in suffixes and path.name != MANIFEST_NAME
+    }
+    manifest = {
+        "fingerprint": data_fingerprint({name: info['sha256'] for name, info in files.items()}),
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "files": files
+    }
+
+    with open(Path(store_dir) / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(store_dir: Path) -> Optional[Dict[str, Any]]:
+    """manifest.json of a store directory, None if absent or unreadable"""
+    try:
+        with open(Path(store_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
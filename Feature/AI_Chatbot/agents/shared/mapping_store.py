@@ -0,0 +1,431 @@
+"""
+Store mapping backends
+Per-user lookup of uploaded file entries, either from the store_mapping.json
+document or from an indexed SQLite database built from it
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+# Change-log versions kept in SQLite for watchers that fall behind
+CHANGE_LOG_VERSIONS = 1000
+
+
+class MappingStore(ABC):
+    """
+    Interface shared by mapping backends
+
+    A mapping has the shape written by `gemini_file_search.py setup`:
+    {"user_stores": {user_id: store}, "knowledge_store": store, "summary": {...}}
+    where each store holds user_name, store_id and a list of file entries.
+    """
+
+    @abstractmethod
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Store record of one user, or None if unknown"""
+
+    @abstractmethod
+    def get_knowledge(self) -> Optional[Dict[str, Any]]:
+        """Knowledge store record shared by all users"""
+
+    @abstractmethod
+    def list_users(self) -> Dict[str, str]:
+        """user_id -> user_name for every user"""
+
+    @abstractmethod
+    def summary(self) -> Dict[str, Any]:
+        """Summary section of the mapping"""
+
+    @abstractmethod
+    def export(self) -> Dict[str, Any]:
+        """Whole mapping as a JSON-compatible dict"""
+
+    @abstractmethod
+    def replace(self, mapping: Dict[str, Any]):
+        """Atomically replace the whole mapping"""
+
+    @abstractmethod
+    def update_stores(
+        self,
+        user_stores: Dict[str, Dict[str, Any]],
+        knowledge_store: Optional[Dict[str, Any]] = None
+    ):
+        """Atomically replace the given user stores (and the knowledge store, if passed)"""
+
+    @abstractmethod
+    def exists(self) -> bool:
+        """True once a mapping has been written"""
+
+    @abstractmethod
+    def version(self) -> Any:
+        """Cheap token that changes whenever the mapping is rewritten"""
+
+    def reload(self) -> 'MappingStore':
+        """Store serving the latest mapping (self if the backend reads live)"""
+        return self
+
+    @abstractmethod
+    def changed_users(self, previous: 'MappingStore', since_version: Any) -> Set[str]:
+        """Users whose store differs from `previous` / changed after since_version"""
+
+    def close(self):
+        pass
+
+
+class JsonMappingStore(MappingStore):
+    """store_mapping.json, loaded whole on first access"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._mapping: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _data(self) -> Dict[str, Any]:
+        if self._mapping is None:
+            with self._lock:
+                if self._mapping is None:
+                    with open(self.path, 'r') as f:
+                        self._mapping = json.load(f)
+        return self._mapping
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._data().get('user_stores', {}).get(user_id)
+
+    def get_knowledge(self) -> Optional[Dict[str, Any]]:
+        return self._data().get('knowledge_store')
+
+    def list_users(self) -> Dict[str, str]:
+        return {
+            user_id: data['user_name']
+            for user_id, data in self._data().get('user_stores', {}).items()
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return self._data().get('summary', {})
+
+    def export(self) -> Dict[str, Any]:
+        return self._data()
+
+    def replace(self, mapping: Dict[str, Any]):
+        write_json_atomic(mapping, self.path)
+        self._mapping = mapping
+
+    def update_stores(
+        self,
+        user_stores: Dict[str, Dict[str, Any]],
+        knowledge_store: Optional[Dict[str, Any]] = None
+    ):
+        mapping = json.loads(json.dumps(self._data()))
+        mapping.setdefault('user_stores', {}).update(user_stores)
+        if knowledge_store is not None:
+            mapping['knowledge_store'] = knowledge_store
+        self.replace(mapping)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def version(self) -> Any:
+        # A rewrite through write_json_atomic replaces the inode
+        stat = self.path.stat()
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def reload(self) -> 'MappingStore':
+        store = JsonMappingStore(self.path)
+        store._data()
+        return store
+
+    def changed_users(self, previous: MappingStore, since_version: Any) -> Set[str]:
+        old = previous.export().get('user_stores', {})
+        new = self._data().get('user_stores', {})
+        return {
+            user_id
+            for user_id in old.keys() | new.keys()
+            if old.get(user_id) != new.get(user_id)
+        }
+
+
+class SqliteMappingStore(MappingStore):
+    """
+    Mapping indexed by user_id in SQLite
+
+    Opening is O(1) and each user lookup is one primary-key (B-tree) read,
+    so workers neither parse nor hold the mapping of every user. Each
+    thread gets its own connection; WAL mode lets readers continue while
+    the uploader writes.
+
+    Every write bumps a version counter and logs the affected user_ids,
+    so readers can find out which users changed since the version they
+    last saw.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_stores ("
+            "user_id TEXT PRIMARY KEY, user_name TEXT NOT NULL, data TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            "version INTEGER NOT NULL, user_id TEXT NOT NULL"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS changes_version ON changes (version)")
+        conn.commit()
+
+    def _meta(self, key: str) -> Optional[Any]:
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT data FROM user_stores WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_knowledge(self) -> Optional[Dict[str, Any]]:
+        return self._meta('knowledge_store')
+
+    def list_users(self) -> Dict[str, str]:
+        return dict(self._connection().execute(
+            "SELECT user_id, user_name FROM user_stores ORDER BY user_id"
+        ))
+
+    def summary(self) -> Dict[str, Any]:
+        return self._meta('summary') or {}
+
+    def export(self) -> Dict[str, Any]:
+        user_stores = {
+            user_id: json.loads(data)
+            for user_id, data in self._connection().execute(
+                "SELECT user_id, data FROM user_stores ORDER BY user_id"
+            )
+        }
+        return {
+            "user_stores": user_stores,
+            "knowledge_store": self.get_knowledge(),
+            "summary": self.summary()
+        }
+
+    def _write(self, conn: sqlite3.Connection, user_stores: Dict[str, str], removed: List[str] = ()):
+        """Upsert serialized user stores, delete removed users and log both"""
+        conn.executemany(
+            "INSERT OR REPLACE INTO user_stores (user_id, user_name, data) VALUES (?, ?, ?)",
+            (
+                (user_id, json.loads(data).get('user_name', user_id), data)
+                for user_id, data in user_stores.items()
+            )
+        )
+        conn.executemany("DELETE FROM user_stores WHERE user_id = ?", ((user_id,) for user_id in removed))
+        
+        version = self._bump_version(conn)
+        conn.executemany(
+            "INSERT INTO changes (version, user_id) VALUES (?, ?)",
+            ((version, user_id) for user_id in [*user_stores, *removed])
+        )
+        conn.execute("DELETE FROM changes WHERE version <= ?", (version - CHANGE_LOG_VERSIONS,))
+    
+    def _bump_version(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        version = (json.loads(row[0]) if row else 0) + 1
+        self._set_meta(conn, 'version', version)
+        return version
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: Any):
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))
+        )
+
+    def replace(self, mapping: Dict[str, Any]):
+        conn = self._connection()
+        new = {
+            user_id: json.dumps(store)
+            for user_id, store in mapping.get('user_stores', {}).items()
+        }
+        with conn:
+            # Only rewrite (and log) users whose store actually changed
+            existing = dict(conn.execute("SELECT user_id, data FROM user_stores"))
+            changed = {user_id: data for user_id, data in new.items() if existing.get(user_id) != data}
+            removed = [user_id for user_id in existing if user_id not in new]
+            
+            self._write(conn, changed, removed)
+            self._set_meta(conn, 'knowledge_store', mapping.get('knowledge_store'))
+            self._set_meta(conn, 'summary', mapping.get('summary', {}))
+
+    def update_stores(
+        self,
+        user_stores: Dict[str, Dict[str, Any]],
+        knowledge_store: Optional[Dict[str, Any]] = None
+    ):
+        conn = self._connection()
+        with conn:
+            self._write(conn, {user_id: json.dumps(store) for user_id, store in user_stores.items()})
+            if knowledge_store is not None:
+                self._set_meta(conn, 'knowledge_store', knowledge_store)
+
+    def exists(self) -> bool:
+        return self._meta('summary') is not None
+
+    def version(self) -> Any:
+        return self._meta('version') or 0
+
+    def changed_users(self, previous: MappingStore, since_version: Any) -> Set[str]:
+        conn = self._connection()
+        oldest = conn.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+        if oldest is not None and since_version + 1 < oldest:
+            # Change log no longer covers since_version: treat everyone as changed
+            return set(self.list_users()) | set(previous.list_users())
+        
+        return {
+            row[0] for row in conn.execute(
+                "SELECT DISTINCT user_id FROM changes WHERE version > ?", (since_version,)
+            )
+        }
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class MappingWatcher:
+    """
+    Keeps a mapping store current while the chatbot runs
+
+    A background thread polls the store's version every `interval`
+    seconds. On a change it loads the new mapping off the request path,
+    swaps it in with a single reference assignment (requests in flight
+    keep the snapshot they started with), then notifies listeners with the
+    changed user_ids and whether the knowledge store changed.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self.store = open_mapping_store(path)
+        self._version = self.store.version()
+        self._knowledge = self.store.get_knowledge()
+        self._listeners: List[Callable[[Set[str], bool], None]] = []
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, listener: Callable[[Set[str], bool], None]):
+        """Call listener(changed_user_ids, knowledge_changed) after each reload"""
+        self._listeners.append(listener)
+
+    def check(self) -> bool:
+        """
+        Reload if the mapping changed
+
+        Returns:
+            True if a new mapping was swapped in
+        """
+        with self._check_lock:
+            try:
+                version = self.store.version()
+                if version == self._version:
+                    return False
+
+                previous = self.store
+                store = previous.reload()
+                changed = store.changed_users(previous, self._version)
+                knowledge = store.get_knowledge()
+            except Exception as e:
+                # Keep serving the current mapping and retry on the next poll
+                logger.warning(f"Mapping reload failed, keeping current mapping: {e}")
+                return False
+
+            knowledge_changed = knowledge != self._knowledge
+            self.store = store
+            self._version = version
+            self._knowledge = knowledge
+
+        logger.info(
+            f"Reloaded mapping {self.path}: {len(changed)} users changed"
+            f"{', knowledge store changed' if knowledge_changed else ''}"
+        )
+        for listener in self._listeners:
+            try:
+                listener(changed, knowledge_changed)
+            except Exception as e:
+                logger.error(f"Mapping reload listener failed: {e}")
+        return True
+
+    def start(self):
+        """Start polling in a daemon thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="mapping-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+def write_json_atomic(data: Dict[str, Any], path: Path):
+    """Write JSON via a temp file + rename, readers never see a partial file"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def open_mapping_store(path: str) -> MappingStore:
+    """
+    Mapping backend for a path: SQLite for .db/.sqlite/.sqlite3, else JSON
+
+    Args:
+        path: Mapping file
+
+    Returns:
+        MappingStore for the file (a SQLite file is created if missing)
+    """
+    if Path(path).suffix.lower() in SQLITE_SUFFIXES:
+        return SqliteMappingStore(path)
+    return JsonMappingStore(path)
@@ -0,0 +1,99 @@
+"""
+Rate limiting and retry helpers for Gemini API calls
+"""
+
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying: quota exhaustion and server-side errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Tokens refill continuously at `rate` per second up to `capacity`;
+    acquire() blocks until enough tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` can be taken from the bucket"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for 429/5xx API errors, timeouts and connection failures"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+
+    # Transport errors (timeouts, resets, DNS) carry no status code
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_retry(
+    func: Callable[..., Any],
+    *args: Any,
+    max_attempts: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    rate_limiter: Optional[TokenBucket] = None,
+    **kwargs: Any
+) -> Any:
+    """
+    Call func, retrying retryable errors with exponential backoff and jitter
+
+    Every attempt (including retries) first takes a token from rate_limiter,
+    so retries count against the same quota.
+
+    Raises:
+        The last error once attempts are exhausted, or any non-retryable error
+    """
+    for attempt in range(max_attempts):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        try:
+            return func(*args, **kwargs)
+
+        except Exception as e:
+            if attempt + 1 >= max_attempts or not is_retryable(e):
+                raise
+
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"Retryable error ({e}); retry {attempt + 1}/{max_attempts - 1} in {delay:.1f}s")
+            time.sleep(delay)
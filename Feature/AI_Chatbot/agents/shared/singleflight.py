@@ -0,0 +1,91 @@
+"""
+Request coalescing
+Concurrent calls with the same key share one execution: the first caller
+runs the function, callers arriving while it is in flight wait for and
+receive its result (or exception). Nothing is cached once the call
+completes, so later calls run again.
+"""
+
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls
+
+    do() serves threads, ado() coroutines on one event loop; the two keep
+    separate in-flight tables.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, Any] = {}  # key -> asyncio.Task
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, bool]:
+        """
+        Run fn(*args, **kwargs) unless a call with this key is in flight
+
+        Returns:
+            (result, shared); shared is True for callers that received
+            another caller's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def ado(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Tuple[Any, bool]:
+        """
+        Async variant of do() for coroutine functions
+
+        The call runs as its own task, so a caller that is cancelled (e.g.
+        a client disconnect) does not cancel it for the others.
+        """
+        import asyncio
+
+        task = self._tasks.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        self._tasks[key] = task
+
+        def forget(_):
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+        task.add_done_callback(forget)
+        return await asyncio.shield(task), False
+
+    def in_flight(self) -> int:
+        """Calls currently executing"""
+        return len(self._calls) + len(self._tasks)
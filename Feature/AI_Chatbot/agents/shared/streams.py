@@ -0,0 +1,41 @@
+"""
+Context isolation for streaming generators
+A generator that opens a contextvar scope (trace span, usage labels,
+deadline) and yields inside it would otherwise leak that scope into its
+consumer between chunks, and an abandoned stream would be closed from
+whatever context the garbage collector runs in. isolated_stream() runs
+every step of the generator, and its close(), in one private copy of the
+creating context, so scopes opened inside stay inside.
+"""
+
+import contextvars
+from typing import Generator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def isolated_stream(stream: Generator[T, None, R]) -> Generator[T, None, R]:
+    """
+    Wrap a generator so it runs in a copy of the current context
+
+    Args:
+        stream: Generator created by the caller (not started yet)
+
+    Returns:
+        Generator yielding the same items and returning the same value
+    """
+    return _run_in(contextvars.copy_context(), stream)
+
+
+def _run_in(context: contextvars.Context, stream: Generator[T, None, R]) -> Generator[T, None, R]:
+    try:
+        while True:
+            try:
+                item = context.run(next, stream)
+            except StopIteration as stop:
+                return stop.value
+            yield item
+    finally:
+        # Abandoned streams unwind their scopes in their own context too
+        context.run(stream.close)
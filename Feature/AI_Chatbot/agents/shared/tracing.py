@@ -0,0 +1,260 @@
+"""
+Lightweight request tracing
+Spans time the stages of a chat turn (context lookup, guard, routing,
+Gemini call, formatting) and carry attributes such as model, file count,
+token usage and cache hits. Finished spans are appended to a JSONL file
+and aggregated into Prometheus-style metrics.
+
+Tracing is off unless enabled with configure() or CHATBOT_TRACE=1
+(CHATBOT_TRACE_FILE=<path> also enables it and sets the JSONL file).
+While off, span() returns a shared no-op span, so instrumented code pays
+one attribute check per stage.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from contextvars import ContextVar
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+# Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    One timed stage of a trace; use as a context manager
+
+    Spans opened inside another span (same thread, task or copied
+    context) become its children and share its trace_id.
+    """
+
+    __slots__ = (
+        'tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'attributes',
+        'timings', 'started_at', 'duration_ms', '_start', '_token'
+    )
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        # Inclusive milliseconds per stage name, shared by the whole trace
+        self.timings = parent.timings if parent else {}
+        self.attributes = attributes
+        self.started_at = 0.0
+        self.duration_ms = 0.0
+
+    def set(self, **attributes: Any):
+        """Add or overwrite span attributes"""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        _current_span.reset(self._token)
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled"""
+
+    __slots__ = ()
+    trace_id = None
+
+    def set(self, **attributes: Any):
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, Any], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+
+class Tracer:
+    """
+    Creates spans and aggregates finished ones
+
+    Metrics (per process):
+        chatbot_span_duration_seconds: histogram per span name
+        chatbot_span_errors_total: spans that ended with an error attribute
+        chatbot_tokens_total: Gemini tokens by model and kind (input/output/cached)
+        chatbot_cache_total: cache lookups by cache and result (hit/miss)
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+        self._durations: Dict[str, list] = {}  # span name -> [bucket counts..., sum, count]
+        self._counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+
+    def configure(self, enabled: bool = True, path: Optional[str] = None):
+        """
+        Turn tracing on or off
+
+        Args:
+            enabled: Record spans and metrics
+            path: JSONL file finished spans are appended to (None = metrics only)
+        """
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self.path = path
+            if enabled and path:
+                # One write() per span on an O_APPEND descriptor, so lines
+                # from concurrent threads or worker processes never interleave
+                self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self.enabled = enabled
+
+    def span(self, name: str, **attributes: Any):
+        """Context manager timing a stage; a no-op while disabled"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, _current_span.get(), attributes)
+
+    def current(self):
+        """Innermost open span, or the no-op span"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return _current_span.get() or NOOP_SPAN
+
+    def count(self, name: str, value: float = 1, **labels: Any):
+        """Increment a labelled counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def cache(self, cache: str, hit: bool):
+        """Record a cache lookup on the current span and in the cache counter"""
+        if not self.enabled:
+            return
+        result = 'hit' if hit else 'miss'
+        self.current().set(**{f"{cache}_cache": result})
+        self.count('chatbot_cache_total', cache=cache, result=result)
+
+    def record_usage(self, usage_metadata: Any, model: str):
+        """
+        Record token usage of a Gemini response on the current span
+
+        Args:
+            usage_metadata: response.usage_metadata (None is ignored)
+            model: Model name used for the call
+        """
+        if not self.enabled or usage_metadata is None:
+            return
+        tokens = {
+            'input': usage_metadata.prompt_token_count,
+            'output': usage_metadata.candidates_token_count,
+            'cached': usage_metadata.cached_content_token_count
+        }
+        span = self.current()
+        for kind, value in tokens.items():
+            if value:
+                span.set(**{f"{kind}_tokens": value})
+                self.count('chatbot_tokens_total', value, model=model, kind=kind)
+
+    def _finish(self, span: Span):
+        seconds = span.duration_ms / 1000
+        line = None
+        if self._fd is not None:
+            line = (json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n").encode('utf-8')
+
+        with self._lock:
+            span.timings[span.name] = span.timings.get(span.name, 0.0) + span.duration_ms
+
+            histogram = self._durations.get(span.name)
+            if histogram is None:
+                histogram = self._durations[span.name] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+            if 'error' in span.attributes:
+                self._counters[('chatbot_span_errors_total', (('span', span.name),))] += 1
+
+            if line is not None and self._fd is not None:
+                os.write(self._fd, line)
+
+    def render_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP chatbot_span_duration_seconds Duration of traced chat stages",
+            "# TYPE chatbot_span_duration_seconds histogram"
+        ]
+        for name in sorted(durations):
+            values = durations[name]
+            for bound, count in zip(DURATION_BUCKETS, values):
+                lines.append(f'chatbot_span_duration_seconds_bucket{{span="{_escape_label(name)}",le="{bound}"}} {count}')
+            lines.append(f'chatbot_span_duration_seconds_bucket{{span="{_escape_label(name)}",le="+Inf"}} {values[-1]}')
+            lines.append(f'chatbot_span_duration_seconds_sum{{span="{_escape_label(name)}"}} {values[-2]:.6f}')
+            lines.append(f'chatbot_span_duration_seconds_count{{span="{_escape_label(name)}"}} {values[-1]}')
+
+        for metric in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop aggregated metrics"""
+        with self._lock:
+            self._durations.clear()
+            self._counters.clear()
+
+
+tracer = Tracer()
+
+if os.getenv('CHATBOT_TRACE') or os.getenv('CHATBOT_TRACE_FILE'):
+    tracer.configure(enabled=os.getenv('CHATBOT_TRACE', '1') != '0', path=os.getenv('CHATBOT_TRACE_FILE'))
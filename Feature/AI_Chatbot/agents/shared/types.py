@@ -17,6 +17,7 @@ class UserContext:
     file_resources: List[Dict[str, str]] = None  # List of {'uri': ..., 'name': ...}
     currency: str = "USD"
     language: str = "vi"  # Language: 'vi' (Vietnamese) or 'en' (English)
+    fingerprint: Optional[str] = None  # Changes whenever the user's or knowledge files change
 
 
 @dataclass
@@ -25,6 +26,7 @@ class QueryOptions:
     include_knowledge_store: bool = True
     max_results: int = 10
     model: str = "gemini-2.0-flash"
+    max_fan_out: int = 2  # Max specialist agents queried in parallel for one request
 
 
 @dataclass
@@ -0,0 +1,292 @@
+"""
+Token usage accounting
+Every Gemini call (guard, specialist agents) reports its usage metadata
+here. Counts are attributed to the user and agent of the current chat turn,
+accumulated in memory and periodically added to a local SQLite ledger with
+one row per (day, user, agent, model).
+
+Off unless a ledger is configured with configure() or
+CHATBOT_USAGE_DB=<file> (DEFAULT_USAGE_DB is the conventional name).
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USAGE_DB = 'usage.db'
+UNKNOWN = 'unknown'
+
+# Columns a report can group by
+GROUP_COLUMNS = ('day', 'user_id', 'agent', 'model')
+
+# USD per 1M tokens (input, cached input, output), used for cost estimates
+# only; check current Gemini pricing before relying on the figures
+MODEL_PRICES = {
+    'gemini-2.5-flash': (0.30, 0.075, 2.50),
+    'gemini-2.5-pro': (1.25, 0.31, 10.00),
+    'gemini-2.0-flash': (0.10, 0.025, 0.40),
+    'gemini-2.0-flash-exp': (0.10, 0.025, 0.40),
+}
+
+_labels: ContextVar[Dict[str, str]] = ContextVar('usage_labels', default={})
+
+
+@contextmanager
+def usage_scope(**labels: str) -> Iterator[None]:
+    """
+    Attribute Gemini calls made inside the block to user_id and/or agent
+
+    Scopes nest; inner labels override outer ones.
+    """
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, output_tokens: int) -> Optional[float]:
+    """Estimated USD for a token count, None for models without a price"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    # Cached tokens are part of the prompt count and billed at the cached rate
+    return (
+        (prompt_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+class UsageLedger:
+    """
+    Per-day, per-user, per-agent, per-model token totals in SQLite
+
+    record() only updates an in-memory table; rows are upserted (added to
+    the stored totals) by flush(). A background thread flushes every
+    flush_interval seconds or flush_every calls, so callers (e.g. the
+    server's event loop) never wait for SQLite locks. close() flushes at
+    interpreter exit. Several processes can share one database.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_interval: float = 5.0, flush_every: int = 100):
+        """
+        Args:
+            path: SQLite file (None disables recording)
+            flush_interval: Max seconds between writes
+            flush_every: Calls buffered before a write
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+
+        self._pending: Dict[tuple, List[int]] = {}  # (day, user, agent, model) -> [calls, prompt, cached, output]
+        self._pending_calls = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def configure(self, path: Optional[str]):
+        """Switch to another database (None disables); pending counts are written first"""
+        self.flush()
+        with self._flush_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.path = path
+
+    def record(self, usage_metadata: Any, model: str, user_id: Optional[str] = None, agent: Optional[str] = None):
+        """
+        Add one call's usage
+
+        Args:
+            usage_metadata: response.usage_metadata (None counts the call only)
+            model: Model name
+            user_id: User, else the current usage_scope's
+            agent: Agent, else the current usage_scope's
+        """
+        if not self.path:
+            return
+
+        labels = _labels.get()
+        key = (
+            time.strftime('%Y-%m-%d', time.gmtime()),
+            user_id or labels.get('user_id', UNKNOWN),
+            agent or labels.get('agent', UNKNOWN),
+            model
+        )
+
+        prompt = cached = output = 0
+        if usage_metadata is not None:
+            prompt = usage_metadata.prompt_token_count or 0
+            cached = usage_metadata.cached_content_token_count or 0
+            # Thinking tokens are billed as output
+            output = (usage_metadata.candidates_token_count or 0) + (usage_metadata.thoughts_token_count or 0)
+
+        with self._lock:
+            totals = self._pending.get(key)
+            if totals is None:
+                totals = self._pending[key] = [0, 0, 0, 0]
+            totals[0] += 1
+            totals[1] += prompt
+            totals[2] += cached
+            totals[3] += output
+            self._pending_calls += 1
+            due = self._pending_calls >= self.flush_every
+
+            # Started on first use: server workers are forked after import,
+            # and a forked child has no threads of its parent
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name='usage-flush', daemon=True)
+                self._flusher.start()
+
+        if due:
+            self._wake.set()
+
+    def _flush_loop(self):
+        """Background writer: flush every flush_interval, or sooner when woken"""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "day TEXT NOT NULL, user_id TEXT NOT NULL, agent TEXT NOT NULL, model TEXT NOT NULL, "
+                "calls INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL, "
+                "cached_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, "
+                "PRIMARY KEY (day, user_id, agent, model)"
+                ") WITHOUT ROWID"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def flush(self):
+        """Add buffered counts to the database"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_calls = 0
+            self._last_flush = time.monotonic()
+
+        if not pending or not self.path:
+            return
+
+        with self._flush_lock:
+            try:
+                conn = self._connection()
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (day, user_id, agent, model) DO UPDATE SET "
+                        "calls = calls + excluded.calls, "
+                        "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                        "cached_tokens = cached_tokens + excluded.cached_tokens, "
+                        "output_tokens = output_tokens + excluded.output_tokens",
+                        [(*key, *totals) for key, totals in pending.items()]
+                    )
+            except sqlite3.Error as e:
+                # Accounting must never fail a chat; the counts are lost
+                logger.error(f"Usage flush to {self.path} failed: {e}")
+
+    def report(
+        self,
+        group_by: Sequence[str] = ('user_id',),
+        since: Optional[str] = None,
+        limit: Optional[int] = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        Token totals grouped by some of day/user_id/agent/model, largest first
+
+        Args:
+            group_by: Columns to group by
+            since: First day included (YYYY-MM-DD)
+            limit: Max rows (None = all)
+
+        Returns:
+            Rows with the group columns, calls, token counts and estimated
+            cost (None when a group mixes in unpriced models)
+        """
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown or not group_by:
+            raise ValueError(f"group_by must be a subset of {GROUP_COLUMNS}")
+
+        self.flush()
+        if not self.path or not os.path.exists(self.path):
+            return []
+
+        # Group per model as well so cost can be priced, then merge
+        columns = list(dict.fromkeys([*group_by, 'model']))
+        query = (
+            f"SELECT {', '.join(columns)}, SUM(calls), SUM(prompt_tokens), SUM(cached_tokens), SUM(output_tokens) "
+            f"FROM usage {'WHERE day >= ?' if since else ''} GROUP BY {', '.join(columns)}"
+        )
+        with self._flush_lock:
+            rows = self._connection().execute(query, (since,) if since else ()).fetchall()
+
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            values = dict(zip(columns, row))
+            calls, prompt, cached, output = row[len(columns):]
+            key = tuple(values[column] for column in group_by)
+
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {
+                    **{column: values[column] for column in group_by},
+                    "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "cost_usd": 0.0
+                }
+            entry["calls"] += calls
+            entry["prompt_tokens"] += prompt
+            entry["cached_tokens"] += cached
+            entry["output_tokens"] += output
+
+            cost = estimate_cost(values['model'], prompt, cached, output)
+            entry["cost_usd"] = None if cost is None or entry["cost_usd"] is None else entry["cost_usd"] + cost
+
+        ordered = sorted(
+            merged.values(),
+            key=lambda entry: (entry["prompt_tokens"] + entry["output_tokens"], entry["calls"]),
+            reverse=True
+        )
+        return ordered[:limit] if limit else ordered
+
+    def close(self):
+        self.flush()
+        with self._flush_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Opt-in: set CHATBOT_USAGE_DB (or pass --usage-db) to keep a ledger
+ledger = UsageLedger(os.getenv('CHATBOT_USAGE_DB') or None)
+atexit.register(ledger.close)
+
+
+def record_usage(usage_metadata: Any, model: str, user_id: Optional[str] = None, agent: Optional[str] = None):
+    """Account a Gemini response's usage in the ledger and on the current trace span"""
+    tracer.record_usage(usage_metadata, model)
+    ledger.record(usage_metadata, model, user_id=user_id, agent=agent)
@@ -3,20 +3,15 @@ Spending Insights Agent
 Analyzes spending trends, patterns, anomalies
 """
 
-import logging
-from typing import Dict, Any
-from .shared import UserContext, QueryOptions, AgentResponse, FileSearchClient
+from .shared import UserContext, QueryOptions, AgentResponse, SpecialistAgent
 
-logger = logging.getLogger(__name__)
 
-
-class SpendingInsightsAgent:
+class SpendingInsightsAgent(SpecialistAgent):
     """Agent specialized in spending pattern analysis"""
     
-    def __init__(self, file_search_client: FileSearchClient):
-        self.client = file_search_client
-        self.name = "SpendingInsights"
-        logger.info(f"Initialized {self.name}")
+    name = "SpendingInsights"
+    query_type = "spending_insights"
+    confidence = 0.85
     
     def analyze(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
         """
@@ -30,8 +25,14 @@ class SpendingInsightsAgent:
         Returns:
             AgentResponse with insights
         """
-        logger.info(f"[{self.name}] Analyzing: {query}")
-        
+        return self.run(user_context, query, options)
+    
+    async def aanalyze(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
+        """Async variant of analyze()"""
+        return await self.arun(user_context, query, options)
+    
+    def build_query(self, user_context: UserContext, query: str) -> str:
+        """Wrap the query in the SpendingInsights prompt"""
         # Enhance query for insights analysis
         if user_context.language == "vi":
             enhanced_query = f"""Phân tích chi tiêu - TRẢ LỜI NGẮN GỌN.
@@ -61,37 +62,4 @@ Look at transaction summaries and CSV files across available months.
 Compare current month {user_context.active_month} with previous months if relevant.
 """
         
-        try:
-            result = self.client.query(
-                user_context=user_context,
-                query_text=enhanced_query,
-                options=options
-            )
-            
-            if result['success']:
-                return AgentResponse(
-                    success=True,
-                    agent=self.name,
-                    response=result['result'],
-                    confidence=0.85,
-                    metadata={
-                        "query_type": "spending_insights",
-                        "stores_queried": result.get('stores', [])
-                    }
-                )
-            else:
-                return AgentResponse(
-                    success=False,
-                    agent=self.name,
-                    response="",
-                    error=result.get('error', 'Unknown error')
-                )
-        
-        except Exception as e:
-            logger.error(f"[{self.name}] Error: {e}")
-            return AgentResponse(
-                success=False,
-                agent=self.name,
-                response="",
-                error=str(e)
-            )
+        return enhanced_query
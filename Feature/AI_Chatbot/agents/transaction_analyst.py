@@ -3,20 +3,15 @@ Transaction Analyst Agent
 Analyzes transactions, totals by category/date, largest transactions, recurring patterns
 """
 
-import logging
-from typing import Dict, Any
-from .shared import UserContext, QueryOptions, AgentResponse, FileSearchClient
+from .shared import UserContext, QueryOptions, AgentResponse, SpecialistAgent
 
-logger = logging.getLogger(__name__)
 
-
-class TransactionAnalystAgent:
+class TransactionAnalystAgent(SpecialistAgent):
     """Agent specialized in transaction analysis"""
     
-    def __init__(self, file_search_client: FileSearchClient):
-        self.client = file_search_client
-        self.name = "TransactionAnalyst"
-        logger.info(f"Initialized {self.name}")
+    name = "TransactionAnalyst"
+    query_type = "transaction_analysis"
+    confidence = 0.9
     
     def analyze(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
         """
@@ -30,8 +25,14 @@ class TransactionAnalystAgent:
         Returns:
             AgentResponse with analysis
         """
-        logger.info(f"[{self.name}] Analyzing: {query}")
-        
+        return self.run(user_context, query, options)
+    
+    async def aanalyze(self, user_context: UserContext, query: str, options: QueryOptions = None) -> AgentResponse:
+        """Async variant of analyze()"""
+        return await self.arun(user_context, query, options)
+    
+    def build_query(self, user_context: UserContext, query: str) -> str:
+        """Wrap the query in the TransactionAnalyst prompt"""
         # Enhance query for transaction-specific analysis
         if user_context.language == "vi":
             enhanced_query = f"""Phân tích giao dịch - TRẢ LỜI NGẮN GỌN.
@@ -60,37 +61,4 @@ Focus on transactions from {user_context.active_month} unless otherwise specifie
 Use the transactions CSV file and summary markdown for accurate data.
 """
         
-        try:
-            result = self.client.query(
-                user_context=user_context,
-                query_text=enhanced_query,
-                options=options
-            )
-            
-            if result['success']:
-                return AgentResponse(
-                    success=True,
-                    agent=self.name,
-                    response=result['result'],
-                    confidence=0.9,
-                    metadata={
-                        "query_type": "transaction_analysis",
-                        "stores_queried": result.get('stores', [])
-                    }
-                )
-            else:
-                return AgentResponse(
-                    success=False,
-                    agent=self.name,
-                    response="",
-                    error=result.get('error', 'Unknown error')
-                )
-        
-        except Exception as e:
-            logger.error(f"[{self.name}] Error: {e}")
-            return AgentResponse(
-                success=False,
-                agent=self.name,
-                response="",
-                error=str(e)
-            )
+        return enhanced_query
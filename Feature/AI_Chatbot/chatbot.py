@@ -3,17 +3,32 @@ Personal Finance AI Chatbot
 Main chatbot interface using Gemini File Search and specialized agents
 """
 
-import os
+import sys
 import json
+import time
 import logging
+import threading
+import dataclasses
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, Generator, List, Optional, Set, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 
-from agents.shared import UserContext, QueryOptions, FileSearchClient
-from agents.router_agent import RouterAgent
-from agents.guard_agent import GuardAgent
+from agents.shared import UserContext, QueryOptions, AgentResponse, tracer
+from agents.shared.mapping_store import MappingStore, MappingWatcher
+from agents.shared.manifest import combine_fingerprints
+from agents.shared.usage import ledger, usage_scope
+from agents.shared.cassette import cassette
+from agents.shared.singleflight import SingleFlight
+from agents.shared.streams import isolated_stream
+from agents.shared import deadline
+from agents.shared.deadline import deadline_scope, hedging
+
+if TYPE_CHECKING:
+    from agents.shared import FileSearchClient
+    from agents.router_agent import RouterAgent
+    from agents.guard_agent import GuardAgent
 
 load_dotenv()
 
@@ -24,44 +39,155 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Answer when the guard missed the deadline: the query was never checked,
+# so no user data is served for it
+_GUARD_TIMEOUT_MESSAGE = {
+    "vi": "Xin lỗi, trợ lý đang phản hồi chậm. Vui lòng thử lại sau giây lát.",
+    "en": "Sorry, the assistant is responding slowly. Please try again in a moment."
+}
+
+# Put in front of a local summary served when the agents missed the deadline
+_FALLBACK_NOTICE = {
+    "vi": "⏱️ Trợ lý AI đang phản hồi chậm. Dưới đây là tóm tắt tài chính tháng {month} từ dữ liệu của bạn:\n\n",
+    "en": "⏱️ The AI assistant is responding slowly. Here is your {month} financial summary from your data:\n\n"
+}
+
 
 class PersonalFinanceChatbot:
     """
     AI Chatbot for personal finance queries
     """
     
-    def __init__(self, store_mapping_path: str = 'store_mapping.json'):
+    def __init__(
+        self,
+        store_mapping_path: str = 'store_mapping.json',
+        use_preflight: bool = False,
+        reload_interval: Optional[float] = 5.0,
+        context_cache_size: int = 10000,
+        coalesce: bool = True,
+        request_timeout: Optional[float] = None,
+        guard_share: float = 0.3,
+        local_data_dir: str = 'cleaned_data'
+    ):
         """
         Initialize chatbot with store mapping
         
         Args:
-            store_mapping_path: Path to store mapping JSON file
+            store_mapping_path: Path to store mapping (JSON, or SQLite for .db/.sqlite)
+            use_preflight: Use one structured guard call that also returns
+                intent, period and language instead of keyword routing
+            reload_interval: Seconds between checks for a rewritten mapping,
+                from the first query on (None disables hot reload)
+            context_cache_size: Max users whose UserContext is kept built
+            coalesce: Let concurrent identical (user, query) requests share
+                one guard + agent execution and its result
+            request_timeout: Seconds a chat turn may take (None = no
+                deadline); a turn that runs out is answered from local data
+            guard_share: Part of the deadline given to the guard call, the
+                agents get what it leaves
+            local_data_dir: Cleaned data (data_cleaner.py output) used for
+                deadline fallback answers
         """
         logger.info("Initializing Personal Finance Chatbot")
         
-        # Load store mapping
-        self.store_mapping = self._load_store_mapping(store_mapping_path)
-        
-        # Get knowledge store ID
-        knowledge_store_id = None
-        if self.store_mapping.get('knowledge_store'):
-            knowledge_store_id = self.store_mapping['knowledge_store']['store_id']
-        
-        # Initialize file search client
-        self.file_search_client = FileSearchClient(
-            knowledge_store_id=knowledge_store_id
-        )
-        
-        # Initialize guard agent
-        self.guard = GuardAgent()
-        
-        # Initialize router agent
-        self.router = RouterAgent(self.file_search_client)
-        
-        logger.info("Chatbot initialized with GuardAgent and RouterAgent")
+        self.use_preflight = use_preflight
+        
+        # user_id -> UserContext, least recently used first
+        self._context_cache: OrderedDict = OrderedDict()
+        self._context_cache_size = context_cache_size
+        self._context_lock = threading.Lock()
+        self._context_generation = 0  # Bumped by reloads, drops contexts built from an older mapping
+        self._month = None
+        self._month_ends = 0.0
+        
+        # Double submits and client retries arrive while the first request
+        # is still running; they wait for its result instead of calling Gemini again
+        self._in_flight = SingleFlight() if coalesce else None
+        
+        self.request_timeout = request_timeout
+        self.guard_share = guard_share
+        self.local_data_dir = Path(local_data_dir)
+        
+        # Open store mapping (users are looked up on demand) and pick up
+        # rewrites by the uploader without a restart. Polling starts with
+        # the first query or preload(), so one-shot commands such as
+        # --list-users never start the watcher thread
+        self.mapping_watcher = self._load_store_mapping(store_mapping_path)
+        self.mapping_watcher.add_listener(self._on_mapping_reload)
+        if reload_interval:
+            self.mapping_watcher.interval = reload_interval
+        self._watching = not reload_interval
+        
+        # Knowledge files are shared by every user, load them once
+        self.knowledge_store = self.mapping_store.get_knowledge()
+        
+        # Gemini clients and agents (and the SDK itself) load on first
+        # use, so mapping-only commands such as --list-users start fast
+        self._file_search_client = None
+        self._guard = None
+        self._router = None
+        self._init_lock = threading.Lock()
+        
+        logger.info("Chatbot initialized (GuardAgent and RouterAgent load on first query)")
     
-    def _load_store_mapping(self, path: str) -> Dict[str, Any]:
-        """Load store mapping from JSON file"""
+    @property
+    def file_search_client(self) -> 'FileSearchClient':
+        if self._file_search_client is None:
+            with self._init_lock:
+                if self._file_search_client is None:
+                    from agents.shared.file_search_client import FileSearchClient
+                    
+                    # Get knowledge store ID
+                    knowledge_store_id = None
+                    if self.knowledge_store:
+                        knowledge_store_id = self.knowledge_store['store_id']
+                    
+                    self._file_search_client = FileSearchClient(knowledge_store_id=knowledge_store_id)
+        return self._file_search_client
+    
+    @property
+    def guard(self) -> 'GuardAgent':
+        if self._guard is None:
+            with self._init_lock:
+                if self._guard is None:
+                    from agents.guard_agent import GuardAgent
+                    self._guard = GuardAgent()
+        return self._guard
+    
+    @property
+    def router(self) -> 'RouterAgent':
+        if self._router is None:
+            client = self.file_search_client
+            with self._init_lock:
+                if self._router is None:
+                    from agents.router_agent import RouterAgent
+                    self._router = RouterAgent(client)
+        return self._router
+    
+    def preload(self):
+        """Load clients, agents and the SDK now instead of on the first query"""
+        self._watch_mapping()
+        self.guard
+        self.router
+        for intent in ('transactions', 'budget', 'goals', 'insights'):
+            self.router._agent_for_intent(intent)
+    
+    def _watch_mapping(self):
+        """Start polling for mapping rewrites (once)"""
+        if self._watching:
+            return
+        with self._init_lock:
+            if not self._watching:
+                self.mapping_watcher.start()
+                self._watching = True
+    
+    @property
+    def mapping_store(self) -> MappingStore:
+        """Current mapping snapshot (swapped on reload)"""
+        return self.mapping_watcher.store
+    
+    def _load_store_mapping(self, path: str) -> MappingWatcher:
+        """Open the store mapping (JSON file or SQLite index)"""
         mapping_path = Path(path)
         
         if not mapping_path.exists():
@@ -70,33 +196,87 @@ class PersonalFinanceChatbot:
                 "Please run 'python gemini_file_search.py setup' first."
             )
         
-        with open(mapping_path, 'r') as f:
-            mapping = json.load(f)
+        watcher = MappingWatcher(path)
         
-        summary = mapping.get('summary', {})
+        summary = watcher.store.summary()
         logger.info(f"Loaded mapping: {summary.get('total_users', 0)} users, {summary.get('total_files', 0)} files")
-        return mapping
+        return watcher
+    
+    def _on_mapping_reload(self, changed_users: Set[str], knowledge_changed: bool):
+        """Refresh state derived from the mapping after a reload"""
+        if knowledge_changed:
+            self.knowledge_store = self.mapping_store.get_knowledge()
+        
+        with self._context_lock:
+            self._context_generation += 1
+            if knowledge_changed:
+                # Every context embeds the knowledge files
+                self._context_cache.clear()
+            else:
+                for user_id in changed_users:
+                    self._context_cache.pop(user_id, None)
+    
+    def _current_month(self) -> str:
+        """Current YYYY-MM, recomputed only when the month rolls over"""
+        if cassette.mode == 'replay' and cassette.month:
+            # Replayed prompts must embed the month they were recorded in
+            return cassette.month
+        if time.time() >= self._month_ends:
+            now = datetime.now()
+            first_of_next = datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+            self._month = now.strftime('%Y-%m')
+            self._month_ends = first_of_next.timestamp()
+        return self._month
     
     def get_user_context(self, user_id: str) -> Optional[UserContext]:
         """
         Get user context from store mapping
         
+        Contexts are built once per user and cached until a mapping reload
+        changes that user's (or the knowledge) files. Callers get a shallow
+        copy they may modify; the file_resources list is shared and must
+        not be mutated.
+        
         Args:
             user_id: User ID
         
         Returns:
             UserContext or None if user not found
         """
-        user_stores = self.store_mapping.get('user_stores', {})
-        user_data = user_stores.get(user_id)
+        current_month = self._current_month()
+        
+        with self._context_lock:
+            cached = self._context_cache.get(user_id)
+            generation = self._context_generation
+            if cached is not None:
+                self._context_cache.move_to_end(user_id)
+        
+        hit = cached is not None and cached.active_month == current_month
+        tracer.cache('user_context', hit)
+        
+        if not hit:
+            cached = self._build_user_context(user_id, current_month)
+            if cached is None:
+                return None
+            
+            with self._context_lock:
+                if generation != self._context_generation:
+                    return dataclasses.replace(cached)
+                self._context_cache[user_id] = cached
+                self._context_cache.move_to_end(user_id)
+                while len(self._context_cache) > self._context_cache_size:
+                    self._context_cache.popitem(last=False)
+        
+        return dataclasses.replace(cached)
+    
+    def _build_user_context(self, user_id: str, current_month: str) -> Optional[UserContext]:
+        """Build a UserContext from the mapping (uncached)"""
+        user_data = self.mapping_store.get_user(user_id)
         
         if not user_data:
             logger.warning(f"User not found: {user_id}")
             return None
         
-        # Get current month
-        current_month = datetime.now().strftime('%Y-%m')
-        
         # Collect file resources
         file_resources = []
         
@@ -106,10 +286,18 @@ class PersonalFinanceChatbot:
             file_resources.extend(user_data['files'])
             
         # Add knowledge files
-        if self.store_mapping.get('knowledge_store'):
-            k_store = self.store_mapping['knowledge_store']
-            if 'files' in k_store:
-                file_resources.extend(k_store['files'])
+        knowledge_fingerprint = None
+        if self.knowledge_store:
+            file_resources.extend(self.knowledge_store.get('files', []))
+            knowledge_fingerprint = self.knowledge_store.get('fingerprint') or combine_fingerprints(
+                entry['uri'] for entry in self.knowledge_store.get('files', [])
+            )
+        
+        # Mappings written before fingerprints existed: fall back to the
+        # file URIs, which change whenever a file is re-uploaded
+        user_fingerprint = user_data.get('fingerprint') or combine_fingerprints(
+            entry['uri'] for entry in user_data.get('files', [])
+        )
         
         return UserContext(
             user_id=user_id,
@@ -118,7 +306,8 @@ class PersonalFinanceChatbot:
             file_resources=file_resources,
             active_month=current_month,
             currency='USD',
-            language='vi'  # Default to Vietnamese
+            language='vi',  # Default to Vietnamese
+            fingerprint=combine_fingerprints([user_fingerprint, knowledge_fingerprint])
         )
     
     def list_users(self) -> Dict[str, str]:
@@ -128,11 +317,7 @@ class PersonalFinanceChatbot:
         Returns:
             Dictionary of user_id -> user_name
         """
-        user_stores = self.store_mapping.get('user_stores', {})
-        return {
-            user_id: data['user_name']
-            for user_id, data in user_stores.items()
-        }
+        return self.mapping_store.list_users()
     
     def chat(
         self,
@@ -149,48 +334,330 @@ class PersonalFinanceChatbot:
             options: Query options (optional)
         
         Returns:
-            Dictionary with response and metadata
+            Dictionary with response and metadata; identical requests
+            already in flight share its result (metadata.coalesced)
         """
+        self._watch_mapping()
+        if self._in_flight is None:
+            return self._chat(user_id, query, options)
+        
+        result, shared = self._in_flight.do(self._request_key(user_id, query, options), self._chat, user_id, query, options)
+        return self._coalesced(result) if shared else result
+    
+    def _chat(self, user_id: str, query: str, options: Optional[QueryOptions]) -> Dict[str, Any]:
         logger.info(f"Processing query for user {user_id}: {query}")
         
-        # Get user context
-        user_context = self.get_user_context(user_id)
+        with tracer.span('chat', user_id=user_id, mode='sync'), usage_scope(user_id=user_id), \
+                deadline_scope(self.request_timeout):
+            # Get user context
+            with tracer.span('chat.user_context'):
+                user_context = self.get_user_context(user_id)
+            
+            if not user_context:
+                return self._user_not_found(user_id)
+            
+            # Step 1: Check with GuardAgent first
+            logger.info(f"[GuardAgent] Filtering query: {query}")
+            
+            with deadline_scope(deadline.share(self.guard_share)):
+                if self.use_preflight:
+                    verdict = self.guard.preflight(query)
+                else:
+                    verdict = self.guard.filter_message(query)
+            
+            if verdict.get("timed_out"):
+                return self._guard_timeout(user_context)
+            
+            allowed, intent = self._apply_verdict(user_context, verdict)
+            if not allowed:
+                return self._rejection(user_context, query)
+            
+            logger.info(f"[GuardAgent] Query allowed, routing to specialist agents")
+            
+            # Step 2: Route query through router agent
+            response = self.router.route_query(user_context, query, options, intent=intent)
+            
+            if self._timed_out(response):
+                return self._local_fallback(user_context, "agent_timeout")
+            
+            return self._finalize(user_context, response)
+    
+    async def achat(
+        self,
+        user_id: str,
+        query: str,
+        options: Optional[QueryOptions] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of chat(); awaits Gemini calls so one event loop can
+        serve many conversations at once
+        """
+        self._watch_mapping()
+        if self._in_flight is None:
+            return await self._achat(user_id, query, options)
         
-        if not user_context:
-            return {
-                "success": False,
-                "error": f"User not found: {user_id}",
-                "available_users": self.list_users()
-            }
+        result, shared = await self._in_flight.ado(
+            self._request_key(user_id, query, options), self._achat, user_id, query, options
+        )
+        return self._coalesced(result) if shared else result
+    
+    async def _achat(self, user_id: str, query: str, options: Optional[QueryOptions]) -> Dict[str, Any]:
+        logger.info(f"Processing query (async) for user {user_id}: {query}")
+        
+        with tracer.span('chat', user_id=user_id, mode='async'), usage_scope(user_id=user_id), \
+                deadline_scope(self.request_timeout):
+            with tracer.span('chat.user_context'):
+                user_context = self.get_user_context(user_id)
+            
+            if not user_context:
+                return self._user_not_found(user_id)
+            
+            with deadline_scope(deadline.share(self.guard_share)):
+                if self.use_preflight:
+                    verdict = await self.guard.apreflight(query)
+                else:
+                    verdict = await self.guard.afilter_message(query)
+            
+            if verdict.get("timed_out"):
+                return self._guard_timeout(user_context)
+            
+            allowed, intent = self._apply_verdict(user_context, verdict)
+            if not allowed:
+                return self._rejection(user_context, query)
+            
+            response = await self.router.aroute_query(user_context, query, options, intent=intent)
+            
+            if self._timed_out(response):
+                return self._local_fallback(user_context, "agent_timeout")
+            
+            return self._finalize(user_context, response)
+    
+    def chat_stream(
+        self,
+        user_id: str,
+        query: str,
+        options: Optional[QueryOptions] = None
+    ) -> Generator[str, None, Dict[str, Any]]:
+        """
+        Streaming variant of chat()
+        
+        Yields response text chunks as they arrive. The generator's return
+        value is the same result dict as chat(); its metadata carries
+        ttft_ms (first chunk, measured from the start of the turn including
+        the guard) and total_ms. Streams are not coalesced. A stream that
+        runs out of time before its first chunk falls back to local data;
+        one cut off later keeps the text already sent.
+        """
+        self._watch_mapping()
+        # The turn's span, usage labels and deadline stay in the stream's
+        # own context instead of leaking into the consumer's between chunks
+        return isolated_stream(self._chat_stream(user_id, query, options))
+    
+    def _chat_stream(
+        self,
+        user_id: str,
+        query: str,
+        options: Optional[QueryOptions]
+    ) -> Generator[str, None, Dict[str, Any]]:
+        logger.info(f"Processing query (stream) for user {user_id}: {query}")
+        start = time.perf_counter()
+        
+        with tracer.span('chat', user_id=user_id, mode='stream') as span, usage_scope(user_id=user_id), \
+                deadline_scope(self.request_timeout):
+            with tracer.span('chat.user_context'):
+                user_context = self.get_user_context(user_id)
+            
+            if not user_context:
+                return self._user_not_found(user_id)
+            
+            with deadline_scope(deadline.share(self.guard_share)):
+                if self.use_preflight:
+                    verdict = self.guard.preflight(query)
+                else:
+                    verdict = self.guard.filter_message(query)
+            
+            if verdict.get("timed_out"):
+                result = self._guard_timeout(user_context)
+                yield result['response']
+                return result
+            
+            allowed, intent = self._apply_verdict(user_context, verdict)
+            if not allowed:
+                result = self._rejection(user_context, query)
+                yield result['response']
+                return result
+            
+            ttft_ms = None
+            stream = self.router.route_query_stream(user_context, query, options, intent=intent)
+            while True:
+                try:
+                    chunk = next(stream)
+                except StopIteration as stop:
+                    response = stop.value
+                    break
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                yield chunk
+            
+            if ttft_ms is None and self._timed_out(response):
+                result = self._local_fallback(user_context, "agent_timeout")
+                if result['response']:
+                    yield result['response']
+                return result
+            
+            total_ms = (time.perf_counter() - start) * 1000
+            logger.info(f"Time to first token: {ttft_ms or 0:.0f} ms, total: {total_ms:.0f} ms")
+            span.set(ttft_ms=ttft_ms)
+            
+            result = self._finalize(user_context, response)
+            result['metadata']['ttft_ms'] = ttft_ms
+            result['metadata']['total_ms'] = total_ms
+            return result
+    
+    def _request_key(self, user_id: str, query: str, options: Optional[QueryOptions]) -> Tuple[str, str, Optional[str]]:
+        """Requests with equal keys are answered by one execution"""
+        return user_id, " ".join(query.split()), repr(options) if options is not None else None
+    
+    def _coalesced(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a shared result for a caller that joined an in-flight request"""
+        logger.info(f"Answered from an identical in-flight request ({result.get('user')})")
+        tracer.count('chatbot_coalesced_total')
+        result = dict(result)
+        if 'metadata' in result:
+            result['metadata'] = {**result['metadata'], 'coalesced': True}
+        return result
+    
+    def _apply_verdict(self, user_context: UserContext, verdict: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """
+        Apply a guard verdict to the user context
         
-        # Step 1: Check with GuardAgent first
-        logger.info(f"[GuardAgent] Filtering query: {query}")
+        Returns:
+            (allowed, intent); intent is only set by the pre-flight call
+        """
+        allowed = verdict.get("decision") == "allowed"
         
-        if not self.guard.is_allowed(query):
-            logger.warning(f"[GuardAgent] Query rejected: {query}")
-            return {
-                "success": False,
-                "agent": "GuardAgent",
-                "response": self.guard.get_rejection_message(user_context.language),
-                "confidence": 1.0,
-                "metadata": {"filtered": True, "reason": "non_finance_topic"},
-                "user": user_context.user_name,
-                "timestamp": datetime.now().isoformat(),
-                "error": "Query not related to personal finance"
-            }
+        if "intent" not in verdict:
+            return allowed, None
         
-        logger.info(f"[GuardAgent] Query allowed, routing to specialist agents")
+        user_context.language = verdict["language"]
+        if verdict["period"]:
+            user_context.active_month = verdict["period"]
+        return allowed, verdict["intent"]
+    
+    def _timed_out(self, response: AgentResponse) -> bool:
+        """A failed agent response caused by the request deadline"""
+        return not response.success and bool((response.metadata or {}).get("timed_out") or deadline.expired())
+    
+    def _guard_timeout(self, user_context: UserContext) -> Dict[str, Any]:
+        """Response for a query the guard could not check before the deadline"""
+        logger.warning(f"Deadline exceeded in the guard for {user_context.user_id}, asking to retry")
+        tracer.count('chatbot_deadline_exceeded_total', stage='guard')
+        return self._attach_trace({
+            "success": False,
+            "agent": "GuardAgent",
+            "response": _GUARD_TIMEOUT_MESSAGE["vi" if user_context.language == "vi" else "en"],
+            "confidence": 0.0,
+            "metadata": {"timed_out": True, "reason": "guard_timeout"},
+            "user": user_context.user_name,
+            "timestamp": datetime.now().isoformat(),
+            "error": "Request deadline exceeded before the query was checked"
+        })
+    
+    def _local_fallback(self, user_context: UserContext, reason: str) -> Dict[str, Any]:
+        """
+        Answer from the user's cleaned monthly summary when the agents
+        missed the deadline (only for queries the guard allowed)
         
-        # Step 2: Route query through router agent
-        response = self.router.route_query(user_context, query, options)
+        Args:
+            user_context: User context (active_month picks the summary)
+            reason: Recorded in metadata.reason (agent_timeout)
+        """
+        logger.warning(f"Deadline exceeded ({reason}) for {user_context.user_id}, answering from local data")
+        tracer.count('chatbot_fallback_total', reason=reason)
         
-        # Convert to dict
-        result = response.to_dict()
-        result['user'] = user_context.user_name
-        result['timestamp'] = datetime.now().isoformat()
+        summary = self._local_summary(user_context)
+        if summary is None:
+            return self._attach_trace({
+                "success": False,
+                "agent": "LocalFallback",
+                "response": "",
+                "confidence": 0.0,
+                "metadata": {"fallback": True, "reason": reason},
+                "user": user_context.user_name,
+                "timestamp": datetime.now().isoformat(),
+                "error": "Request deadline exceeded and no local summary is available"
+            })
+        
+        month, text = summary
+        notice = _FALLBACK_NOTICE["vi" if user_context.language == "vi" else "en"]
+        return self._finalize(user_context, AgentResponse(
+            success=True,
+            agent="LocalFallback",
+            response=notice.format(month=month) + text,
+            confidence=0.5,
+            metadata={"fallback": True, "reason": reason, "month": month}
+        ))
+    
+    def _local_summary(self, user_context: UserContext) -> Optional[Tuple[str, str]]:
+        """(month, markdown) of the active month's summary, else the latest one"""
+        user_dir = self.local_data_dir / f"store_user_{user_context.user_id}"
+        path = user_dir / f"summary_{user_context.active_month}.md"
+        if not path.exists():
+            summaries = sorted(user_dir.glob('summary_*.md'))
+            if not summaries:
+                return None
+            path = summaries[-1]
+        
+        try:
+            return path.stem[len('summary_'):], path.read_text(encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Cannot read local summary {path}: {e}")
+            return None
+    
+    def _user_not_found(self, user_id: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": f"User not found: {user_id}",
+            "available_users": self.list_users()
+        }
+    
+    def _rejection(self, user_context: UserContext, query: str) -> Dict[str, Any]:
+        """Response for a query the guard rejected"""
+        logger.warning(f"[GuardAgent] Query rejected: {query}")
+        return self._attach_trace({
+            "success": False,
+            "agent": "GuardAgent",
+            "response": self.guard.get_rejection_message(user_context.language),
+            "confidence": 1.0,
+            "metadata": {"filtered": True, "reason": "non_finance_topic"},
+            "user": user_context.user_name,
+            "timestamp": datetime.now().isoformat(),
+            "error": "Query not related to personal finance"
+        })
+    
+    def _finalize(self, user_context: UserContext, response: AgentResponse) -> Dict[str, Any]:
+        """Convert an agent response to the chat result dict"""
+        with tracer.span('chat.format'):
+            result = response.to_dict()
+            result['user'] = user_context.user_name
+            result['timestamp'] = datetime.now().isoformat()
         
         logger.info(f"Query processed: {response.success}")
         
+        return self._attach_trace(result)
+    
+    def _attach_trace(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add the trace id and per-stage timings (inclusive ms of the spans
+        finished so far in this turn) to a result's metadata
+        """
+        span = tracer.current()
+        if span.trace_id is None:
+            return result
+        
+        span.set(success=result['success'], agent=result.get('agent'))
+        result['metadata']['trace_id'] = span.trace_id
+        result['metadata']['timings_ms'] = {name: round(ms, 1) for name, ms in span.timings.items()}
         return result
     
     def interactive_session(self, user_id: str):
@@ -227,16 +694,9 @@ class PersonalFinanceChatbot:
                     print("\nGoodbye!")
                     break
                 
-                # Process query
-                result = self.chat(user_id, query)
-                
+                # Process query, printing tokens as they arrive
                 print()
-                if result['success']:
-                    print(f"[{result['agent']}]")
-                    print(result['response'])
-                else:
-                    print(f"Error: {result.get('error', 'Unknown error')}")
-                
+                print_stream(self.chat_stream(user_id, query))
                 print()
             
             except KeyboardInterrupt:
@@ -248,6 +708,132 @@ class PersonalFinanceChatbot:
                 logger.error(f"Session error: {e}")
 
 
+def print_stream(stream: Generator[str, None, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Print a chat_stream() as it arrives, then the agent and timings
+    
+    Returns:
+        The final result dict
+    """
+    printed = False
+    while True:
+        try:
+            chunk = next(stream)
+        except StopIteration as stop:
+            result = stop.value
+            break
+        print(chunk, end='', flush=True)
+        printed = True
+    
+    if printed:
+        print()
+    
+    metadata = result.get('metadata') or {}
+    if result['success']:
+        timings = ""
+        if metadata.get('ttft_ms') is not None:
+            timings = f" first token {metadata['ttft_ms']:.0f} ms, total {metadata['total_ms']:.0f} ms"
+        print(f"[{result['agent']}]{timings}")
+    elif not printed:
+        print(f"Error: {result.get('error', 'Unknown error')}")
+    
+    return result
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_batch(
+    chatbot: PersonalFinanceChatbot,
+    queries_path: str,
+    output_path: Optional[str] = None,
+    concurrency: int = 8
+) -> Dict[str, Any]:
+    """
+    Run a JSONL file of queries concurrently
+    
+    Each input line is {"user_id": ..., "query": ..., "id": optional}.
+    Results are written as JSONL in completion order as soon as each
+    query finishes: {"id", "user_id", "query", "latency_ms", "result"}.
+    
+    Args:
+        chatbot: Shared chatbot (clients and caches reused by all queries)
+        queries_path: Input JSONL file
+        output_path: Output JSONL file (None = stdout)
+        concurrency: Max queries in flight
+    
+    Returns:
+        Summary with counts, throughput and latency percentiles
+    """
+    import asyncio
+    
+    with open(queries_path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failed = 0
+    out = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+    
+    def emit(record: Dict[str, Any]):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+    
+    async def run_one(index: int, line: str):
+        nonlocal failed
+        try:
+            item = json.loads(line)
+            user_id, query = item['user_id'], item['query']
+        except (ValueError, KeyError, TypeError) as e:
+            failed += 1
+            emit({"id": index, "error": f"Invalid input line: {e}"})
+            return
+        
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await chatbot.achat(user_id, query)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            latency_ms = (time.perf_counter() - start) * 1000
+        
+        latencies.append(latency_ms)
+        if not result.get('success'):
+            failed += 1
+        result.pop('available_users', None)
+        emit({
+            "id": item.get('id', index),
+            "user_id": user_id,
+            "query": query,
+            "latency_ms": round(latency_ms, 1),
+            "result": result
+        })
+    
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_one(i, line) for i, line in enumerate(lines)))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    
+    summary = {
+        "queries": len(lines),
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 2),
+        "queries_per_second": round(len(lines) / elapsed, 2) if elapsed > 0 else 0.0
+    }
+    if latencies:
+        for pct in (50, 90, 95, 99):
+            summary[f"p{pct}_ms"] = round(percentile(latencies, pct), 1)
+        summary["max_ms"] = round(max(latencies), 1)
+    return summary
+
+
 def main():
     """Main entry point for CLI usage"""
     import argparse
@@ -256,11 +842,56 @@ def main():
     parser.add_argument('--user-id', help='User ID to chat with')
     parser.add_argument('--query', help='Single query (non-interactive mode)')
     parser.add_argument('--list-users', action='store_true', help='List available users')
+    parser.add_argument('--mapping', default='store_mapping.json',
+                        help='Store mapping, .json or .db/.sqlite (default: store_mapping.json)')
+    parser.add_argument('--preflight', action='store_true',
+                        help='Use a single structured guard + intent classification call')
+    parser.add_argument('--no-stream', action='store_true',
+                        help='Print single-query answers only when complete')
+    parser.add_argument('--queries-file',
+                        help='JSONL of {"user_id", "query"} to run as a concurrent batch')
+    parser.add_argument('--output',
+                        help='Batch results JSONL (default: stdout)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Batch queries in flight (default: 8)')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Append a JSONL span per traced stage (guard, routing, Gemini call, ...) to FILE')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Print Prometheus-style latency/token/cache metrics to stderr on exit')
+    parser.add_argument('--usage-db', default=ledger.path,
+                        help='SQLite ledger for token usage per user/agent/model/day, empty to disable '
+                             '(default: CHATBOT_USAGE_DB, else off); see usage_report.py')
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', metavar='CASSETTE',
+                                help='Append every guard/agent Gemini call and its latency to a JSONL cassette')
+    cassette_group.add_argument('--replay', metavar='CASSETTE',
+                                help='Answer Gemini calls from a recorded cassette (offline, no API key)')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='Replay latency multiplier, 0 for no delay (default: 1)')
+    parser.add_argument('--timeout', type=float,
+                        help='Per-query deadline in seconds; slower answers fall back to local summaries')
+    parser.add_argument('--hedge', action='store_true',
+                        help='Send a second Gemini call when one runs past the recent p95 (async/batch only)')
     
     args = parser.parse_args()
     
+    if args.record:
+        cassette.configure(args.record, mode='record')
+    elif args.replay:
+        cassette.configure(args.replay, mode='replay', speed=args.replay_speed)
+    if args.trace or args.metrics:
+        tracer.configure(enabled=True, path=args.trace)
+    if args.usage_db != ledger.path:
+        ledger.configure(args.usage_db or None)
+    if args.hedge:
+        hedging.configure(enabled=True)
+    
     try:
-        chatbot = PersonalFinanceChatbot()
+        chatbot = PersonalFinanceChatbot(
+            store_mapping_path=args.mapping,
+            use_preflight=args.preflight,
+            request_timeout=args.timeout
+        )
         
         if args.list_users:
             users = chatbot.list_users()
@@ -269,6 +900,22 @@ def main():
                 print(f"  {user_name}: {user_id}")
             return
         
+        if args.queries_file:
+            import asyncio
+            summary = asyncio.run(run_batch(chatbot, args.queries_file, args.output, args.concurrency))
+            # Keep stdout clean JSONL when results go there
+            report = sys.stderr if not args.output else sys.stdout
+            print(
+                f"\n✓ {summary['queries']} queries ({summary['failed']} failed) in {summary['elapsed_seconds']}s, "
+                f"{summary['queries_per_second']} q/s", file=report
+            )
+            if 'p50_ms' in summary:
+                print(
+                    f"  latency p50 {summary['p50_ms']} ms, p90 {summary['p90_ms']} ms, "
+                    f"p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, max {summary['max_ms']} ms", file=report
+                )
+            return
+        
         if not args.user_id:
             print("Error: --user-id required")
             print("\nAvailable users:")
@@ -278,6 +925,10 @@ def main():
         
         if args.query:
             # Single query mode
+            if not args.no_stream:
+                print_stream(chatbot.chat_stream(args.user_id, args.query))
+                return
+            
             result = chatbot.chat(args.user_id, args.query)
             
             if result['success']:
@@ -291,6 +942,10 @@ def main():
     except Exception as e:
         logger.error(f"Error: {e}")
         print(f"Error: {e}")
+    
+    finally:
+        if args.metrics:
+            print(tracer.render_prometheus(), file=sys.stderr)
 
 
 if __name__ == '__main__':
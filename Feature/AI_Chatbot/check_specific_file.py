@@ -1,11 +1,7 @@
 
-import os
-from dotenv import load_dotenv
-from google import genai
+from agents.shared.genai_client import get_client
 
-load_dotenv()
-api_key = os.getenv('GEMINI_API_KEY')
-client = genai.Client(api_key=api_key)
+client = get_client()
 
 uri = "https://generativelanguage.googleapis.com/v1beta/files/s02kaqyh6yo3"
 
@@ -6,13 +6,20 @@ Cleans and exports database.json to Gemini File Search compatible format.
 import json
 import os
 import csv
+import time
+import pstats
+import cProfile
 import logging
+import tracemalloc
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Set
+from typing import Dict, List, Any, Iterator, Optional, Set, Tuple
 from collections import defaultdict
 import hashlib
 
+from agents.shared.manifest import build_manifest
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,13 +31,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Per-stage profilers: cProfile ('cpu') and tracemalloc ('memory')
+PROFILE_MODES = ('cpu', 'memory')
+
+
+def profile_modes_from_env() -> Set[str]:
+    """DATA_CLEANER_PROFILE=cpu|memory|cpu,memory (1 or all = both)"""
+    value = os.getenv('DATA_CLEANER_PROFILE', '').strip().lower()
+    if value in ('1', 'all', 'true'):
+        return set(PROFILE_MODES)
+    return {mode.strip() for mode in value.split(',') if mode.strip() in PROFILE_MODES}
+
 
 class DataCleaner:
     """Cleans and prepares financial data for Gemini File Search"""
     
-    def __init__(self, input_file: str, output_dir: str):
+    def __init__(
+        self,
+        input_file: str,
+        output_dir: str,
+        profile: Optional[Set[str]] = None,
+        profile_top: int = 10
+    ):
+        """
+        Args:
+            input_file: database.json export
+            output_dir: Directory for the per-user stores
+            profile: Profilers to run around each stage, subset of
+                PROFILE_MODES (default: DATA_CLEANER_PROFILE)
+            profile_top: Functions / allocation sites kept per stage
+        """
         self.input_file = input_file
         self.output_dir = Path(output_dir)
+        self.profile = set(profile) if profile is not None else profile_modes_from_env()
+        self.profile_top = profile_top
+        # Stage name -> seconds, rows, rows_per_second (+ profile results)
+        self.stage_stats: Dict[str, Dict[str, Any]] = {}
         self.users_map = {}
         self.categories_map = {}
         self.stats = {
@@ -43,6 +79,100 @@ class DataCleaner:
         
         logger.info(f"Initialized DataCleaner: input={input_file}, output={output_dir}")
     
+    @contextmanager
+    def stage(self, name: str, rows: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Time a pipeline stage, profiling it if enabled
+        
+        Yields the stage's stats dict; set 'rows' on it when the row count
+        is only known inside the stage.
+        """
+        stats: Dict[str, Any] = {"rows": rows}
+        profiler = cProfile.Profile() if 'cpu' in self.profile else None
+        
+        started_tracing = False
+        snapshot = None
+        if 'memory' in self.profile:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield stats
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - start
+            
+            stats["seconds"] = seconds
+            stats["rows_per_second"] = stats["rows"] / seconds if seconds > 0 else 0.0
+            
+            if profiler is not None:
+                stats["top_functions"] = self._top_functions(profiler)
+            if snapshot is not None:
+                # Peak on top of what was allocated when the stage started
+                stats["peak_mb"] = (tracemalloc.get_traced_memory()[1] - baseline) / 1e6
+                stats["top_allocations"] = self._top_allocations(snapshot, tracemalloc.take_snapshot())
+                if started_tracing:
+                    tracemalloc.stop()
+            
+            self.stage_stats[name] = stats
+            logger.debug("Stage %s: %.3f s, %d rows", name, seconds, stats["rows"])
+    
+    def _top_functions(self, profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+        """Functions with the most cumulative time in a profiled stage"""
+        entries = pstats.Stats(profiler).stats
+        ranked = sorted(entries.items(), key=lambda item: item[1][3], reverse=True)[:self.profile_top]
+        return [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({function})",
+                "calls": calls,
+                "total_s": round(total, 4),
+                "cumulative_s": round(cumulative, 4)
+            }
+            for (filename, line, function), (_, calls, total, cumulative, _) in ranked
+        ]
+    
+    def _top_allocations(self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        """Source lines that retained the most memory over a profiled stage"""
+        # Leave out the profilers' own bookkeeping
+        ignore = [tracemalloc.Filter(False, cProfile.__file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        diffs = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+        return [
+            {
+                "site": f"{os.path.basename(diff.traceback[0].filename)}:{diff.traceback[0].lineno}",
+                "size_kb": round(diff.size_diff / 1024, 1),
+                "count": diff.count_diff
+            }
+            for diff in diffs[:self.profile_top]
+        ]
+    
+    def format_stage_report(self) -> List[str]:
+        """Report lines: time and rows/s per stage, then profile results"""
+        total = sum(stats["seconds"] for stats in self.stage_stats.values())
+        lines = [f"{'Stage':<10} {'Seconds':>9} {'Rows':>9} {'Rows/s':>12}"]
+        for name, stats in self.stage_stats.items():
+            peak = f"  peak {stats['peak_mb']:.1f} MB" if 'peak_mb' in stats else ""
+            lines.append(
+                f"{name:<10} {stats['seconds']:>9.3f} {stats['rows']:>9,} {stats['rows_per_second']:>12,.0f}{peak}"
+            )
+        lines.append(f"{'total':<10} {total:>9.3f}")
+        
+        for name, stats in self.stage_stats.items():
+            if stats.get("top_functions"):
+                lines.append(f"Top functions in {name} (cumulative s):")
+                lines += [f"  {entry['cumulative_s']:>8.3f}  {entry['function']}" for entry in stats["top_functions"]]
+            if stats.get("top_allocations"):
+                lines.append(f"Top allocation sites in {name} (KB retained):")
+                lines += [f"  {entry['size_kb']:>10.1f}  {entry['site']}" for entry in stats["top_allocations"]]
+        return lines
+    
     def load_data(self) -> Dict[str, Any]:
         """Load and validate input JSON"""
         logger.info(f"Loading data from {self.input_file}")
@@ -146,7 +276,7 @@ class DataCleaner:
                 'duplicate_of': ''
             }
         except Exception as e:
-            logger.warning(f"Failed to normalize transaction {tx.get('id')}: {e}")
+            logger.warning("Failed to normalize transaction %s: %s", tx.get('id'), e)
             return None
     
     def deduplicate_transactions(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -177,13 +307,13 @@ class DataCleaner:
                 
                 if current_dt > existing_dt:
                     # Current is newer, mark existing as duplicate
-                    logger.debug(f"Duplicate found: keeping {tx['tx_id']}, marking {existing['tx_id']} as duplicate")
+                    logger.debug("Duplicate found: keeping %s, marking %s as duplicate", tx['tx_id'], existing['tx_id'])
                     existing['duplicate_of'] = tx['tx_id']
                     duplicates.append(existing)
                     seen[key_hash] = tx
                 else:
                     # Existing is newer, mark current as duplicate
-                    logger.debug(f"Duplicate found: keeping {existing['tx_id']}, marking {tx['tx_id']} as duplicate")
+                    logger.debug("Duplicate found: keeping %s, marking %s as duplicate", existing['tx_id'], tx['tx_id'])
                     tx['duplicate_of'] = existing['tx_id']
                     duplicates.append(tx)
             else:
@@ -215,7 +345,7 @@ class DataCleaner:
                 current_dt = datetime.fromisoformat(budget['updatedAt'].replace('Z', '+00:00'))
                 
                 if current_dt > existing_dt:
-                    logger.debug(f"Budget duplicate: keeping newer {budget['id']}")
+                    logger.debug("Budget duplicate: keeping newer %s", budget['id'])
                     seen[key] = budget
             else:
                 seen[key] = budget
@@ -246,7 +376,7 @@ class DataCleaner:
                 current_dt = datetime.fromisoformat(goal['updatedAt'].replace('Z', '+00:00'))
                 
                 if current_dt > existing_dt:
-                    logger.debug(f"Goal duplicate: keeping newer {goal['id']}")
+                    logger.debug("Goal duplicate: keeping newer %s", goal['id'])
                     seen[key] = goal
             else:
                 seen[key] = goal
@@ -302,13 +432,24 @@ class DataCleaner:
             'updated_at': goal['updatedAt']
         }
     
-    def export_user_data(self, user_id: str, transactions: List[Dict], budgets: List[Dict], goals: List[Dict]):
-        """Export data for a single user"""
+    def export_user_data(
+        self,
+        user_id: str,
+        transactions: List[Dict],
+        budgets: List[Dict],
+        goals: List[Dict]
+    ) -> Tuple[Dict[str, List[Dict]], List[Dict]]:
+        """
+        Export data for a single user
+        
+        Returns:
+            (transactions by month, budgets) of the user, for summarize_user()
+        """
         user = self.users_map[user_id]
         user_dir = self.output_dir / f"store_user_{user_id}"
         user_dir.mkdir(parents=True, exist_ok=True)
         
-        logger.info(f"Exporting data for user {user['name']} ({user_id})")
+        logger.info("Exporting data for user %s (%s)", user['name'], user_id)
         
         # 1. Export user profile
         profile = {
@@ -322,7 +463,7 @@ class DataCleaner:
         profile_path = user_dir / 'user_profile.json'
         with open(profile_path, 'w', encoding='utf-8') as f:
             json.dump(profile, f, indent=2, ensure_ascii=False)
-        logger.debug(f"Exported {profile_path}")
+        logger.debug("Exported %s", profile_path)
         
         # 2. Export transactions by month
         tx_by_month = defaultdict(list)
@@ -346,7 +487,7 @@ class DataCleaner:
                 for tx in sorted(month_txs, key=lambda x: x['occurred_at']):
                     writer.writerow(tx)
             
-            logger.debug(f"Exported {len(month_txs)} transactions to {csv_path}")
+            logger.debug("Exported %d transactions to %s", len(month_txs), csv_path)
         
         # 3. Export budgets
         user_budgets = [b for b in budgets if b['user_id'] == user_id]
@@ -354,7 +495,7 @@ class DataCleaner:
             budgets_path = user_dir / 'budgets.json'
             with open(budgets_path, 'w', encoding='utf-8') as f:
                 json.dump(user_budgets, f, indent=2, ensure_ascii=False)
-            logger.debug(f"Exported {len(user_budgets)} budgets to {budgets_path}")
+            logger.debug("Exported %d budgets to %s", len(user_budgets), budgets_path)
         
         # 4. Export goals
         user_goals = [g for g in goals if g['user_id'] == user_id]
@@ -362,13 +503,25 @@ class DataCleaner:
             goals_path = user_dir / 'goals.json'
             with open(goals_path, 'w', encoding='utf-8') as f:
                 json.dump(user_goals, f, indent=2, ensure_ascii=False)
-            logger.debug(f"Exported {len(user_goals)} goals to {goals_path}")
+            logger.debug("Exported %d goals to %s", len(user_goals), goals_path)
         
-        # 5. Generate monthly summaries
+        logger.info(
+            "Completed export for user %s: %d months, %d budgets, %d goals",
+            user['name'], len(tx_by_month), len(user_budgets), len(user_goals)
+        )
+        return tx_by_month, user_budgets
+    
+    def summarize_user(self, user_id: str, tx_by_month: Dict[str, List[Dict]], budgets: List[Dict]):
+        """Generate the monthly summaries of a single user"""
+        user = self.users_map[user_id]
+        user_dir = self.output_dir / f"store_user_{user_id}"
         for month, month_txs in tx_by_month.items():
-            self.generate_summary(user, month, month_txs, user_budgets, user_dir)
-        
-        logger.info(f"Completed export for user {user['name']}: {len(tx_by_month)} months, {len(user_budgets)} budgets, {len(user_goals)} goals")
+            self.generate_summary(user, month, month_txs, budgets, user_dir)
+    
+    def write_manifest(self, user_id: str):
+        """Manifest of content hashes (data fingerprint for caches) of a finished user store"""
+        manifest = build_manifest(self.output_dir / f"store_user_{user_id}")
+        logger.debug("Wrote manifest for %s: fingerprint %s", user_id, manifest['fingerprint'])
     
     def generate_summary(self, user: Dict, month: str, transactions: List[Dict], budgets: List[Dict], user_dir: Path):
         """Generate natural language summary for a month"""
@@ -416,7 +569,7 @@ class DataCleaner:
         with open(summary_path, 'w', encoding='utf-8') as f:
             f.write('\n'.join(summary_lines))
         
-        logger.debug(f"Generated summary: {summary_path}")
+        logger.debug("Generated summary: %s", summary_path)
     
     def export_knowledge_store(self):
         """Export global knowledge base files"""
@@ -499,47 +652,76 @@ Each user has a dedicated store with:
             f.write(guidelines)
         logger.debug(f"Exported {guidelines_path}")
         
+        build_manifest(knowledge_dir)
+        
         logger.info(f"Knowledge store exported to {knowledge_dir}")
     
-    def run(self):
-        """Execute the full data cleaning pipeline"""
+    def run(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Execute the full data cleaning pipeline
+        
+        Returns:
+            Per-stage stats (see stage())
+        """
         logger.info("=" * 60)
         logger.info("Starting data cleaning pipeline")
         logger.info("=" * 60)
         
-        # Load data
-        data = self.load_data()
-        
-        # Build lookup maps
-        self.build_lookup_maps(data)
+        self.stage_stats = {}
         
-        # Normalize transactions
-        logger.info("Normalizing transactions...")
-        normalized_txs = []
-        for tx in data.get('transactions', []):
-            normalized = self.normalize_transaction(tx)
-            if normalized:
-                normalized_txs.append(normalized)
+        # Load data
+        with self.stage('load') as stats:
+            data = self.load_data()
+            stats["rows"] = len(data.get('transactions', []))
+        
+        # Build lookup maps and normalize transactions
+        raw_txs = data.get('transactions', [])
+        with self.stage('normalize', len(raw_txs)):
+            self.build_lookup_maps(data)
+            
+            logger.info("Normalizing transactions...")
+            normalized_txs = []
+            for tx in raw_txs:
+                normalized = self.normalize_transaction(tx)
+                if normalized:
+                    normalized_txs.append(normalized)
         
         # Deduplicate
-        cleaned_txs = self.deduplicate_transactions(normalized_txs)
-        cleaned_budgets_raw = self.deduplicate_budgets(data.get('budgets', []))
-        cleaned_goals_raw = self.deduplicate_goals(data.get('goals', []))
+        with self.stage('dedup', len(normalized_txs)):
+            cleaned_txs = self.deduplicate_transactions(normalized_txs)
+            cleaned_budgets_raw = self.deduplicate_budgets(data.get('budgets', []))
+            cleaned_goals_raw = self.deduplicate_goals(data.get('goals', []))
         
         # Enrich budgets and goals
-        logger.info("Enriching budgets and goals...")
-        cleaned_budgets = [self.enrich_budget(b) for b in cleaned_budgets_raw]
-        cleaned_budgets = [b for b in cleaned_budgets if b is not None]
+        with self.stage('enrich', len(cleaned_budgets_raw) + len(cleaned_goals_raw)):
+            logger.info("Enriching budgets and goals...")
+            cleaned_budgets = [self.enrich_budget(b) for b in cleaned_budgets_raw]
+            cleaned_budgets = [b for b in cleaned_budgets if b is not None]
+            
+            cleaned_goals = [self.enrich_goal(g) for g in cleaned_goals_raw]
+        
+        # Export per-user data (profile, transaction CSVs, budgets, goals)
+        with self.stage('export', len(cleaned_txs)):
+            logger.info("Exporting per-user data...")
+            exports = {
+                user_id: self.export_user_data(user_id, cleaned_txs, cleaned_budgets, cleaned_goals)
+                for user_id in self.users_map.keys()
+            }
         
-        cleaned_goals = [self.enrich_goal(g) for g in cleaned_goals_raw]
+        # Generate monthly summaries
+        with self.stage('summarize', len(cleaned_txs)):
+            logger.info("Generating monthly summaries...")
+            for user_id, (tx_by_month, user_budgets) in exports.items():
+                self.summarize_user(user_id, tx_by_month, user_budgets)
         
-        # Export per-user data
-        logger.info("Exporting per-user data...")
-        for user_id in self.users_map.keys():
-            self.export_user_data(user_id, cleaned_txs, cleaned_budgets, cleaned_goals)
+        # Hash each finished user store
+        with self.stage('manifest', len(exports)):
+            for user_id in exports:
+                self.write_manifest(user_id)
         
         # Export knowledge store
-        self.export_knowledge_store()
+        with self.stage('knowledge'):
+            self.export_knowledge_store()
         
         # Print final stats
         logger.info("=" * 60)
@@ -552,16 +734,39 @@ Each user has a dedicated store with:
         logger.info(f"Goals: {self.stats['goals']['cleaned']} unique ({self.stats['goals']['duplicates']} duplicates removed)")
         logger.info(f"Output directory: {self.output_dir}")
         logger.info("=" * 60)
+        for line in self.format_stage_report():
+            logger.info(line)
+        logger.info("=" * 60)
+        
+        return self.stage_stats
 
 
 def main():
     """Main entry point"""
-    input_file = 'database/database.json'
-    output_dir = 'cleaned_data'
+    import argparse
     
-    cleaner = DataCleaner(input_file, output_dir)
-    cleaner.run()
-
+    parser = argparse.ArgumentParser(description='Clean database.json into per-user File Search stores')
+    parser.add_argument('--input', default='database/database.json', help='Input export (default: database/database.json)')
+    parser.add_argument('--output-dir', default='cleaned_data', help='Output directory (default: cleaned_data)')
+    parser.add_argument('--profile', nargs='*', choices=PROFILE_MODES, default=None,
+                        help='Profile each stage with cProfile (cpu) and/or tracemalloc (memory); '
+                             'no value = both (default: DATA_CLEANER_PROFILE)')
+    parser.add_argument('--profile-top', type=int, default=10,
+                        help='Functions / allocation sites listed per stage (default: 10)')
+    parser.add_argument('--report', help='Write per-stage stats as JSON to this file')
+    
+    args = parser.parse_args()
+    
+    profile = None
+    if args.profile is not None:
+        profile = set(args.profile or PROFILE_MODES)
+    
+    cleaner = DataCleaner(args.input, args.output_dir, profile=profile, profile_top=args.profile_top)
+    stage_stats = cleaner.run()
+    
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(stage_stats, f, indent=2)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,568 @@
+"""
+Local stand-ins for the Gemini API
+FakeFilesAPI lets the uploader run offline in-process; FakeGeminiServer
+serves the generate-content and Files REST endpoints over HTTP so the whole
+chatbot runs against it with GEMINI_BASE_URL. Both have configurable
+latency and error rates.
+"""
+
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from google.genai import errors, types
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+
+def sample_latency_ms(rng: random.Random, mean_ms: float, distribution: str = 'uniform', sigma: float = 0.5) -> float:
+    """
+    Draw a latency with the given mean
+
+    Args:
+        rng: Random source
+        mean_ms: Mean latency
+        distribution: 'fixed', 'uniform' ([mean / 2, mean * 1.5]) or
+            'lognormal' (long right tail, spread set by sigma)
+        sigma: Log-space standard deviation for 'lognormal'
+    """
+    if mean_ms <= 0:
+        return 0.0
+    if distribution == 'fixed':
+        return mean_ms
+    if distribution == 'uniform':
+        return rng.uniform(mean_ms / 2, mean_ms * 1.5)
+    if distribution == 'lognormal':
+        return rng.lognormvariate(math.log(mean_ms) - sigma ** 2 / 2, sigma)
+    raise ValueError(f"Unknown latency distribution: {distribution}")
+
+
+class FakeFilesAPI:
+    """
+    In-process replacement for client.files
+
+    Implements upload/get/delete with the same signatures the manager uses.
+    Latency is drawn uniformly from [latency_ms / 2, latency_ms * 1.5];
+    error_rate is the fraction of calls failing with a retryable 429 or 503.
+    Uploaded files report an expiration_time ttl_hours after upload.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        ttl_hours: float = 48.0
+    ):
+        self.latency_ms = latency_ms
+        self.ttl = timedelta(hours=ttl_hours)
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._files: Dict[str, types.File] = {}
+        self._lock = threading.Lock()
+        self.calls = {'upload': 0, 'get': 0, 'delete': 0, 'errors': 0}
+
+    def _simulate(self, operation: str):
+        with self._lock:
+            self.calls[operation] += 1
+            delay = sample_latency_ms(self._random, self.latency_ms) / 1000
+            fail = self._random.random() < self.error_rate
+            code = self._random.choice([429, 503])
+            if fail:
+                self.calls['errors'] += 1
+
+        time.sleep(delay)
+
+        if fail:
+            status = 'RESOURCE_EXHAUSTED' if code == 429 else 'UNAVAILABLE'
+            error_cls = errors.ClientError if code < 500 else errors.ServerError
+            raise error_cls(code, {'error': {'code': code, 'message': 'Simulated failure', 'status': status}})
+
+    def upload(self, file: Any, config: Optional[Dict[str, Any]] = None) -> types.File:
+        self._simulate('upload')
+
+        path = Path(file)
+        if not path.exists():
+            raise FileNotFoundError(f"File not found: {file}")
+
+        file_id = uuid.uuid4().hex[:12]
+        mime_type = (config or {}).get('mime_type') or ('text/csv' if path.suffix == '.csv' else 'text/plain')
+        file_ref = types.File(
+            name=f"files/{file_id}",
+            display_name=path.name,
+            uri=f"https://fake.local/v1beta/files/{file_id}",
+            mime_type=mime_type,
+            size_bytes=path.stat().st_size,
+            expiration_time=datetime.now(timezone.utc) + self.ttl,
+            state=types.FileState.ACTIVE
+        )
+
+        with self._lock:
+            self._files[file_ref.name] = file_ref
+        return file_ref
+
+    def get(self, name: str) -> types.File:
+        self._simulate('get')
+        name = 'files/' + name.rsplit('/', 1)[-1]
+        with self._lock:
+            file_ref = self._files.get(name)
+        if file_ref is None:
+            raise errors.ClientError(404, {'error': {'code': 404, 'message': f'{name} not found', 'status': 'NOT_FOUND'}})
+        return file_ref
+
+    def delete(self, name: str):
+        self._simulate('delete')
+        name = 'files/' + name.rsplit('/', 1)[-1]
+        with self._lock:
+            self._files.pop(name, None)
+
+
+def _error_body(code: int, message: str) -> Dict[str, Any]:
+    status = {403: 'PERMISSION_DENIED', 404: 'NOT_FOUND', 429: 'RESOURCE_EXHAUSTED', 503: 'UNAVAILABLE'}.get(code, 'INTERNAL')
+    return {'error': {'code': code, 'message': message, 'status': status}}
+
+
+def _rfc3339(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class FakeGeminiServer:
+    """
+    Local HTTP stand-in for the Gemini REST API
+
+    Serves what the SDK calls for generate_content (plain and SSE
+    streaming) and the Files API (resumable upload, get, delete), so the
+    guard -> router -> agent pipeline runs unchanged when GEMINI_BASE_URL
+    points here. Responses are canned:
+    - guard filter calls allow the query (reject_rate of them are rejected)
+    - pre-flight calls classify it with the keyword IntentMatcher
+    - agent calls return filler text of about output_tokens tokens
+
+    Prompt tokens are estimated at 4 characters per token plus
+    tokens_per_file per attached file. error_rate of all calls fail with
+    a retryable 429 or 503. Calls attaching a file deleted from this server
+    fail with 403, as on Gemini. GET /fake/stats returns call counters.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        generate_latency_ms: float = 1500.0,
+        guard_latency_ms: float = 400.0,
+        upload_latency_ms: float = 200.0,
+        distribution: str = 'lognormal',
+        sigma: float = 0.5,
+        error_rate: float = 0.0,
+        reject_rate: float = 0.0,
+        output_tokens: int = 150,
+        tokens_per_file: int = 1500,
+        stream_chunks: int = 6,
+        ttl_hours: float = 48.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            host: Bind address
+            port: Port (0 picks a free one; see base_url after start())
+            generate_latency_ms: Mean latency of agent generate calls
+            guard_latency_ms: Mean latency of guard / pre-flight calls
+            upload_latency_ms: Mean latency of Files API calls
+            distribution: Latency distribution (see sample_latency_ms)
+            sigma: Spread of the lognormal distribution
+            error_rate: Fraction of calls failing with 429/503
+            reject_rate: Fraction of guard calls answering "not allowed"
+            output_tokens: Output tokens per agent answer
+            tokens_per_file: Prompt tokens counted per attached file
+            stream_chunks: Chunks per streamed answer
+            ttl_hours: Expiry reported for uploaded files
+            seed: Random seed for reproducible runs
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {LATENCY_DISTRIBUTIONS}")
+
+        self.host = host
+        self.port = port
+        self.generate_latency_ms = generate_latency_ms
+        self.guard_latency_ms = guard_latency_ms
+        self.upload_latency_ms = upload_latency_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.output_tokens = output_tokens
+        self.tokens_per_file = tokens_per_file
+        self.stream_chunks = max(1, stream_chunks)
+        self.ttl = timedelta(hours=ttl_hours)
+
+        self._random = random.Random(seed)
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._intent_matcher = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            'generate': 0, 'stream': 0, 'guard': 0, 'preflight': 0,
+            'upload': 0, 'get': 0, 'delete': 0, 'errors': 0, 'rejections': 0,
+            'prompt_tokens': 0, 'output_tokens': 0
+        }
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def create_app(self):
+        """aiohttp application serving the fake endpoints"""
+        from aiohttp import web
+
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/v1beta/models/{target}', self._handle_models)
+        app.router.add_post('/upload/v1beta/files', self._handle_upload_start)
+        app.router.add_post('/upload/v1beta/files/session/{session_id}', self._handle_upload_finalize)
+        app.router.add_get('/v1beta/files/{file_id}', self._handle_get_file)
+        app.router.add_delete('/v1beta/files/{file_id}', self._handle_delete_file)
+        app.router.add_get('/fake/stats', self._handle_stats)
+        return app
+
+    # ---- simulation helpers ----
+
+    async def _delay(self, mean_ms: float):
+        await asyncio.sleep(sample_latency_ms(self._random, mean_ms, self.distribution, self.sigma) / 1000)
+
+    def _injected_error(self):
+        """Error response for error_rate of calls, else None"""
+        from aiohttp import web
+
+        if self.error_rate <= 0 or self._random.random() >= self.error_rate:
+            return None
+        self.stats['errors'] += 1
+        code = self._random.choice([429, 503])
+        return web.json_response(_error_body(code, 'Simulated failure'), status=code)
+
+    def _classify(self, query: str) -> str:
+        if self._intent_matcher is None:
+            from agents.shared.intent_matcher import IntentMatcher
+            self._intent_matcher = IntentMatcher()
+        return self._intent_matcher.classify(query)
+
+    def _missing_file(self, contents: List[Dict[str, Any]]) -> Optional[str]:
+        """First attached file of this server that was deleted (or never uploaded), else None"""
+        prefix = f"{self.base_url}/v1beta/files/"
+        for content in contents:
+            for part in content.get('parts', []):
+                file_data = part.get('fileData') or part.get('file_data') or {}
+                uri = file_data.get('fileUri') or file_data.get('file_uri') or ''
+                if uri.startswith(prefix) and f"files/{uri[len(prefix):]}" not in self._files:
+                    return uri
+        return None
+
+    @staticmethod
+    def _texts(contents: List[Dict[str, Any]]) -> List[str]:
+        return [part['text'] for content in contents for part in content.get('parts', []) if 'text' in part]
+
+    def _response(self, text: str, model: str, prompt_tokens: Optional[int], output_tokens: Optional[int]) -> Dict[str, Any]:
+        body = {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': text}]},
+                'finishReason': 'STOP',
+                'index': 0
+            }],
+            'modelVersion': model
+        }
+        if prompt_tokens is not None:
+            body['usageMetadata'] = {
+                'promptTokenCount': prompt_tokens,
+                'candidatesTokenCount': output_tokens,
+                'totalTokenCount': prompt_tokens + output_tokens
+            }
+        return body
+
+    def _answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Canned answer text and token counts for a generate request"""
+        contents = request.get('contents', [])
+        texts = self._texts(contents)
+        files = sum(1 for content in contents for part in content.get('parts', []) if 'fileData' in part)
+        system = request.get('systemInstruction')
+        system_chars = sum(len(text) for text in self._texts([system])) if system else 0
+        prompt_tokens = (sum(len(text) for text in texts) + system_chars) // 4 + files * self.tokens_per_file
+
+        if system is None:
+            words = max(1, self.output_tokens * 3 // 4)
+            text = f"• (fake answer from {files} files) " + " ".join(
+                self._random.choice(('chi tiêu', 'ngân sách', 'tiết kiệm', 'giao dịch', '$70.50', 'tháng này'))
+                for _ in range(words)
+            )
+            return {'kind': 'generate', 'text': text, 'prompt_tokens': prompt_tokens, 'output_tokens': self.output_tokens}
+
+        query = texts[-1].split(': ', 1)[-1] if texts else ''
+        allowed = self._random.random() >= self.reject_rate
+        if not allowed:
+            self.stats['rejections'] += 1
+        verdict = {
+            'decision': 'allowed' if allowed else 'not allowed',
+            'reason': 'Câu hỏi về tài chính cá nhân' if allowed else 'Không liên quan đến tài chính'
+        }
+
+        kind = 'guard'
+        if request.get('generationConfig', {}).get('responseMimeType') == 'application/json':
+            kind = 'preflight'
+            verdict.update({
+                'intent': self._classify(query),
+                'period': '',
+                'language': 'en' if query.isascii() else 'vi'
+            })
+
+        text = json.dumps(verdict, ensure_ascii=False)
+        return {'kind': kind, 'text': text, 'prompt_tokens': prompt_tokens, 'output_tokens': len(text) // 4}
+
+    # ---- generate content ----
+
+    async def _handle_models(self, request):
+        from aiohttp import web
+
+        model, _, action = request.match_info['target'].partition(':')
+        if action not in ('generateContent', 'streamGenerateContent'):
+            return web.json_response(_error_body(404, f'Unknown method {action}'), status=404)
+
+        body = await request.json()
+        # Like Gemini, refuse files that no longer exist; URIs of other
+        # servers (e.g. a real store_mapping.json) are not checked
+        missing = self._missing_file(body.get('contents', []))
+        if missing:
+            return web.json_response(
+                _error_body(403, f'You do not have permission to access the File {missing} or it may not exist.'),
+                status=403
+            )
+
+        answer = self._answer(body)
+        self.stats[answer['kind']] += 1
+        mean_ms = self.generate_latency_ms if answer['kind'] == 'generate' else self.guard_latency_ms
+
+        error = self._injected_error()
+        if error is not None:
+            await self._delay(mean_ms / 4)
+            return error
+
+        self.stats['prompt_tokens'] += answer['prompt_tokens']
+        self.stats['output_tokens'] += answer['output_tokens']
+
+        if action == 'generateContent':
+            await self._delay(mean_ms)
+            return web.json_response(self._response(answer['text'], model, answer['prompt_tokens'], answer['output_tokens']))
+
+        # SSE stream: first chunk after a quarter of the latency, the rest spread evenly
+        self.stats['stream'] += 1
+        total_s = sample_latency_ms(self._random, mean_ms, self.distribution, self.sigma) / 1000
+        text = answer['text']
+        size = max(1, math.ceil(len(text) / self.stream_chunks))
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        await asyncio.sleep(total_s / 4)
+        for i, chunk in enumerate(chunks):
+            last = i == len(chunks) - 1
+            payload = self._response(
+                chunk, model,
+                answer['prompt_tokens'] if last else None,
+                answer['output_tokens'] if last else None
+            )
+            await response.write(b'data: ' + json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\r\n\r\n')
+            if not last:
+                await asyncio.sleep(total_s * 3 / 4 / max(1, len(chunks) - 1))
+        await response.write_eof()
+        return response
+
+    # ---- files ----
+
+    async def _handle_upload_start(self, request):
+        from aiohttp import web
+
+        await self._delay(self.upload_latency_ms / 2)
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        body = await request.json() if request.can_read_body else {}
+        session_id = uuid.uuid4().hex[:12]
+        self._sessions[session_id] = {
+            'display_name': request.headers.get('X-Goog-Upload-File-Name', session_id),
+            'mime_type': request.headers.get('X-Goog-Upload-Header-Content-Type')
+            or (body.get('file') or {}).get('mime_type') or 'text/plain'
+        }
+        return web.Response(headers={
+            'X-Goog-Upload-URL': f"{self.base_url}/upload/v1beta/files/session/{session_id}",
+            'X-Goog-Upload-Status': 'active'
+        })
+
+    async def _handle_upload_finalize(self, request):
+        from aiohttp import web
+
+        session = self._sessions.pop(request.match_info['session_id'], None)
+        if session is None:
+            return web.json_response(_error_body(404, 'Upload session not found'), status=404)
+
+        data = await request.read()
+        await self._delay(self.upload_latency_ms / 2)
+        self.stats['upload'] += 1
+
+        file_id = uuid.uuid4().hex[:12]
+        now = datetime.now(timezone.utc)
+        file_ref = {
+            'name': f"files/{file_id}",
+            'displayName': session['display_name'],
+            'mimeType': session['mime_type'],
+            'sizeBytes': str(len(data)),
+            'createTime': _rfc3339(now),
+            'updateTime': _rfc3339(now),
+            'expirationTime': _rfc3339(now + self.ttl),
+            'uri': f"{self.base_url}/v1beta/files/{file_id}",
+            'state': 'ACTIVE'
+        }
+        self._files[file_ref['name']] = file_ref
+        return web.json_response({'file': file_ref}, headers={'X-Goog-Upload-Status': 'final'})
+
+    async def _handle_get_file(self, request):
+        from aiohttp import web
+
+        self.stats['get'] += 1
+        await self._delay(self.upload_latency_ms / 4)
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        name = f"files/{request.match_info['file_id']}"
+        file_ref = self._files.get(name)
+        if file_ref is None:
+            return web.json_response(_error_body(404, f'{name} not found'), status=404)
+        return web.json_response(file_ref)
+
+    async def _handle_delete_file(self, request):
+        from aiohttp import web
+
+        self.stats['delete'] += 1
+        await self._delay(self.upload_latency_ms / 4)
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        self._files.pop(f"files/{request.match_info['file_id']}", None)
+        return web.json_response({})
+
+    async def _handle_stats(self, request):
+        from aiohttp import web
+        return web.json_response({**self.stats, 'files': len(self._files)})
+
+    # ---- lifecycle ----
+
+    def start(self) -> str:
+        """
+        Serve on a background thread
+
+        Returns:
+            Base URL to use as GEMINI_BASE_URL
+        """
+        from aiohttp import web
+
+        ready = threading.Event()
+        failure: List[BaseException] = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._loop = loop
+            runner = web.AppRunner(self.create_app(), access_log=None)
+            try:
+                loop.run_until_complete(runner.setup())
+                site = web.TCPSite(runner, self.host, self.port)
+                loop.run_until_complete(site.start())
+                self.port = runner.addresses[0][1]
+            except BaseException as e:
+                failure.append(e)
+                ready.set()
+                return
+            ready.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.run_until_complete(runner.cleanup())
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name='fake-gemini', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+
+        logger.info(f"Fake Gemini server listening on {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        """Stop a server started with start()"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+
+
+def main():
+    """Run the fake server in the foreground"""
+    import argparse
+    from aiohttp import web
+
+    parser = argparse.ArgumentParser(description='Local Gemini API stand-in for offline load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8790, help='Port (default: 8790)')
+    parser.add_argument('--generate-latency-ms', type=float, default=1500.0,
+                        help='Mean latency of agent answers (default: 1500)')
+    parser.add_argument('--guard-latency-ms', type=float, default=400.0,
+                        help='Mean latency of guard calls (default: 400)')
+    parser.add_argument('--upload-latency-ms', type=float, default=200.0,
+                        help='Mean latency of Files API calls (default: 200)')
+    parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal',
+                        help='Latency distribution (default: lognormal)')
+    parser.add_argument('--sigma', type=float, default=0.5, help='Lognormal spread (default: 0.5)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of calls failing with 429/503 (default: 0)')
+    parser.add_argument('--reject-rate', type=float, default=0.0,
+                        help='Fraction of guard calls rejecting the query (default: 0)')
+    parser.add_argument('--output-tokens', type=int, default=150,
+                        help='Output tokens per agent answer (default: 150)')
+    parser.add_argument('--tokens-per-file', type=int, default=1500,
+                        help='Prompt tokens counted per attached file (default: 1500)')
+    parser.add_argument('--seed', type=int, default=None)
+
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(
+        host=args.host,
+        port=args.port,
+        generate_latency_ms=args.generate_latency_ms,
+        guard_latency_ms=args.guard_latency_ms,
+        upload_latency_ms=args.upload_latency_ms,
+        distribution=args.distribution,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        reject_rate=args.reject_rate,
+        output_tokens=args.output_tokens,
+        tokens_per_file=args.tokens_per_file,
+        seed=args.seed
+    )
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print(f"Point the chatbot here with: GEMINI_BASE_URL={server.base_url} GEMINI_API_KEY=fake")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,15 +6,19 @@ Manages File Uploads and "Virtual Stores" for Gemini
 
 import os
 import json
+import time
+import hashlib
 import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-
-# Load environment variables
-load_dotenv()
+from typing import Callable, Dict, List, Optional, Any, Tuple
+from agents.shared.genai_client import get_client
+from agents.shared.retry import TokenBucket, call_with_retry
+from agents.shared.mapping_store import open_mapping_store
+from agents.shared.manifest import MANIFEST_NAME, data_fingerprint, file_sha256, read_manifest
+from agents.shared.singleflight import SingleFlight
 
 # Configure logging
 logging.basicConfig(
@@ -27,24 +31,165 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+UPLOAD_SUFFIXES = ['.json', '.csv', '.md']
+KNOWLEDGE_STORE_KEY = 'knowledge'
+
+# Gemini deletes uploaded files after 48 hours
+FILE_TTL = timedelta(hours=48)
+
+
+def remote_file_name(entry: Dict[str, Any]) -> str:
+    """Gemini resource name (files/<id>) of a mapping entry"""
+    return entry.get('file_id') or 'files/' + entry['uri'].rstrip('/').rsplit('/', 1)[-1]
+
+
+def entry_expires_at(entry: Dict[str, Any]) -> Optional[datetime]:
+    """
+    Expiry time of a mapping entry
+    
+    Uses the recorded expires_at, else uploaded_at + FILE_TTL. Returns None
+    for entries from older mappings that carry neither (treated as expired).
+    """
+    if entry.get('expires_at'):
+        return datetime.fromisoformat(entry['expires_at'])
+    if entry.get('uploaded_at'):
+        return datetime.fromisoformat(entry['uploaded_at']) + FILE_TTL
+    return None
+
+
+def journal_path_for(mapping_path: Path) -> Path:
+    """Checkpoint journal kept next to the mapping during setup"""
+    mapping_path = Path(mapping_path)
+    return mapping_path.with_name(f"{mapping_path.stem}.journal.jsonl")
+
+
+def write_mapping(mapping: Dict[str, Any], mapping_path: Path):
+    """
+    Replace the mapping atomically, readers never see a partial mapping
+    
+    The backend follows the file suffix: JSON, or SQLite for .db/.sqlite.
+    """
+    store = open_mapping_store(mapping_path)
+    try:
+        store.replace(mapping)
+    finally:
+        store.close()
+
+
+def read_mapping(mapping_path: Path) -> Optional[Dict[str, Any]]:
+    """Whole mapping from a JSON or SQLite mapping file, None if missing"""
+    if not Path(mapping_path).exists():
+        return None
+    
+    store = open_mapping_store(mapping_path)
+    try:
+        return store.export() if store.exists() else None
+    finally:
+        store.close()
+
+
+class UploadProgress:
+    """Thread-safe progress and throughput tracking for a batch of uploads"""
+    
+    def __init__(self, total: int, log_interval: float = 5.0):
+        self.total = total
+        self.log_interval = log_interval
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.start = time.monotonic()
+        self._last_log = self.start
+        self._lock = threading.Lock()
+    
+    def record(self, result: Dict[str, Any]):
+        """Count a finished upload and log progress at most every log_interval seconds"""
+        with self._lock:
+            self.done += 1
+            if result['success']:
+                self.bytes += result.get('size_bytes', 0)
+            else:
+                self.failed += 1
+            
+            now = time.monotonic()
+            if now - self._last_log < self.log_interval and self.done < self.total:
+                return
+            self._last_log = now
+            stats = self.summary()
+        
+        logger.info(
+            f"Progress: {stats['done']}/{self.total} files ({stats['failed']} failed), "
+            f"{stats['files_per_second']:.1f} files/s, {stats['mb_per_second']:.2f} MB/s, "
+            f"ETA {stats['eta_seconds']:.0f}s"
+        )
+    
+    def summary(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate = self.done / elapsed
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 2),
+            "files_per_second": rate,
+            "mb_per_second": self.bytes / elapsed / 1_000_000,
+            "eta_seconds": (self.total - self.done) / rate if rate > 0 else 0.0
+        }
+
 
 class GeminiFileSearchManager:
     """Manages Gemini File uploads and mapping"""
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize Gemini client"""
-        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_workers: int = 8,
+        requests_per_second: float = 5.0,
+        max_attempts: int = 5,
+        files_api: Optional[Any] = None
+    ):
+        """
+        Initialize Gemini client
+        
+        Args:
+            api_key: Gemini API key (defaults to GEMINI_API_KEY)
+            max_workers: Concurrent uploads
+            requests_per_second: Upload rate limit, match the project's API quota
+            max_attempts: Attempts per file on 429/5xx/network errors
+            files_api: Replacement for client.files (e.g. fake_gemini.FakeFilesAPI)
+        """
+        if files_api is None:
+            files_api = get_client(api_key).files
+        
+        self.files = files_api
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.rate_limiter = TokenBucket(requests_per_second)
+        
+        # A refresh pass and a setup (or two overlapping passes) can ask for
+        # the same file at once; it is uploaded only once
+        self._uploads = SingleFlight()
         
-        self.client = genai.Client(api_key=self.api_key)
-        logger.info("Initialized GeminiFileSearchManager (Long Context Mode)")
+        logger.info(
+            f"Initialized GeminiFileSearchManager (Long Context Mode, "
+            f"{max_workers} workers, {requests_per_second} req/s)"
+        )
     
     def upload_file(self, file_path: str, display_name: Optional[str] = None) -> Dict[str, Any]:
-        """Upload a file to Gemini"""
+        """
+        Upload a file to Gemini, retrying quota and server errors
+        
+        Concurrent calls for the same file and display name share one upload.
+        """
         if not display_name:
             display_name = Path(file_path).name
         
+        key = (str(Path(file_path).resolve()), display_name)
+        result, shared = self._uploads.do(key, self._upload_file, file_path, display_name)
+        if shared:
+            logger.info(f"Joined in-flight upload of {file_path}")
+            return dict(result)
+        return result
+    
+    def _upload_file(self, file_path: str, display_name: str) -> Dict[str, Any]:
         logger.info(f"Uploading {file_path}")
         
         try:
@@ -56,62 +201,289 @@ class GeminiFileSearchManager:
             file_size = Path(file_path).stat().st_size
             
             # Determine mime_type override
-            mime_type_override = None
+            config = None
             if file_path.lower().endswith('.json') or file_path.lower().endswith('.md'):
-                mime_type_override = 'text/plain'
+                config = {'mime_type': 'text/plain'}
             
-            # Upload file
-            # Using client.files.upload(file=path)
-            if mime_type_override:
-                file_ref = self.client.files.upload(file=file_path, config={'mime_type': mime_type_override})
-            else:
-                file_ref = self.client.files.upload(file=file_path)
+            # Upload file (rate limited, with backoff on 429/5xx)
+            file_ref = call_with_retry(
+                self.files.upload,
+                file=file_path,
+                config=config,
+                max_attempts=self.max_attempts,
+                rate_limiter=self.rate_limiter
+            )
             
             logger.info(f"✓ Uploaded: {display_name} ({file_size} bytes) -> {file_ref.name} ({file_ref.mime_type})")
             
+            uploaded_at = datetime.now(timezone.utc)
+            expires_at = file_ref.expiration_time or uploaded_at + FILE_TTL
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            
             return {
                 "success": True,
                 "name": display_name,
+                "file_id": file_ref.name,
                 "uri": file_ref.uri,
                 "mime_type": file_ref.mime_type,
-                "size_bytes": file_size
+                "size_bytes": file_size,
+                "uploaded_at": uploaded_at.isoformat(timespec='seconds'),
+                "expires_at": expires_at.isoformat(timespec='seconds')
             }
         
         except Exception as e:
             logger.error(f"Failed to upload {file_path}: {e}")
             return {"success": False, "error": str(e), "file": file_path}
     
+    def delete_file(self, entry: Dict[str, Any]) -> bool:
+        """Delete the remote file behind a mapping entry (best effort)"""
+        name = remote_file_name(entry)
+        try:
+            call_with_retry(
+                self.files.delete,
+                name=name,
+                max_attempts=self.max_attempts,
+                rate_limiter=self.rate_limiter
+            )
+            logger.info(f"✓ Deleted superseded file: {entry.get('name')} ({name})")
+            return True
+        
+        except Exception as e:
+            # Unreachable files expire on their own, so this is not fatal
+            logger.warning(f"Could not delete {name}: {e}")
+            return False
+    
+    def _delete_many(self, entries: List[Dict[str, Any]]) -> int:
+        """Delete remote files concurrently, returns the number deleted"""
+        if not entries:
+            return 0
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="delete") as executor:
+            return sum(executor.map(self.delete_file, entries))
+    
+    def _collect_files(self, directory: Path) -> List[Path]:
+        """Uploadable files of a store directory, sorted by name"""
+        return sorted(
+            path for path in directory.iterdir()
+            if path.is_file() and path.suffix in UPLOAD_SUFFIXES and path.name != MANIFEST_NAME
+        )
+    
+    def _store_fingerprint(self, store_dir: Path, entries: List[Dict[str, Any]]) -> str:
+        """
+        Data fingerprint of a store's uploaded files
+        
+        Same derivation as the cleaner's manifest.json, so for a complete
+        upload the two agree; a mismatch means the manifest is stale or some
+        files failed to upload.
+        """
+        fingerprint = data_fingerprint({entry['name']: entry['sha256'] for entry in entries if entry.get('sha256')})
+        
+        manifest = read_manifest(store_dir)
+        if manifest and manifest.get('fingerprint') != fingerprint:
+            logger.warning(f"Fingerprint of {store_dir.name} differs from its manifest.json")
+        return fingerprint
+    
+    def _upload_many(
+        self,
+        paths: List[Path],
+        progress: Optional[UploadProgress] = None,
+        on_result: Optional[Callable[[Path, Dict[str, Any]], None]] = None
+    ) -> Dict[Path, Dict[str, Any]]:
+        """
+        Upload files concurrently on a bounded pool
+        
+        on_result is called from the calling thread as each upload finishes.
+        """
+        if progress is None:
+            progress = UploadProgress(len(paths))
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="upload") as executor:
+            futures = {
+                executor.submit(self.upload_file, str(path), path.name): path
+                for path in paths
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                progress.record(result)
+                if on_result is not None:
+                    on_result(futures[future], result)
+        
+        return results
+    
+    def _store_results(self, paths: List[Path], results: Dict[Path, Dict[str, Any]]) -> Dict[str, Any]:
+        """Split upload results of one store into uploaded entries and failures"""
+        store = {
+            "uploaded": [],  # List of dicts: {name, uri, mime_type, sha256, size_bytes, uploaded_at}
+            "failed": []
+        }
+        
+        for path in paths:
+            result = results[path]
+            if result['success']:
+                entry = {
+                    'name': result['name'],
+                    'uri': result['uri'],
+                    'mime_type': result['mime_type']
+                }
+                for key in ('file_id', 'sha256', 'size_bytes', 'uploaded_at', 'expires_at'):
+                    if key in result:
+                        entry[key] = result[key]
+                store['uploaded'].append(entry)
+            else:
+                store['failed'].append(path.name)
+        
+        return store
+    
     def upload_user_files(self, user_dir: Path) -> Dict[str, Any]:
         """Upload all files from a user directory"""
         logger.info(f"Uploading user files from {user_dir}")
         
-        results = {
-            "uploaded": [], # List of dicts: {name, uri, mime_type}
-            "failed": []
+        paths = self._collect_files(user_dir)
+        results = self._store_results(paths, self._upload_many(paths))
+        
+        logger.info(f"User upload complete: {len(results['uploaded'])} files")
+        return results
+    
+    def _load_previous_entries(self, mapping_path: Path) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Entries of an existing mapping, keyed by store key then file name"""
+        try:
+            mapping = read_mapping(mapping_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable mapping {mapping_path}: {e}")
+            return {}
+        
+        if mapping is None:
+            return {}
+        
+        stores = dict(mapping.get('user_stores', {}))
+        if mapping.get('knowledge_store'):
+            stores[KNOWLEDGE_STORE_KEY] = mapping['knowledge_store']
+        
+        return {
+            key: {entry['name']: entry for entry in store.get('files', [])}
+            for key, store in stores.items()
         }
+    
+    def _plan_uploads(
+        self,
+        store_files: Dict[str, List[Path]],
+        previous: Dict[str, Dict[str, Dict[str, Any]]],
+        force: bool = False,
+        refresh_margin: timedelta = timedelta(hours=12)
+    ) -> Tuple[Dict[Path, Dict[str, Any]], List[Path], Dict[Path, str]]:
+        """
+        Split files into reusable entries and files that need uploading
         
-        # Upload all files
-        for file_path in user_dir.iterdir():
-            if file_path.is_file() and file_path.suffix in ['.json', '.csv', '.md']:
-                result = self.upload_file(
-                    str(file_path),
-                    file_path.name
-                )
+        A file is reused when the previous mapping has an entry with the
+        same name, size and SHA-256 that stays valid for at least
+        refresh_margin; anything else is (re)uploaded.
+        
+        Returns:
+            (results for reused files keyed by path, paths to upload,
+             hashes of all files keyed by path)
+        """
+        reused = {}
+        to_upload = []
+        hashes = {}
+        valid_until = datetime.now(timezone.utc) + refresh_margin
+        
+        for key, paths in store_files.items():
+            known = previous.get(key, {})
+            for path in paths:
+                hashes[path] = file_sha256(path)
+                entry = known.get(path.name)
                 
-                if result['success']:
-                    results['uploaded'].append({
-                        'name': result['name'],
-                        'uri': result['uri'],
-                        'mime_type': result['mime_type']
-                    })
+                if (
+                    not force
+                    and entry is not None
+                    and entry.get('sha256') == hashes[path]
+                    and entry.get('size_bytes') == path.stat().st_size
+                    and (entry_expires_at(entry) or valid_until) > valid_until
+                ):
+                    reused[path] = {"success": True, **entry}
                 else:
-                    results['failed'].append(file_path.name)
+                    to_upload.append(path)
         
-        logger.info(f"User upload complete: {len(results['uploaded'])} files")
-        return results
+        return reused, to_upload, hashes
+    
+    def _read_journal(self, journal_path: Path) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Entries checkpointed by an interrupted setup run, keyed by store key
+        then file name. A torn last line (crash mid-write) is ignored.
+        """
+        journaled = {}
+        if not journal_path.exists():
+            return journaled
+        
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping incomplete journal line in {journal_path}")
+                    continue
+                for entry in record['files']:
+                    journaled.setdefault(record['store'], {})[entry['name']] = entry
+        
+        return journaled
+    
+    def _append_journal(self, journal, store_key: str, entries: List[Dict[str, Any]]):
+        """Checkpoint the uploaded entries of a completed store"""
+        journal.write(json.dumps({"store": store_key, "files": entries}) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+    
+    def _superseded_entries(
+        self,
+        previous: List[Dict[str, Dict[str, Dict[str, Any]]]],
+        setup_results: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Entries of earlier mappings/journals whose remote file is no longer referenced"""
+        current_uris = set()
+        stores = list(setup_results['user_stores'].values())
+        if setup_results.get('knowledge_store'):
+            stores.append(setup_results['knowledge_store'])
+        for store in stores:
+            current_uris.update(entry['uri'] for entry in store['files'])
+        
+        superseded = {}
+        for source in previous:
+            for entries in source.values():
+                for entry in entries.values():
+                    if entry.get('uri') and entry['uri'] not in current_uris:
+                        superseded[entry['uri']] = entry
+        return list(superseded.values())
     
-    def setup_all_stores(self, cleaned_data_dir: str) -> Dict[str, Any]:
-        """Set up all files (acting as stores) from cleaned data directory"""
+    def setup_all_stores(
+        self,
+        cleaned_data_dir: str,
+        mapping_path: str = 'store_mapping.json',
+        force: bool = False,
+        resume: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Set up all files (acting as stores) from cleaned data directory
+        
+        Files whose content hash matches the existing mapping keep their
+        URIs; only new or changed files are uploaded. Remote files that are
+        no longer referenced are deleted after the new mapping is saved.
+        
+        Each store is checkpointed to a journal next to the mapping as soon
+        as its uploads finish. With resume, files recorded in the journal of
+        an interrupted run are not uploaded again.
+        
+        Args:
+            cleaned_data_dir: Output directory of the data cleaner
+            mapping_path: Mapping to update (read for hashes, then rewritten)
+            force: Re-upload every file regardless of hashes
+            resume: Continue an interrupted run from its journal
+        
+        Returns:
+            The new store mapping
+        """
         logger.info("=" * 60)
         logger.info("Setting up all File Search 'Stores' (Files)")
         logger.info("=" * 60)
@@ -126,30 +498,94 @@ class GeminiFileSearchManager:
             "summary": {
                 "total_users": 0,
                 "total_files": 0,
-                "failed_files": 0
+                "failed_files": 0,
+                "uploaded_files": 0,
+                "reused_files": 0,
+                "deleted_files": 0
             }
         }
         
-        # 1. Set up knowledge store (common files)
-        logger.info("\n[1/2] Setting up knowledge files...")
+        mapping_path = Path(mapping_path)
+        previous = self._load_previous_entries(mapping_path)
+        known = {} if force else {key: dict(entries) for key, entries in previous.items()}
+        
+        journal_path = journal_path_for(mapping_path)
+        journaled = {}
+        if resume:
+            journaled = self._read_journal(journal_path)
+            if journaled:
+                logger.info(f"Resuming from {journal_path}: {sum(len(e) for e in journaled.values())} files in {len(journaled)} stores already uploaded")
+            else:
+                logger.warning(f"Nothing to resume: no journal at {journal_path}")
+        
+        # Journaled entries were uploaded by this run's earlier attempt
+        for key, entries in journaled.items():
+            known.setdefault(key, {}).update(entries)
+        
+        # Collect every file of every store up front, so one pool uploads
+        # across directories instead of one directory at a time
+        logger.info("\n[1/3] Collecting files...")
         knowledge_dir = cleaned_path / 'store_knowledge'
+        knowledge_files = self._collect_files(knowledge_dir) if knowledge_dir.exists() else []
+        
+        user_dirs = sorted(d for d in cleaned_path.iterdir() if d.is_dir() and d.name.startswith('store_user_'))
+        user_files = {user_dir: self._collect_files(user_dir) for user_dir in user_dirs}
+        
+        store_files = {KNOWLEDGE_STORE_KEY: knowledge_files}
+        for user_dir, paths in user_files.items():
+            store_files[user_dir.name.replace('store_user_', '')] = paths
+        
+        results, to_upload, hashes = self._plan_uploads(store_files, known)
+        all_count = len(results) + len(to_upload)
+        logger.info(
+            f"Found {all_count} files in {len(user_dirs)} user stores + knowledge store: "
+            f"{len(to_upload)} new or changed, {len(results)} unchanged"
+        )
+        
+        logger.info("\n[2/3] Uploading files...")
+        store_of = {path: key for key, paths in store_files.items() for path in paths}
+        pending = {}
+        for path in to_upload:
+            pending.setdefault(store_of[path], []).append(path)
+        remaining = {key: len(paths) for key, paths in pending.items()}
         
+        finished = {}
+        
+        def checkpoint(path: Path, result: Dict[str, Any]):
+            """Journal a store once its last upload has finished"""
+            if result['success']:
+                result['sha256'] = hashes[path]
+            finished[path] = result
+            
+            key = store_of[path]
+            remaining[key] -= 1
+            if remaining[key] == 0:
+                entries = self._store_results(pending[key], finished)['uploaded']
+                self._append_journal(journal, key, entries)
+        
+        progress = UploadProgress(len(to_upload))
+        with open(journal_path, 'a' if resume else 'w') as journal:
+            uploaded = self._upload_many(to_upload, progress, on_result=checkpoint)
+        results.update(uploaded)
+        
+        setup_results['summary']['uploaded_files'] = sum(1 for r in uploaded.values() if r['success'])
+        setup_results['summary']['reused_files'] = all_count - len(to_upload)
+        
+        # 3. Assemble the mapping
+        logger.info("\n[3/3] Building store mapping...")
         if knowledge_dir.exists():
-            upload_result = self.upload_user_files(knowledge_dir)
+            upload_result = self._store_results(knowledge_files, results)
             
             setup_results['knowledge_store'] = {
                 "store_id": "knowledge", # Dummy ID
                 "files": upload_result['uploaded'], # List of {name, uri, mime_type}
-                "failed": upload_result['failed']
+                "failed": upload_result['failed'],
+                "fingerprint": self._store_fingerprint(knowledge_dir, upload_result['uploaded'])
             }
             
             setup_results['summary']['total_files'] += len(upload_result['uploaded'])
             setup_results['summary']['failed_files'] += len(upload_result['failed'])
         
-        # 2. Set up user stores
-        logger.info("\n[2/2] Setting up user files...")
-        user_dirs = [d for d in cleaned_path.iterdir() if d.is_dir() and d.name.startswith('store_user_')]
-        
         for user_dir in user_dirs:
             user_id = user_dir.name.replace('store_user_', '')
             
@@ -162,33 +598,195 @@ class GeminiFileSearchManager:
             else:
                 user_name = user_id
             
-            upload_result = self.upload_user_files(user_dir)
+            upload_result = self._store_results(user_files[user_dir], results)
             
             setup_results['user_stores'][user_id] = {
                 "user_name": user_name,
                 "store_id": f"user_{user_id[:8]}", # Dummy ID
                 "files": upload_result['uploaded'],
-                "failed": upload_result['failed']
+                "failed": upload_result['failed'],
+                "fingerprint": self._store_fingerprint(user_dir, upload_result['uploaded'])
             }
             
             setup_results['summary']['total_users'] += 1
             setup_results['summary']['total_files'] += len(upload_result['uploaded'])
             setup_results['summary']['failed_files'] += len(upload_result['failed'])
         
-        # Save mapping to file
-        mapping_path = Path('store_mapping.json')
-        with open(mapping_path, 'w') as f:
-            json.dump(setup_results, f, indent=2)
+        throughput = progress.summary()
+        setup_results['summary']['elapsed_seconds'] = throughput['elapsed_seconds']
+        setup_results['summary']['files_per_second'] = round(throughput['files_per_second'], 2)
+        
+        # Save mapping to file; the journal is merged in and no longer needed
+        write_mapping(setup_results, mapping_path)
+        journal_path.unlink(missing_ok=True)
+        
+        # Only delete once the new mapping no longer points at them
+        superseded = self._superseded_entries([previous, journaled], setup_results)
+        if superseded:
+            logger.info(f"Deleting {len(superseded)} superseded remote files...")
+            setup_results['summary']['deleted_files'] = self._delete_many(superseded)
         
         logger.info("=" * 60)
         logger.info("Setup complete!")
         logger.info("=" * 60)
         logger.info(f"Total users: {setup_results['summary']['total_users']}")
-        logger.info(f"Total files uploaded: {setup_results['summary']['total_files']}")
+        logger.info(f"Total files in mapping: {setup_results['summary']['total_files']}")
+        logger.info(f"Uploaded: {setup_results['summary']['uploaded_files']}, unchanged: {setup_results['summary']['reused_files']}, deleted: {setup_results['summary']['deleted_files']}")
+        logger.info(f"Failed files: {setup_results['summary']['failed_files']}")
+        logger.info(f"Throughput: {throughput['files_per_second']:.1f} files/s, {throughput['mb_per_second']:.2f} MB/s in {throughput['elapsed_seconds']:.1f}s")
         logger.info(f"Mapping saved to: {mapping_path}")
         logger.info("=" * 60)
         
         return setup_results
+    
+    def _store_dir(self, cleaned_path: Path, store_key: str) -> Path:
+        if store_key == KNOWLEDGE_STORE_KEY:
+            return cleaned_path / 'store_knowledge'
+        return cleaned_path / f'store_user_{store_key}'
+    
+    def _due_at(self, entry: Dict[str, Any], margin: timedelta, spread: timedelta) -> datetime:
+        """
+        When an entry should be refreshed: margin before expiry, minus a
+        stable per-file offset within spread so that files uploaded in the
+        same run do not all come due at once
+        """
+        expires_at = entry_expires_at(entry)
+        if expires_at is None:
+            return datetime.min.replace(tzinfo=timezone.utc)
+        
+        offset = int(hashlib.sha256(remote_file_name(entry).encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return expires_at - margin - spread * offset
+    
+    def _last_active(self, store_dir: Path) -> float:
+        """Activity proxy for a store: newest mtime of its local files"""
+        try:
+            return max((path.stat().st_mtime for path in self._collect_files(store_dir)), default=0.0)
+        except OSError:
+            return 0.0
+    
+    def refresh_expiring(
+        self,
+        cleaned_data_dir: str,
+        mapping_path: str = 'store_mapping.json',
+        margin_hours: float = 12.0,
+        spread_hours: float = 6.0,
+        batch_size: int = 50,
+        max_files: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Re-upload files that are about to expire
+        
+        Files are due margin_hours before expiry (earlier by up to
+        spread_hours, fixed per file, to spread the load). Due files are
+        ordered by urgency: already expired first, then the knowledge store
+        (every chat uses it), then users by recent activity. They are
+        re-uploaded in batches; after each batch the mapping is rewritten
+        atomically and the replaced remote files are deleted.
+        
+        Args:
+            cleaned_data_dir: Directory holding the local copies to re-upload
+            mapping_path: Mapping to refresh in place
+            margin_hours: Refresh this long before a file expires
+            spread_hours: Window over which due times are spread
+            batch_size: Files uploaded between mapping writes
+            max_files: Cap on re-uploads in this run (None = all due files)
+        
+        Returns:
+            Summary with due, refreshed, failed and missing counts
+        """
+        mapping = read_mapping(mapping_path)
+        if mapping is None:
+            raise FileNotFoundError(f"Store mapping not found: {mapping_path}")
+        
+        cleaned_path = Path(cleaned_data_dir)
+        margin = timedelta(hours=margin_hours)
+        spread = timedelta(hours=spread_hours)
+        now = datetime.now(timezone.utc)
+        
+        stores = dict(mapping.get('user_stores', {}))
+        if mapping.get('knowledge_store'):
+            stores[KNOWLEDGE_STORE_KEY] = mapping['knowledge_store']
+        
+        # (store_key, entry index, entry) for every due file
+        due = []
+        for store_key, store in stores.items():
+            for index, entry in enumerate(store.get('files', [])):
+                if self._due_at(entry, margin, spread) <= now:
+                    due.append((store_key, index, entry))
+        
+        activity = {key: self._last_active(self._store_dir(cleaned_path, key)) for key in {d[0] for d in due}}
+        
+        def priority(item):
+            store_key, _, entry = item
+            expires_at = entry_expires_at(entry)
+            expired = expires_at is None or expires_at <= now
+            return (
+                not expired,
+                store_key != KNOWLEDGE_STORE_KEY,
+                -activity.get(store_key, 0.0),
+                expires_at or now
+            )
+        
+        due.sort(key=priority)
+        if max_files is not None:
+            due = due[:max_files]
+        
+        summary = {"due": len(due), "refreshed": 0, "failed": 0, "missing": 0, "deleted": 0}
+        logger.info(f"Refresh: {len(due)} files due (margin {margin_hours}h, spread {spread_hours}h)")
+        
+        for start in range(0, len(due), batch_size):
+            batch = due[start:start + batch_size]
+            
+            paths = {}
+            for item in batch:
+                store_key, _, entry = item
+                path = self._store_dir(cleaned_path, store_key) / entry['name']
+                if path.exists():
+                    paths[path] = item
+                else:
+                    logger.warning(f"Cannot refresh {entry['name']} of {store_key}: {path} not found")
+                    summary['missing'] += 1
+            
+            results = self._upload_many(list(paths), UploadProgress(len(paths)))
+            
+            replaced = []
+            changed = set()
+            for path, result in results.items():
+                store_key, index, entry = paths[path]
+                if not result['success']:
+                    summary['failed'] += 1
+                    continue
+                
+                new_entry = self._store_results([path], {path: result})['uploaded'][0]
+                new_entry['sha256'] = file_sha256(path)
+                stores[store_key]['files'][index] = new_entry
+                replaced.append(entry)
+                changed.add(store_key)
+                summary['refreshed'] += 1
+            
+            # Local copies may have changed since setup
+            for key in changed:
+                stores[key]['fingerprint'] = self._store_fingerprint(
+                    self._store_dir(cleaned_path, key), stores[key]['files']
+                )
+            
+            # Rewrite only the stores touched by this batch
+            store = open_mapping_store(mapping_path)
+            try:
+                store.update_stores(
+                    {key: stores[key] for key in changed if key != KNOWLEDGE_STORE_KEY},
+                    knowledge_store=stores[KNOWLEDGE_STORE_KEY] if KNOWLEDGE_STORE_KEY in changed else None
+                )
+            finally:
+                store.close()
+            summary['deleted'] += self._delete_many(replaced)
+            logger.info(f"Refresh batch {start // batch_size + 1}: {summary['refreshed']}/{len(due)} refreshed")
+        
+        logger.info(
+            f"Refresh complete: {summary['refreshed']} refreshed, {summary['failed']} failed, "
+            f"{summary['missing']} missing locally"
+        )
+        return summary
 
 
 def main():
@@ -196,18 +794,93 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Gemini File Manager')
-    parser.add_argument('command', choices=['setup'],
+    parser.add_argument('command', choices=['setup', 'refresh', 'import', 'export'],
                        help='Command to execute')
     parser.add_argument('--data-dir', default='cleaned_data',
                        help='Cleaned data directory (default: cleaned_data)')
+    parser.add_argument('--workers', type=int, default=8,
+                       help='Concurrent uploads (default: 8)')
+    parser.add_argument('--rps', type=float, default=5.0,
+                       help='Max upload requests per second (default: 5)')
+    parser.add_argument('--max-attempts', type=int, default=5,
+                       help='Attempts per file on 429/5xx errors (default: 5)')
+    parser.add_argument('--mapping', default='store_mapping.json',
+                       help='Store mapping to update, .json or .db/.sqlite (default: store_mapping.json)')
+    parser.add_argument('--json', default='store_mapping.json',
+                       help='import/export: JSON mapping to copy from/to (default: store_mapping.json)')
+    parser.add_argument('--force', action='store_true',
+                       help='Re-upload every file even if its content hash is unchanged')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted setup from its journal')
+    parser.add_argument('--margin-hours', type=float, default=12.0,
+                       help='refresh: re-upload this long before expiry (default: 12)')
+    parser.add_argument('--spread-hours', type=float, default=6.0,
+                       help='refresh: window over which due times are spread (default: 6)')
+    parser.add_argument('--batch-size', type=int, default=50,
+                       help='refresh: files uploaded between mapping writes (default: 50)')
+    parser.add_argument('--max-files', type=int, default=None,
+                       help='refresh: cap on re-uploads per run (default: all due)')
+    parser.add_argument('--watch', action='store_true',
+                       help='refresh: keep running, refreshing every --interval seconds')
+    parser.add_argument('--interval', type=float, default=600.0,
+                       help='refresh: seconds between checks with --watch (default: 600)')
+    parser.add_argument('--fake-upload', action='store_true',
+                       help='Upload to a local in-process fake instead of Gemini')
+    parser.add_argument('--fake-latency-ms', type=float, default=200.0,
+                       help='Mean latency of fake uploads (default: 200)')
+    parser.add_argument('--fake-error-rate', type=float, default=0.0,
+                       help='Fraction of fake uploads failing with 429/503 (default: 0)')
     
     args = parser.parse_args()
     
-    manager = GeminiFileSearchManager()
+    # Mapping format conversion, no API access needed
+    if args.command in ('import', 'export'):
+        source, target = (args.json, args.mapping) if args.command == 'import' else (args.mapping, args.json)
+        mapping = read_mapping(source)
+        if mapping is None:
+            raise FileNotFoundError(f"Store mapping not found: {source}")
+        write_mapping(mapping, target)
+        print(f"✓ Copied mapping of {len(mapping.get('user_stores', {}))} users: {source} -> {target}")
+        return
+    
+    files_api = None
+    if args.fake_upload:
+        from fake_gemini import FakeFilesAPI
+        files_api = FakeFilesAPI(latency_ms=args.fake_latency_ms, error_rate=args.fake_error_rate)
+    
+    manager = GeminiFileSearchManager(
+        max_workers=args.workers,
+        requests_per_second=args.rps,
+        max_attempts=args.max_attempts,
+        files_api=files_api
+    )
     
     if args.command == 'setup':
-        results = manager.setup_all_stores(args.data_dir)
-        print(f"\n✓ Setup complete: {results['summary']['total_users']} users, {results['summary']['total_files']} files")
+        results = manager.setup_all_stores(
+            args.data_dir,
+            mapping_path=args.mapping,
+            force=args.force,
+            resume=args.resume
+        )
+        summary = results['summary']
+        print(f"\n✓ Setup complete: {summary['total_users']} users, {summary['total_files']} files "
+              f"({summary['uploaded_files']} uploaded, {summary['reused_files']} unchanged)")
+    
+    elif args.command == 'refresh':
+        while True:
+            summary = manager.refresh_expiring(
+                args.data_dir,
+                mapping_path=args.mapping,
+                margin_hours=args.margin_hours,
+                spread_hours=args.spread_hours,
+                batch_size=args.batch_size,
+                max_files=args.max_files
+            )
+            print(f"\n✓ Refresh: {summary['refreshed']}/{summary['due']} files refreshed")
+            
+            if not args.watch:
+                break
+            time.sleep(args.interval)
 
 if __name__ == '__main__':
     main()
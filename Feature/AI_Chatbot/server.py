@@ -0,0 +1,346 @@
+"""
+HTTP service for the Personal Finance Chatbot
+Keeps one warm PersonalFinanceChatbot per worker process and serves chats
+over a small JSON API, so callers skip Python startup, mapping load and
+client construction on every query
+"""
+
+import os
+import time
+import asyncio
+import logging
+import contextlib
+import multiprocessing
+from typing import Any, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from chatbot import PersonalFinanceChatbot
+from agents.shared import QueryOptions, tracer
+from agents.shared.deadline import hedging
+from agents.shared.intent_matcher import INTENT_PRIORITY
+from agents.shared.usage import MODEL_PRICES, ledger
+
+logger = logging.getLogger(__name__)
+
+CONFIG_KEY = web.AppKey('config', dict)
+# {'chatbot': ..., 'error': ...}: filled in by the background warm-up, so
+# mutable after the app is frozen
+STATE_KEY = web.AppKey('state', dict)
+
+# QueryOptions fields a caller may set per request: (type, min, max)
+OPTION_FIELDS = {
+    'max_fan_out': (int, 1, len(INTENT_PRIORITY) + 1),  # One specialist per intent
+    'max_results': (int, 1, 100),
+    'include_knowledge_store': (bool, None, None),
+    'model': (str, None, None)
+}
+
+# Models a caller may pick: those with known prices (usage.MODEL_PRICES)
+ALLOWED_MODELS = frozenset(MODEL_PRICES)
+
+
+def _json_error(status: int, error: str) -> web.Response:
+    return web.json_response({"success": False, "error": error}, status=status)
+
+
+def _parse_options(raw: Any) -> Optional[QueryOptions]:
+    """QueryOptions from a request's options object, ValueError if malformed"""
+    if not raw:
+        return None
+    if not isinstance(raw, dict):
+        raise ValueError("options must be an object")
+    unknown = set(raw) - set(OPTION_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+
+    for name, value in raw.items():
+        kind, low, high = OPTION_FIELDS[name]
+        # bool is an int subclass; reject it for numeric options
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            raise ValueError(f"{name} must be {kind.__name__}")
+        if low is not None and not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+    if 'model' in raw and raw['model'] not in ALLOWED_MODELS:
+        raise ValueError(f"model must be one of {', '.join(sorted(ALLOWED_MODELS))}")
+
+    return QueryOptions(**raw)
+
+
+def _parse_request(payload: Any) -> Tuple[str, str, Optional[QueryOptions]]:
+    """(user_id, query, options) of a /chat body, ValueError if malformed"""
+    if not isinstance(payload, dict):
+        raise ValueError("body must be a JSON object")
+    user_id = payload.get('user_id')
+    query = payload.get('query')
+    if not isinstance(user_id, str) or not user_id:
+        raise ValueError("user_id must be a non-empty string")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("query must be a non-empty string")
+    return user_id, query, _parse_options(payload.get('options'))
+
+
+async def handle_chat(request: web.Request) -> web.Response:
+    """
+    POST /chat {"user_id": ..., "query": ..., "options": {...}}
+
+    Returns the chat() result dict. 400 for malformed requests, 404 for
+    unknown users, 503 when the worker is saturated or still warming up.
+    """
+    chatbot = request.app[STATE_KEY]['chatbot']
+    if chatbot is None:
+        return _json_error(503, "Service is starting")
+
+    try:
+        user_id, query, options = _parse_request(await request.json())
+    except ValueError as e:
+        # Includes malformed JSON (json.JSONDecodeError)
+        return _json_error(400, f"Invalid request: {e}")
+
+    config = request.app[CONFIG_KEY]
+    semaphore: asyncio.Semaphore = config['semaphore']
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=config['queue_timeout'])
+    except asyncio.TimeoutError:
+        return _json_error(503, "Too many concurrent requests")
+
+    start = time.perf_counter()
+    try:
+        result = await chatbot.achat(user_id, query, options)
+    finally:
+        semaphore.release()
+
+    if not result['success'] and 'available_users' in result:
+        # Do not echo the whole user list to API callers
+        return _json_error(404, result['error'])
+
+    result.setdefault('metadata', {})['server_ms'] = (time.perf_counter() - start) * 1000
+    return web.json_response(result)
+
+
+async def handle_users(request: web.Request) -> web.Response:
+    """GET /users: user_id -> user_name"""
+    chatbot = request.app[STATE_KEY]['chatbot']
+    if chatbot is None:
+        return _json_error(503, "Service is starting")
+    return web.json_response(chatbot.list_users())
+
+
+async def handle_healthz(request: web.Request) -> web.Response:
+    """GET /healthz: process is up (liveness)"""
+    return web.json_response({"status": "ok", "pid": os.getpid()})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """GET /metrics: this worker's span latency, token and cache metrics (Prometheus text)"""
+    if not tracer.enabled:
+        return web.Response(text="# tracing disabled, start with --metrics or --trace\n")
+    return web.Response(text=tracer.render_prometheus())
+
+
+async def handle_readyz(request: web.Request) -> web.Response:
+    """GET /readyz: chatbot is loaded and warmed, ready for traffic"""
+    state = request.app[STATE_KEY]
+    if state['error'] is not None:
+        return web.json_response({"status": "failed", "error": state['error']}, status=503)
+    if state['chatbot'] is None:
+        return web.json_response({"status": "starting"}, status=503)
+    return web.json_response({"status": "ready", "pid": os.getpid()})
+
+
+def _build_chatbot(config: Dict[str, Any]) -> PersonalFinanceChatbot:
+    """Create the chatbot and warm its per-user caches"""
+    if config['hedge']:
+        hedging.configure(enabled=True)
+    chatbot = PersonalFinanceChatbot(
+        store_mapping_path=config['mapping'],
+        use_preflight=config['preflight'],
+        request_timeout=config['request_timeout']
+    )
+    chatbot.preload()
+
+    warm_users = config['warm_users']
+    if warm_users:
+        start = time.perf_counter()
+        user_ids = list(chatbot.list_users())
+        if warm_users > 0:
+            user_ids = user_ids[:warm_users]
+        for user_id in user_ids:
+            user_context = chatbot.get_user_context(user_id)
+            if user_context:
+                chatbot.file_search_client._get_file_parts(user_context)
+        logger.info(f"Warmed caches for {len(user_ids)} users in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    return chatbot
+
+
+async def _warm_up(app: web.Application):
+    """Build the chatbot off the event loop and publish it when done"""
+    state = app[STATE_KEY]
+    try:
+        state['chatbot'] = await asyncio.get_running_loop().run_in_executor(None, _build_chatbot, app[CONFIG_KEY])
+    except Exception as e:
+        logger.exception(f"Worker {os.getpid()} failed to start: {e}")
+        state['error'] = str(e)
+        return
+    logger.info(f"Worker {os.getpid()} ready")
+
+
+async def _chatbot_ctx(app: web.Application):
+    # aiohttp binds the port only after startup returns, so warm up in a
+    # task: /healthz answers and /readyz reports "starting" meanwhile
+    warm_up = asyncio.create_task(_warm_up(app))
+    yield
+
+    warm_up.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await warm_up
+    chatbot = app[STATE_KEY]['chatbot']
+    if chatbot is not None:
+        chatbot.mapping_watcher.stop()
+    # Worker processes exit without running atexit handlers; the write
+    # may wait for another worker's SQLite lock, so keep it off the loop
+    await asyncio.get_running_loop().run_in_executor(None, ledger.flush)
+
+
+def create_app(
+    mapping: str = 'store_mapping.json',
+    preflight: bool = False,
+    max_concurrency: int = 64,
+    queue_timeout: float = 30.0,
+    warm_users: int = -1,
+    request_timeout: Optional[float] = None,
+    hedge: bool = False
+) -> web.Application:
+    """
+    Build the aiohttp application
+
+    Args:
+        mapping: Store mapping path (JSON or SQLite)
+        preflight: Use the structured pre-flight guard call
+        max_concurrency: Chats processed at once by this worker; more wait
+        queue_timeout: Seconds a chat may wait for a slot before 503
+        warm_users: Users whose caches are built at startup (-1 = all, 0 = none)
+        request_timeout: Per-chat deadline in seconds, after which the answer
+            comes from local summaries (None = no deadline)
+        hedge: Hedge Gemini calls slower than their recent p95
+
+    Returns:
+        Application; the chatbot is built in the background once serving starts
+    """
+    app = web.Application()
+    app[CONFIG_KEY] = {
+        'mapping': mapping,
+        'preflight': preflight,
+        'queue_timeout': queue_timeout,
+        'warm_users': warm_users,
+        'request_timeout': request_timeout,
+        'hedge': hedge,
+        'semaphore': asyncio.Semaphore(max_concurrency)
+    }
+    app[STATE_KEY] = {'chatbot': None, 'error': None}
+
+    app.router.add_post('/chat', handle_chat)
+    app.router.add_get('/users', handle_users)
+    app.router.add_get('/healthz', handle_healthz)
+    app.router.add_get('/readyz', handle_readyz)
+    app.router.add_get('/metrics', handle_metrics)
+
+    app.cleanup_ctx.append(_chatbot_ctx)
+    return app
+
+
+def _serve(
+    host: str,
+    port: int,
+    reuse_port: bool,
+    app_kwargs: Dict[str, Any],
+    trace: Optional[Dict[str, Any]] = None,
+    usage_db: Optional[str] = None
+):
+    if trace:
+        tracer.configure(**trace)
+    if usage_db != ledger.path:
+        ledger.configure(usage_db)
+    web.run_app(
+        create_app(**app_kwargs),
+        host=host,
+        port=port,
+        reuse_port=reuse_port,
+        print=None
+    )
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Personal Finance Chatbot HTTP service')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8088, help='Port (default: 8088)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes sharing the port (default: 1)')
+    parser.add_argument('--max-concurrency', type=int, default=64,
+                        help='Concurrent chats per worker (default: 64)')
+    parser.add_argument('--queue-timeout', type=float, default=30.0,
+                        help='Seconds a request may wait for a slot before 503 (default: 30)')
+    parser.add_argument('--warm-users', type=int, default=-1,
+                        help='Users to pre-warm at startup, -1 for all (default: -1)')
+    parser.add_argument('--mapping', default='store_mapping.json',
+                        help='Store mapping, .json or .db/.sqlite (default: store_mapping.json)')
+    parser.add_argument('--preflight', action='store_true',
+                        help='Use a single structured guard + intent classification call')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Trace requests and serve Prometheus metrics on /metrics')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Also append one JSONL span per traced stage to FILE (implies --metrics)')
+    parser.add_argument('--usage-db', default=ledger.path,
+                        help='SQLite token usage ledger shared by all workers, empty to disable '
+                             '(default: CHATBOT_USAGE_DB, else off)')
+    parser.add_argument('--timeout', type=float,
+                        help='Per-chat deadline in seconds, excluding queueing; slower chats are '
+                             'answered from local summaries (default: none)')
+    parser.add_argument('--hedge', action='store_true',
+                        help='Send a second Gemini call when one runs past the recent p95')
+
+    args = parser.parse_args()
+
+    app_kwargs = {
+        'mapping': args.mapping,
+        'preflight': args.preflight,
+        'max_concurrency': args.max_concurrency,
+        'queue_timeout': args.queue_timeout,
+        'warm_users': args.warm_users,
+        'request_timeout': args.timeout,
+        'hedge': args.hedge
+    }
+
+    trace = None
+    if args.metrics or args.trace:
+        trace = {'enabled': True, 'path': args.trace}
+
+    logger.info(f"Serving on http://{args.host}:{args.port} with {args.workers} worker(s)")
+
+    if args.workers <= 1:
+        _serve(args.host, args.port, False, app_kwargs, trace, args.usage_db or None)
+        return
+
+    # Each worker is a separate process with its own event loop and
+    # chatbot; the kernel balances connections across them (SO_REUSEPORT)
+    worker_args = (args.host, args.port, True, app_kwargs, trace, args.usage_db or None)
+    workers = [
+        multiprocessing.Process(target=_serve, args=worker_args, name=f"worker-{i}")
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == '__main__':
+    main()
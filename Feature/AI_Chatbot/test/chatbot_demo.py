@@ -19,6 +19,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Queries per demo scenario (also replayed by test/load_test.py)
+SCENARIO_QUERIES = {
+    1: [
+        "How much have I spent on Food & Dining this month?",
+        "What percentage of my Food budget have I used?",
+        "Am I on track with my budget?",
+    ],
+    2: [
+        "What is my Emergency Fund goal?",
+        "How much do I need to save monthly to reach my goal?",
+        "Am I on track to meet my savings goal?",
+    ],
+    3: [
+        "Show me my recent spending",
+        "What are my total expenses this month?",
+        "What is my income vs expenses?",
+    ],
+    4: [
+        "What are my top spending categories?",
+        "How is my spending this month?",
+        "Any unusual spending patterns?",
+    ],
+}
+
+QUICK_QUERIES = [
+    "What is my total spending on Food this month?",
+    "How much do I need to save monthly for my Emergency Fund?",
+    "What are my total income and expenses?",
+]
+
 
 def print_section(title: str):
     """Print formatted section header"""
@@ -38,13 +68,7 @@ def demo_scenario_1(chatbot: PersonalFinanceChatbot, user_id: str, user_name: st
     """Demo: Budget tracking and spending analysis"""
     print_section(f"Scenario 1: Budget Tracking - {user_name}")
     
-    queries = [
-        "How much have I spent on Food & Dining this month?",
-        "What percentage of my Food budget have I used?",
-        "Am I on track with my budget?",
-    ]
-    
-    for query in queries:
+    for query in SCENARIO_QUERIES[1]:
         result = chatbot.chat(user_id, query)
         
         if result['success']:
@@ -57,13 +81,7 @@ def demo_scenario_2(chatbot: PersonalFinanceChatbot, user_id: str, user_name: st
     """Demo: Goal tracking"""
     print_section(f"Scenario 2: Goal Tracking - {user_name}")
     
-    queries = [
-        "What is my Emergency Fund goal?",
-        "How much do I need to save monthly to reach my goal?",
-        "Am I on track to meet my savings goal?",
-    ]
-    
-    for query in queries:
+    for query in SCENARIO_QUERIES[2]:
         result = chatbot.chat(user_id, query)
         
         if result['success']:
@@ -76,13 +94,7 @@ def demo_scenario_3(chatbot: PersonalFinanceChatbot, user_id: str, user_name: st
     """Demo: Transaction analysis"""
     print_section(f"Scenario 3: Transaction Analysis - {user_name}")
     
-    queries = [
-        "Show me my recent spending",
-        "What are my total expenses this month?",
-        "What is my income vs expenses?",
-    ]
-    
-    for query in queries:
+    for query in SCENARIO_QUERIES[3]:
         result = chatbot.chat(user_id, query)
         
         if result['success']:
@@ -95,13 +107,7 @@ def demo_scenario_4(chatbot: PersonalFinanceChatbot, user_id: str, user_name: st
     """Demo: Spending insights"""
     print_section(f"Scenario 4: Spending Insights - {user_name}")
     
-    queries = [
-        "What are my top spending categories?",
-        "How is my spending this month?",
-        "Any unusual spending patterns?",
-    ]
-    
-    for query in queries:
+    for query in SCENARIO_QUERIES[4]:
         result = chatbot.chat(user_id, query)
         
         if result['success']:
@@ -165,16 +171,10 @@ def run_quick_demo():
         chatbot = PersonalFinanceChatbot()
         demo_user_id = "44dfe804-3a46-4206-91a9-2685f7d5e003"
         
-        quick_queries = [
-            "What is my total spending on Food this month?",
-            "How much do I need to save monthly for my Emergency Fund?",
-            "What are my total income and expenses?",
-        ]
-        
         print("\n🚀 Running quick demo...\n")
         
-        for i, query in enumerate(quick_queries, 1):
-            print(f"[Query {i}/{len(quick_queries)}]")
+        for i, query in enumerate(QUICK_QUERIES, 1):
+            print(f"[Query {i}/{len(QUICK_QUERIES)}]")
             result = chatbot.chat(demo_user_id, query)
             
             if result['success']:
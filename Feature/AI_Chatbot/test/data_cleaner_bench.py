@@ -0,0 +1,118 @@
+"""
+Data cleaning pipeline benchmark
+Generates synthetic snapshots at several scales (test/generate_database.py)
+and reports DataCleaner's own per-stage stats (DataCleaner.stage_stats:
+load, normalize, dedup, enrich, export, summarize, manifest, knowledge),
+with rows/s and peak traced memory per stage
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+# Absolute: main() changes the working directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from generate_database import generate_database
+
+STAT_FIELDS = ('seconds', 'rows', 'rows_per_second', 'peak_mb')
+
+
+def run_pipeline(input_file: str, output_dir: str, profile: Optional[Set[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """DataCleaner.run() on one snapshot; returns its stage_stats"""
+    # Imported late: data_cleaner opens data_cleaner.log in the working
+    # directory on import, which main() points at the temp dir
+    from data_cleaner import DataCleaner
+
+    cleaner = DataCleaner(input_file, output_dir, profile=profile or set(), profile_top=0)
+    cleaner.run()
+    return {
+        name: {field: stats[field] for field in STAT_FIELDS if field in stats}
+        for name, stats in cleaner.stage_stats.items()
+    }
+
+
+def bench_scale(users: int, args, workdir: Path) -> Dict[str, Any]:
+    """Generate one snapshot and benchmark the pipeline on it"""
+    data = generate_database(
+        users=users, months=args.months, tx_per_month=args.tx_per_month,
+        duplicate_rate=args.duplicate_rate, seed=args.seed
+    )
+    input_file = workdir / f"database_{users}.json"
+    with open(input_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    counts = {key: len(data[key]) for key in ('users', 'transactions', 'budgets', 'goals')}
+    del data
+
+    # Best of --repeat timing runs, then one run under tracemalloc (which
+    # slows allocation-heavy code, so its timings are not used)
+    timings = [run_pipeline(str(input_file), str(workdir / f"out_{users}_{i}")) for i in range(args.repeat)]
+    stages = {name: min((run[name] for run in timings), key=lambda s: s["seconds"]) for name in timings[0]}
+
+    if not args.no_memory:
+        memory = run_pipeline(str(input_file), str(workdir / f"out_{users}_memory"), profile={'memory'})
+        for name, stats in memory.items():
+            stages[name]["peak_mb"] = stats["peak_mb"]
+
+    return {
+        **counts,
+        "input_mb": input_file.stat().st_size / 1e6,
+        "total_seconds": sum(stage["seconds"] for stage in stages.values()),
+        "stages": stages
+    }
+
+
+def print_scale(result: Dict[str, Any]):
+    print(
+        f"\n{result['users']} users, {result['transactions']:,} transactions "
+        f"({result['input_mb']:.1f} MB): {result['total_seconds']:.2f} s"
+    )
+    for name, stage in result["stages"].items():
+        peak = f"  peak {stage['peak_mb']:>8.1f} MB" if 'peak_mb' in stage else ""
+        print(f"  {name:<10} {stage['seconds']:>8.3f} s  {stage['rows_per_second']:>12,.0f} rows/s{peak}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark DataCleaner stages on synthetic data')
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 500],
+                        help='Scales to run, in users (default: 10 100 500)')
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--tx-per-month', type=int, default=30)
+    parser.add_argument('--duplicate-rate', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=1, help='Timing runs per scale, best kept (default: 1)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    results = {"config": vars(args), "scales": []}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # data_cleaner.log goes to the temp dir, not the source tree
+        os.chdir(tmp)
+        try:
+            # Keep pipeline logging (console and log file) out of the timings
+            logging.getLogger('data_cleaner').setLevel(logging.WARNING)
+            for users in args.users:
+                result = bench_scale(users, args, Path(tmp))
+                print_scale(result)
+                results["scales"].append(result)
+        finally:
+            os.chdir(cwd)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Synthetic database.json generator
+Builds snapshots shaped like the backend export in database/database.json:
+users with Vietnamese names, monthly transactions with Vietnamese
+descriptions, budgets and goals. Duplicate records are injected at a
+configurable rate so the data cleaner's deduplication has work to do.
+"""
+
+import sys
+import json
+import uuid
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# (name, type, typical amount range in USD, Vietnamese descriptions)
+CATEGORY_POOL: List[Tuple[str, str, Tuple[float, float], List[str]]] = [
+    ('Food & Dining', 'EXPENSE', (2.0, 40.0), [
+        'Ăn sáng bánh mì', 'Phở bò buổi trưa', 'Cơm văn phòng', 'Cà phê sữa đá',
+        'Trà sữa với đồng nghiệp', 'Bún chả Hàng Mành', 'Đi chợ mua rau', 'Siêu thị Co.opmart'
+    ]),
+    ('Transportation', 'EXPENSE', (1.0, 25.0), [
+        'Grab đi làm', 'Đổ xăng xe máy', 'Vé xe buýt tháng', 'Gửi xe chung cư', 'Taxi ra sân bay'
+    ]),
+    ('Shopping', 'EXPENSE', (5.0, 120.0), [
+        'Mua quần áo Shopee', 'Giày thể thao', 'Đồ gia dụng Điện Máy Xanh', 'Sách Fahasa', 'Mỹ phẩm'
+    ]),
+    ('Entertainment', 'EXPENSE', (3.0, 60.0), [
+        'Vé xem phim CGV', 'Karaoke cuối tuần', 'Netflix hàng tháng', 'Spotify Premium', 'Vé ca nhạc'
+    ]),
+    ('Bills & Utilities', 'EXPENSE', (10.0, 80.0), [
+        'Tiền điện EVN', 'Tiền nước', 'Internet FPT', 'Cước điện thoại Viettel', 'Phí quản lý chung cư'
+    ]),
+    ('Healthcare', 'EXPENSE', (5.0, 150.0), [
+        'Khám bệnh phòng khám', 'Mua thuốc nhà thuốc Long Châu', 'Nha khoa', 'Bảo hiểm y tế'
+    ]),
+    ('Education', 'EXPENSE', (10.0, 300.0), [
+        'Học phí tiếng Anh', 'Khóa học online', 'Sách giáo khoa', 'Học thêm cho con'
+    ]),
+    ('Travel', 'EXPENSE', (30.0, 500.0), [
+        'Vé máy bay Đà Nẵng', 'Khách sạn Nha Trang', 'Tour Hạ Long', 'Homestay Đà Lạt'
+    ]),
+    ('Salary', 'INCOME', (800.0, 3000.0), ['Lương tháng', 'Thưởng hiệu suất', 'Lương tháng 13']),
+    ('Freelance', 'INCOME', (50.0, 800.0), ['Dự án thiết kế web', 'Dịch tài liệu', 'Dạy kèm buổi tối']),
+    ('Transfer', 'TRANSFER', (20.0, 500.0), ['Chuyển tiền cho bố mẹ', 'Chuyển sang tài khoản tiết kiệm']),
+]
+
+FAMILY_NAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Minh', 'Ngọc', 'Quang', 'Thanh', 'Hữu', 'Thu', 'Đức', 'Hoài']
+GIVEN_NAMES = ['An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hải', 'Hương', 'Khoa', 'Lan',
+               'Linh', 'Long', 'Mai', 'Nam', 'Phương', 'Quân', 'Tâm', 'Trang', 'Tuấn', 'Vy']
+
+GOAL_TITLES = ['Quỹ khẩn cấp', 'Mua xe máy', 'Du lịch Nhật Bản', 'Mua nhà', 'Học thạc sĩ', 'Đám cưới', 'Mua laptop']
+
+# Strip Vietnamese diacritics for e-mail addresses
+_ASCII = str.maketrans(
+    'àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ',
+    'aaaaaaaaaaaaaaaaaeeeeeeeeeeeiiiiiooooooooooooooooouuuuuuuuuuuyyyyyd'
+)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z"
+
+
+def _month_starts(end_month: str, months: int) -> List[datetime]:
+    year, month = map(int, end_month.split('-'))
+    starts = []
+    for _ in range(months):
+        starts.append(datetime(year, month, 1, tzinfo=timezone.utc))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return starts[::-1]
+
+
+def _days_in_month(start: datetime) -> int:
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return (next_month - start).days
+
+
+def generate_database(
+    users: int = 10,
+    months: int = 6,
+    tx_per_month: int = 30,
+    categories: int = len(CATEGORY_POOL),
+    duplicate_rate: float = 0.05,
+    end_month: Optional[str] = None,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Build a synthetic database snapshot
+
+    Args:
+        users: Number of users
+        months: Months of history per user, ending at end_month
+        tx_per_month: Average transactions per user and month
+        categories: Categories to use (the pool is cycled with numbered
+            variants beyond its size)
+        duplicate_rate: Share of transactions, budgets and goals that are
+            re-exported duplicates (newer updatedAt, same content)
+        end_month: Last month (YYYY-MM, default: current month)
+        seed: Random seed for reproducible snapshots
+
+    Returns:
+        Dict shaped like database/database.json
+    """
+    rng = random.Random(seed)
+
+    def new_id() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    end_month = end_month or datetime.now(timezone.utc).strftime('%Y-%m')
+    month_starts = _month_starts(end_month, months)
+    created = month_starts[0] - timedelta(days=30)
+
+    category_rows = []
+    category_specs = []
+    for i in range(categories):
+        name, kind, amounts, descriptions = CATEGORY_POOL[i % len(CATEGORY_POOL)]
+        if i >= len(CATEGORY_POOL):
+            name = f"{name} {i // len(CATEGORY_POOL) + 1}"
+        row = {
+            'id': new_id(), 'name': name, 'type': kind, 'color': None,
+            'createdAt': _iso(created), 'updatedAt': _iso(created)
+        }
+        category_rows.append(row)
+        category_specs.append((row, amounts, descriptions))
+
+    expense_specs = [spec for spec in category_specs if spec[0]['type'] == 'EXPENSE'] or category_specs
+    income_specs = [spec for spec in category_specs if spec[0]['type'] == 'INCOME']
+
+    def duplicate(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Same content under a new id, exported again later"""
+        copy = dict(record, id=new_id())
+        updated = datetime.fromisoformat(record['updatedAt'].replace('Z', '+00:00'))
+        copy['updatedAt'] = _iso(updated + timedelta(minutes=rng.randint(1, 600)))
+        return copy
+
+    user_rows, transactions, budgets, goals = [], [], [], []
+    for u in range(users):
+        name = f"{rng.choice(FAMILY_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(GIVEN_NAMES)}"
+        email = f"{name.lower().translate(_ASCII).replace(' ', '.')}{u}@example.com"
+        user_id = new_id()
+        user_rows.append({'id': user_id, 'email': email, 'name': name, 'createdAt': _iso(created)})
+
+        for start in month_starts:
+            days = _days_in_month(start)
+            count = max(1, int(rng.gauss(tx_per_month, tx_per_month * 0.2)))
+            for t in range(count):
+                # Roughly one income per ten transactions
+                specs = income_specs if income_specs and t % 10 == 0 else expense_specs
+                category, (low, high), descriptions = rng.choice(specs)
+                occurred = start + timedelta(days=rng.randrange(days))
+                created_at = occurred + timedelta(minutes=rng.randint(1, 1440))
+                tx = {
+                    'id': new_id(),
+                    'userId': user_id,
+                    'categoryId': category['id'],
+                    'amount': f"{rng.uniform(low, high):.2f}".rstrip('0').rstrip('.'),
+                    'currency': 'USD',
+                    'description': rng.choice(descriptions),
+                    'occurredAt': _iso(occurred),
+                    'createdAt': _iso(created_at),
+                    'updatedAt': _iso(created_at),
+                    'category': category
+                }
+                transactions.append(tx)
+                if rng.random() < duplicate_rate:
+                    transactions.append(duplicate(tx))
+
+        for category, (low, high), _ in rng.sample(expense_specs, min(3, len(expense_specs))):
+            budget = {
+                'id': new_id(), 'userId': user_id, 'categoryId': category['id'],
+                'amount': str(round(high * tx_per_month / 2, -1)), 'period': 'MONTHLY',
+                'createdAt': _iso(created), 'updatedAt': _iso(created), 'category': category
+            }
+            budgets.append(budget)
+            if rng.random() < duplicate_rate:
+                budgets.append(duplicate(budget))
+
+        for title in rng.sample(GOAL_TITLES, rng.randint(1, 3)):
+            target = rng.choice([1000, 2000, 5000, 10000, 20000, 50000])
+            target_date = month_starts[-1].replace(year=month_starts[-1].year + rng.randint(1, 5))
+            goal = {
+                'id': new_id(), 'userId': user_id, 'title': title,
+                'targetAmount': str(target), 'targetDate': _iso(target_date),
+                'progress': str(round(target * rng.uniform(0, 0.8))),
+                'createdAt': _iso(created), 'updatedAt': _iso(created)
+            }
+            goals.append(goal)
+            if rng.random() < duplicate_rate:
+                goals.append(duplicate(goal))
+
+    rng.shuffle(transactions)
+    return {
+        'users': user_rows,
+        'transactions': transactions,
+        'categories': category_rows,
+        'budgets': budgets,
+        'goals': goals,
+        'aiInsights': [],
+        'lastUpdated': _iso(datetime.now(timezone.utc))
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic database.json')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--tx-per-month', type=int, default=30, help='Average per user and month (default: 30)')
+    parser.add_argument('--categories', type=int, default=len(CATEGORY_POOL),
+                        help=f'Categories (default: {len(CATEGORY_POOL)})')
+    parser.add_argument('--duplicate-rate', type=float, default=0.05,
+                        help='Share of re-exported duplicate records (default: 0.05)')
+    parser.add_argument('--end-month', help='Last month, YYYY-MM (default: current month)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default='-', help='Output file (default: stdout)')
+
+    args = parser.parse_args()
+
+    data = generate_database(
+        users=args.users, months=args.months, tx_per_month=args.tx_per_month,
+        categories=args.categories, duplicate_rate=args.duplicate_rate,
+        end_month=args.end_month, seed=args.seed
+    )
+
+    if args.output == '-':
+        json.dump(data, sys.stdout, indent=2, ensure_ascii=False)
+        return
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(
+        f"Wrote {args.output}: {len(data['users'])} users, {len(data['transactions'])} transactions, "
+        f"{len(data['budgets'])} budgets, {len(data['goals'])} goals", file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Intent Matcher - regression cases and micro-benchmark
+Compares the compiled IntentMatcher against the original router's
+per-call keyword scan (copied here unchanged)
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.shared.intent_matcher import IntentMatcher
+
+
+# (query, expected intent)
+REGRESSION_CASES = [
+    # Demo scenarios (English)
+    ("How much have I spent on Food & Dining this month?", "transactions"),
+    ("What percentage of my Food budget have I used?", "budget"),
+    ("Am I on track with my budget?", "budget"),
+    ("What is my Emergency Fund goal?", "goals"),
+    ("How much do I need to save monthly to reach my goal?", "goals"),
+    ("Am I on track to meet my savings goal?", "goals"),
+    ("Show me my recent spending", "transactions"),
+    ("What are my total expenses this month?", "transactions"),
+    ("What is my income vs expenses?", "transactions"),
+    ("Any unusual spending patterns?", "insights"),
+    ("How much money is left this month?", "budget"),
+
+    # Demo scenarios (Vietnamese)
+    ("Ngân sách tháng này còn lại bao nhiêu?", "budget"),
+    ("Tôi có vượt ngân sách ăn uống không?", "budget"),
+    ("Tiến độ mục tiêu tiết kiệm", "goals"),
+    ("Quỹ dự phòng của tôi đạt được bao nhiêu rồi?", "goals"),
+    ("Phân tích chi tiêu tháng này", "insights"),
+    ("Chi phí ăn uống tháng trước", "insights"),
+    ("Có giao dịch nào bất thường không?", "insights"),
+    ("Tôi đã chi bao nhiêu cho Ăn uống?", "transactions"),
+
+    # Vietnamese typed without diacritics
+    ("ngan sach thang nay con lai bao nhieu", "budget"),
+    ("tien do muc tieu tiet kiem", "goals"),
+    ("so sanh chi tieu voi thang truoc", "insights"),
+
+    # Substring false positives of the legacy matcher
+    ("Give me an overview of my transactions", "transactions"),
+    ("Help me understand my transactions", "transactions"),
+    ("How much did the leftover pizza cost?", "transactions"),
+    ("I bought a trendy jacket, how much was it?", "transactions"),
+    ("Chi phí cho con đi học tháng 11", "transactions"),
+]
+
+
+def legacy_classify(query: str) -> str:
+    """
+    Original RouterAgent._classify_intent (before IntentMatcher), returning
+    the intent name instead of the agent: its own keyword lists, rebuilt on
+    every call, substring scan, first group wins
+    """
+    query_lower = query.lower()
+    
+    # Budget-related keywords (Vietnamese + English)
+    budget_keywords = [
+        # English
+        'budget', 'over', 'under', 'left', 'remaining',
+        'budget limit', 'overspending', 'burn rate',
+        'how much can i spend', 'monthly budget',
+        # Vietnamese
+        'ngân sách', 'vượt', 'dưới', 'còn lại', 'còn',
+        'giới hạn ngân sách', 'chi tiêu quá', 'tốc độ chi',
+        'tôi có thể chi', 'ngân sách tháng', 'chi quá',
+        'vượt ngân sách', 'trong ngân sách'
+    ]
+    
+    if any(keyword in query_lower for keyword in budget_keywords):
+        return 'budget'
+    
+    # Goal-related keywords (Vietnamese + English)
+    goal_keywords = [
+        # English
+        'goal', 'save', 'saving', 'target', 'emergency fund',
+        'contribution', 'on track', 'achieve', 'progress toward',
+        # Vietnamese
+        'mục tiêu', 'tiết kiệm', 'dự trữ', 'quỹ khẩn cấp',
+        'quỹ dự phòng', 'đóng góp', 'đúng hướng', 'đạt được',
+        'tiến độ', 'quỹ dự trữ', 'kế hoạch tiết kiệm',
+        'tiết kiệm tháng', 'tiết kiệm hàng tháng'
+    ]
+    
+    if any(keyword in query_lower for keyword in goal_keywords):
+        return 'goals'
+    
+    # Insights/trends keywords (Vietnamese + English)
+    insights_keywords = [
+        # English
+        'trend', 'pattern', 'compare', 'last month', 'this month vs',
+        'month over month', 'spending habits', 'insight',
+        'why did', 'how come', 'unusual', 'anomaly',
+        # Vietnamese
+        'xu hướng', 'mẫu hình', 'so sánh', 'tháng trước',
+        'tháng này vs', 'tháng này so với', 'thói quen chi tiêu',
+        'nhận xét', 'tại sao', 'làm sao', 'bất thường',
+        'khác thường', 'phân tích', 'chi tiết'
+    ]
+    
+    if any(keyword in query_lower for keyword in insights_keywords):
+        return 'insights'
+    
+    # Default to transaction analyst for specific queries
+    return 'transactions'
+
+
+def run_regression(matcher: IntentMatcher) -> int:
+    """Check every regression case, return number of failures"""
+    print("=" * 70)
+    print("  Regression cases")
+    print("=" * 70)
+
+    failures = 0
+    for query, expected in REGRESSION_CASES:
+        actual = matcher.classify(query)
+        legacy = legacy_classify(query)
+        status = "PASS" if actual == expected else "FAIL"
+        if actual != expected:
+            failures += 1
+        print(f"[{status}] {query!r}: {actual} (expected {expected}, legacy {legacy})")
+
+    print(f"\n{len(REGRESSION_CASES) - failures}/{len(REGRESSION_CASES)} passed")
+    return failures
+
+
+def run_benchmark(matcher: IntentMatcher, number: int = 500, repeat: int = 15):
+    """Time both matchers over the full case list (best of interleaved runs)"""
+    print("\n" + "=" * 70)
+    print("  Micro-benchmark")
+    print("=" * 70)
+
+    queries = [query for query, _ in REGRESSION_CASES]
+
+    def bench_legacy():
+        for query in queries:
+            legacy_classify(query)
+
+    def bench_compiled():
+        for query in queries:
+            matcher.classify(query)
+
+    calls = number * len(queries)
+    # Alternate the two so load on the machine slows both alike
+    legacy_time = compiled_time = float('inf')
+    for _ in range(repeat):
+        legacy_time = min(legacy_time, timeit.timeit(bench_legacy, number=number))
+        compiled_time = min(compiled_time, timeit.timeit(bench_compiled, number=number))
+    compile_time = min(timeit.repeat(IntentMatcher, number=20, repeat=3)) / 20
+
+    print(f"Legacy substring scan: {legacy_time / calls * 1e6:.2f} µs/query")
+    print(f"Compiled matcher:      {compiled_time / calls * 1e6:.2f} µs/query (all intents scored)")
+    print(f"One-time compile:      {compile_time * 1e3:.2f} ms")
+
+
+def main():
+    matcher = IntentMatcher()
+    failures = run_regression(matcher)
+    run_benchmark(matcher)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
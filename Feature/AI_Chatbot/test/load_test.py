@@ -0,0 +1,350 @@
+"""
+Offline load test for the chat pipeline
+Replays the demo scenario queries at a target QPS through the full
+guard -> router -> agent pipeline (in-process achat(), or a running
+server.py) against a local Gemini stand-in (fake_gemini.py), and reports
+throughput, latency percentiles and error rates without using API quota
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import subprocess
+import urllib.request
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+CHATBOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(CHATBOT_DIR))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from chatbot_demo import SCENARIO_QUERIES
+from agents.shared.usage import ledger
+from agents.shared.cassette import cassette
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def fetch_stats(base_url: str) -> Optional[Dict[str, Any]]:
+    """Call counters of a fake_gemini.py server (None if unreachable / not a fake)"""
+    try:
+        with urllib.request.urlopen(f"{base_url}/fake/stats", timeout=2) as resp:
+            return json.load(resp)
+    except OSError:
+        return None
+
+
+def start_fake_server(args) -> Tuple[subprocess.Popen, str]:
+    """Run fake_gemini.py in its own process so it does not share the GIL with the load"""
+    base_url = f"http://127.0.0.1:{args.fake_port}"
+    command = [
+        sys.executable, 'fake_gemini.py', '--port', str(args.fake_port),
+        '--generate-latency-ms', str(args.generate_latency_ms),
+        '--guard-latency-ms', str(args.guard_latency_ms),
+        '--distribution', args.distribution,
+        '--error-rate', str(args.error_rate),
+        '--reject-rate', str(args.reject_rate),
+        '--output-tokens', str(args.output_tokens)
+    ]
+    if args.seed is not None:
+        command += ['--seed', str(args.seed)]
+
+    server = subprocess.Popen(command, cwd=CHATBOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while fetch_stats(base_url) is None:
+        if server.poll() is not None or time.time() > deadline:
+            server.kill()
+            raise RuntimeError("Fake Gemini server did not start")
+        time.sleep(0.1)
+    return server, base_url
+
+
+def build_workload(user_ids: List[str], scenarios: List[int], count: int, seed: Optional[int]) -> List[Tuple[str, str]]:
+    """(user_id, query) pairs drawn from the scenario queries"""
+    queries = [query for scenario in scenarios for query in SCENARIO_QUERIES[scenario]]
+    rng = random.Random(seed)
+    return [(rng.choice(user_ids), rng.choice(queries)) for _ in range(count)]
+
+
+class PipelineTarget:
+    """In-process PersonalFinanceChatbot.achat()"""
+
+    name = "pipeline"
+
+    def __init__(self, mapping: str, preflight: bool, request_timeout: Optional[float] = None):
+        from chatbot import PersonalFinanceChatbot
+
+        self.chatbot = PersonalFinanceChatbot(
+            store_mapping_path=mapping, use_preflight=preflight, reload_interval=None, request_timeout=request_timeout
+        )
+        self.chatbot.preload()
+
+    def user_ids(self) -> List[str]:
+        return list(self.chatbot.list_users())
+
+    async def chat(self, user_id: str, query: str) -> Dict[str, Any]:
+        return await self.chatbot.achat(user_id, query)
+
+    async def close(self):
+        pass
+
+
+class ServiceTarget:
+    """A running server.py, via POST /chat"""
+
+    name = "service"
+
+    def __init__(self, url: str):
+        import aiohttp
+
+        self.url = url.rstrip('/')
+        self._aiohttp = aiohttp
+        self._session = None
+
+    def user_ids(self) -> List[str]:
+        with urllib.request.urlopen(f"{self.url}/users", timeout=10) as resp:
+            return list(json.load(resp))
+
+    async def chat(self, user_id: str, query: str) -> Dict[str, Any]:
+        if self._session is None:
+            self._session = self._aiohttp.ClientSession(timeout=self._aiohttp.ClientTimeout(total=300))
+        async with self._session.post(f"{self.url}/chat", json={"user_id": user_id, "query": query}) as resp:
+            result = await resp.json()
+            if resp.status != 200:
+                result.setdefault('error', f"HTTP {resp.status}")
+            return result
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+async def run_load(target, workload: List[Tuple[str, str]], qps: float, max_in_flight: int) -> Dict[str, Any]:
+    """
+    Open-loop load: request i is sent at start + i / qps whether or not
+    earlier ones finished. Latency is measured from the scheduled send
+    time, so queueing in the client is not hidden.
+    """
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    errors: Counter = Counter()
+    stage_ms: Dict[str, List[float]] = {}
+    in_flight = 0
+
+    async def one(scheduled: float, user_id: str, query: str):
+        nonlocal in_flight
+        try:
+            result = await target.chat(user_id, query)
+        except Exception as e:
+            result = {"success": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            in_flight -= 1
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+
+        metadata = result.get('metadata') or {}
+        if result.get('success') and metadata.get('fallback'):
+            outcomes['fallback'] += 1
+        elif result.get('success'):
+            outcomes['ok'] += 1
+        elif metadata.get('filtered'):
+            outcomes['rejected'] += 1
+        else:
+            outcomes['error'] += 1
+            errors[str(result.get('error'))[:80]] += 1
+
+        for stage, ms in (metadata.get('timings_ms') or {}).items():
+            stage_ms.setdefault(stage, []).append(ms)
+
+    start = time.perf_counter()
+    tasks = []
+    for i, (user_id, query) in enumerate(workload):
+        scheduled = start + i / qps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if in_flight >= max_in_flight:
+            outcomes['shed'] += 1
+            continue
+        in_flight += 1
+        tasks.append(asyncio.create_task(one(scheduled, user_id, query)))
+
+    send_lag_ms = max(0.0, (time.perf_counter() - (start + (len(workload) - 1) / qps)) * 1000)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    completed = len(latencies)
+    summary = {
+        "target_qps": qps,
+        "sent": len(tasks),
+        "completed": completed,
+        "ok": outcomes['ok'],
+        "fallback": outcomes['fallback'],
+        "rejected": outcomes['rejected'],
+        "errors": outcomes['error'],
+        "shed": outcomes['shed'],
+        "error_rate": round(outcomes['error'] / completed, 4) if completed else 0.0,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_qps": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+        "send_lag_ms": round(send_lag_ms, 1),
+        "top_errors": dict(errors.most_common(5))
+    }
+    if latencies:
+        for pct in (50, 95, 99):
+            summary[f"p{pct}_ms"] = round(percentile(latencies, pct), 1)
+        summary["max_ms"] = round(max(latencies), 1)
+    if stage_ms:
+        summary["stage_mean_ms"] = {stage: round(sum(values) / len(values), 1) for stage, values in stage_ms.items()}
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(
+        f"\n{summary['completed']} completed in {summary['elapsed_seconds']}s "
+        f"({summary['throughput_qps']} q/s at target {summary['target_qps']} q/s)"
+    )
+    print(
+        f"  ok {summary['ok']}  fallback {summary['fallback']}  rejected {summary['rejected']}  errors {summary['errors']} "
+        f"({summary['error_rate'] * 100:.1f}%)  shed {summary['shed']}"
+    )
+    if 'p50_ms' in summary:
+        print(
+            f"  latency p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  "
+            f"p99 {summary['p99_ms']} ms  max {summary['max_ms']} ms"
+        )
+    if summary['send_lag_ms'] > 100:
+        print(f"  ⚠️  generator fell {summary['send_lag_ms']:.0f} ms behind schedule; results understate the load")
+    for error, count in summary['top_errors'].items():
+        print(f"  {count:>5} x {error}")
+    for stage, ms in summary.get('stage_mean_ms', {}).items():
+        print(f"  {stage:<22} {ms:>8.1f} ms (mean)")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Offline load test against a local Gemini stand-in')
+    parser.add_argument('--qps', type=float, default=10.0, help='Target queries per second (default: 10)')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load (default: 30)')
+    parser.add_argument('--scenario', type=int, nargs='+', choices=sorted(SCENARIO_QUERIES),
+                        default=sorted(SCENARIO_QUERIES), help='Demo scenarios to replay (default: all)')
+    parser.add_argument('--users', type=int, default=0, help='Spread load over the first N users (default: all)')
+    parser.add_argument('--max-in-flight', type=int, default=1000,
+                        help='Requests in flight before new ones are shed (default: 1000)')
+    parser.add_argument('--mapping', default='store_mapping.json')
+    parser.add_argument('--preflight', action='store_true', help='Use the structured pre-flight guard call')
+    parser.add_argument('--max-connections', type=int, default=None,
+                        help='GEMINI_MAX_CONNECTIONS for the in-process client (default: environment / 20)')
+    parser.add_argument('--timeout', type=float,
+                        help='Per-query deadline in seconds; slower queries get local fallback answers')
+    parser.add_argument('--hedge', action='store_true', help='Hedge Gemini calls slower than their recent p95')
+    parser.add_argument('--service-url', help='Load a running server.py instead of an in-process chatbot')
+    parser.add_argument('--record', metavar='CASSETTE', help='Record the Gemini calls of this run to a cassette')
+    parser.add_argument('--replay', metavar='CASSETTE',
+                        help='Answer Gemini calls from a recorded cassette instead of a fake server')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='Replay latency multiplier, 0 for no delay (default: 1)')
+    parser.add_argument('--base-url',
+                        help='Existing Gemini endpoint (e.g. a fake_gemini.py you started); '
+                             'default starts a fake server')
+    parser.add_argument('--fake-port', type=int, default=8790)
+    parser.add_argument('--generate-latency-ms', type=float, default=1500.0)
+    parser.add_argument('--guard-latency-ms', type=float, default=400.0)
+    parser.add_argument('--distribution', default='lognormal', choices=('fixed', 'uniform', 'lognormal'))
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Injected 429/503 rate (default: 0)')
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='Guard rejection rate (default: 0)')
+    parser.add_argument('--output-tokens', type=int, default=150)
+    parser.add_argument('--trace', action='store_true', help='Trace requests and report mean time per stage')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+
+    args = parser.parse_args()
+
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.service_url and (args.record or args.replay or args.timeout or args.hedge):
+        parser.error("--record/--replay/--timeout/--hedge apply to the in-process pipeline, not --service-url "
+                     "(start server.py with --timeout/--hedge instead)")
+
+    fake_server = None
+    base_url = args.base_url
+    if args.replay:
+        cassette.configure(args.replay, mode='replay', speed=args.replay_speed)
+        os.environ.setdefault('GEMINI_API_KEY', 'fake')
+        ledger.configure(None)
+    elif not args.service_url:
+        if args.record:
+            cassette.configure(args.record, mode='record')
+        if base_url is None:
+            fake_server, base_url = start_fake_server(args)
+            print(f"fake Gemini server on {base_url}")
+        os.environ['GEMINI_BASE_URL'] = base_url
+        os.environ.setdefault('GEMINI_API_KEY', 'fake')
+        if args.max_connections:
+            os.environ['GEMINI_MAX_CONNECTIONS'] = str(args.max_connections)
+        # Keep load-test tokens out of the real usage ledger
+        ledger.configure(None)
+
+    # Per-request INFO logs would dominate the client's CPU time
+    logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        if args.service_url:
+            target = ServiceTarget(args.service_url)
+        else:
+            os.chdir(CHATBOT_DIR)
+            if args.trace:
+                from agents.shared import tracer
+                tracer.configure(enabled=True)
+            if args.hedge:
+                from agents.shared.deadline import hedging
+                hedging.configure(enabled=True)
+            target = PipelineTarget(args.mapping, args.preflight, args.timeout)
+
+        user_ids = target.user_ids()
+        if args.users:
+            user_ids = user_ids[:args.users]
+        workload = build_workload(user_ids, args.scenario, max(1, int(args.qps * args.duration)), args.seed)
+        print(f"{target.name}: {len(workload)} queries over {len(user_ids)} users at {args.qps} q/s")
+
+        before = fetch_stats(base_url) if base_url else None
+
+        async def run():
+            try:
+                return await run_load(target, workload, args.qps, args.max_in_flight)
+            finally:
+                await target.close()
+
+        summary = asyncio.run(run())
+
+        after = fetch_stats(base_url) if base_url else None
+        if before and after:
+            summary["fake_server"] = {key: after[key] - before.get(key, 0) for key in after}
+
+        print_summary(summary)
+        if summary.get("fake_server"):
+            stats = summary["fake_server"]
+            print(f"  fake server: {stats['guard'] + stats['preflight']} guard calls, {stats['generate']} answers, "
+                  f"{stats['errors']} injected errors")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({"config": vars(args), "results": summary}, f, indent=2, ensure_ascii=False)
+
+    finally:
+        if fake_server is not None:
+            fake_server.terminate()
+            fake_server.wait()
+
+
+if __name__ == '__main__':
+    main()
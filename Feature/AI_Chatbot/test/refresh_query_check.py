@@ -0,0 +1,86 @@
+"""
+Refresh-then-query regression check
+Uploads the cleaned data to a local Gemini stand-in (fake_gemini.py), asks a
+question, re-uploads every file with `refresh_expiring` (same content, new
+URIs, old files deleted) and asks again from the same running chatbot. The
+second answer fails if any cached request still points at a deleted file.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+CHATBOT_DIR = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(CHATBOT_DIR))
+
+QUERY = "How much have I spent on Food & Dining this month?"
+
+
+def ask(chatbot, loop, user_id: str, label: str) -> bool:
+    """Ask QUERY through the sync, async and streaming paths"""
+    results = {
+        'chat': chatbot.chat(user_id, QUERY),
+        'achat': loop.run_until_complete(chatbot.achat(user_id, QUERY)),
+    }
+    stream = chatbot.chat_stream(user_id, QUERY)
+    try:
+        while True:
+            next(stream)
+    except StopIteration as stop:
+        results['chat_stream'] = stop.value
+
+    ok = True
+    for mode, result in results.items():
+        status = "PASS" if result['success'] else "FAIL"
+        ok = ok and result['success']
+        print(f"[{status}] {label} {mode}: {result.get('error') or result['agent']}")
+    return ok
+
+
+def main():
+    import asyncio
+
+    os.environ['CHATBOT_USAGE_DB'] = ''
+    logging.basicConfig(level=logging.WARNING)
+
+    from fake_gemini import FakeGeminiServer
+
+    server = FakeGeminiServer(generate_latency_ms=20, guard_latency_ms=10, upload_latency_ms=5, distribution='fixed')
+    os.environ['GEMINI_BASE_URL'] = server.start()
+    os.environ['GEMINI_API_KEY'] = 'fake'
+
+    from gemini_file_search import GeminiFileSearchManager
+    from chatbot import PersonalFinanceChatbot
+
+    # One loop for both async asks: the SDK's async client keeps
+    # connections bound to the loop that opened them
+    loop = asyncio.new_event_loop()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            mapping_path = os.path.join(tmp, 'store_mapping.json')
+            cleaned_data = str(CHATBOT_DIR / 'cleaned_data')
+            manager = GeminiFileSearchManager(requests_per_second=1000)
+            manager.setup_all_stores(cleaned_data, mapping_path)
+
+            chatbot = PersonalFinanceChatbot(store_mapping_path=mapping_path, reload_interval=None, coalesce=False)
+            user_id = next(iter(chatbot.list_users()))
+            ok = ask(chatbot, loop, user_id, "before refresh")
+
+            # Every file is due: same content under new URIs, old files deleted
+            summary = manager.refresh_expiring(cleaned_data, mapping_path, margin_hours=24 * 365)
+            print(f"Refreshed {summary['refreshed']} files, deleted {summary['deleted']}")
+            chatbot.mapping_watcher.check()
+
+            ok = ask(chatbot, loop, user_id, "after refresh") and ok
+    finally:
+        loop.close()
+        server.stop()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+HTTP service vs per-process CLI benchmark
+Measures latency and throughput of `chatbot.py --query` (one process per
+query) against the long-running `server.py` service
+"""
+
+import sys
+import json
+import time
+import asyncio
+import subprocess
+import statistics
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+
+CHATBOT_DIR = Path(__file__).parent.parent
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def describe(name: str, latencies_ms: List[float], wall_s: float, errors: int) -> Dict[str, float]:
+    stats = {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "rps": len(latencies_ms) / wall_s if wall_s > 0 else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "mean_ms": statistics.mean(latencies_ms)
+    }
+    print(
+        f"{name:<8} {stats['requests']:>5} req  {stats['errors']:>4} err  {stats['rps']:>8.2f} req/s  "
+        f"p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms"
+    )
+    return stats
+
+
+def bench_cli(user_id: str, query: str, runs: int, mapping: str) -> Dict[str, float]:
+    """Sequential `chatbot.py --query` runs, each a fresh process"""
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, 'chatbot.py', '--mapping', mapping, '--user-id', user_id, '--query', query, '--no-stream'],
+            cwd=CHATBOT_DIR, capture_output=True, text=True
+        )
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if proc.returncode != 0 or proc.stdout.startswith('Error'):
+            errors += 1
+    return describe("cli", latencies, time.perf_counter() - start, errors)
+
+
+async def _wait_ready(session: aiohttp.ClientSession, base_url: str, timeout: float = 60.0) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            async with session.get(f"{base_url}/readyz") as resp:
+                if resp.status == 200:
+                    return time.perf_counter() - start
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.05)
+    raise TimeoutError("Service did not become ready")
+
+
+async def _bench_service(base_url: str, user_id: str, query: str, requests: int, concurrency: int) -> Dict[str, float]:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
+        ready_s = await _wait_ready(session, base_url)
+        print(f"service ready after {ready_s * 1000:.0f} ms")
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    async with session.post(f"{base_url}/chat", json={"user_id": user_id, "query": query}) as resp:
+                        body = await resp.json()
+                        if resp.status != 200 or not body.get('success'):
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return describe("service", latencies, time.perf_counter() - start, errors)
+
+
+def bench_service(user_id: str, query: str, requests: int, concurrency: int, workers: int, port: int, mapping: str) -> Dict[str, float]:
+    """Start server.py, then send requests with bounded concurrency"""
+    server = subprocess.Popen(
+        [sys.executable, 'server.py', '--port', str(port), '--workers', str(workers), '--mapping', mapping],
+        cwd=CHATBOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return asyncio.run(_bench_service(f"http://127.0.0.1:{port}", user_id, query, requests, concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the HTTP service against the CLI')
+    parser.add_argument('--user-id', help='User to query (default: first user in the mapping)')
+    parser.add_argument('--query', default='How much have I spent this month?')
+    parser.add_argument('--mapping', default='store_mapping.json')
+    parser.add_argument('--cli-runs', type=int, default=5, help='CLI processes to run (default: 5)')
+    parser.add_argument('--requests', type=int, default=100, help='Service requests (default: 100)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent service requests (default: 16)')
+    parser.add_argument('--workers', type=int, default=1, help='Service worker processes (default: 1)')
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+
+    args = parser.parse_args()
+
+    user_id = args.user_id
+    if not user_id:
+        with open(CHATBOT_DIR / args.mapping) as f:
+            user_id = next(iter(json.load(f)['user_stores']))
+
+    results = {
+        "cli": bench_cli(user_id, args.query, args.cli_runs, args.mapping),
+        "service": bench_service(user_id, args.query, args.requests, args.concurrency, args.workers, args.port, args.mapping)
+    }
+    print(f"speedup (req/s): {results['service']['rps'] / results['cli']['rps']:.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+CLI startup benchmark
+Times `chatbot.py --list-users` end to end and lists the slowest imports
+(from `python -X importtime`), to keep heavy SDK imports off paths that
+never make a Gemini call
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import statistics
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+CHATBOT_DIR = Path(__file__).parent.parent
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    # Client construction is lazy, but set a key so full-init timing works offline
+    env.setdefault('GEMINI_API_KEY', 'benchmark')
+    return env
+
+
+def time_command(args: List[str], runs: int) -> List[float]:
+    """Wall-clock milliseconds of fresh `python <args>` processes"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=CHATBOT_DIR, env=_env(),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def top_imports(args: List[str], limit: int) -> List[Tuple[str, float]]:
+    """Top-level imports by cumulative time (ms) for `python -X importtime <args>`"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=CHATBOT_DIR, env=_env(),
+                          capture_output=True, text=True)
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        _, cumulative, name = line.split('|')
+        # Only modules imported directly (no indentation below the root)
+        if name.startswith(' ') and not name.startswith('  '):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:limit]
+
+
+def describe(name: str, timings: List[float]) -> Dict[str, float]:
+    stats = {"runs": len(timings), "min_ms": min(timings), "median_ms": statistics.median(timings)}
+    print(f"{name:<28} min {stats['min_ms']:>8.1f} ms  median {stats['median_ms']:>8.1f} ms")
+    return stats
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark chatbot CLI startup')
+    parser.add_argument('--mapping', default='store_mapping.json')
+    parser.add_argument('--runs', type=int, default=10, help='Processes per measurement (default: 10)')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list (default: 10)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+
+    args = parser.parse_args()
+
+    list_users = ['chatbot.py', '--mapping', args.mapping, '--list-users']
+    full_init = ['-c', (
+        "from chatbot import PersonalFinanceChatbot; "
+        f"PersonalFinanceChatbot(store_mapping_path={args.mapping!r}).preload()"
+    )]
+
+    results = {
+        "python": describe("python -c pass", time_command(['-c', 'pass'], args.runs)),
+        "list_users": describe("chatbot.py --list-users", time_command(list_users, args.runs)),
+        "full_init": describe("init + preload()", time_command(full_init, args.runs)),
+    }
+
+    print("\nslowest imports for --list-users:")
+    results["top_imports"] = []
+    for name, ms in top_imports(list_users, args.top):
+        print(f"  {ms:>8.1f} ms  {name}")
+        results["top_imports"].append({"module": name, "cumulative_ms": ms})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
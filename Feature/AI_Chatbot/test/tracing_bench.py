@@ -0,0 +1,63 @@
+"""
+Tracing overhead benchmark
+Per-span cost with tracing disabled, enabled (metrics only) and enabled
+with JSONL export, and the resulting cost per chat turn
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents.shared.tracing import Tracer
+
+# Spans opened by one single-agent chat turn (chat, user_context, guard,
+# route, agent, generate, format)
+SPANS_PER_TURN = 7
+
+
+def bench(tracer: Tracer, iterations: int) -> float:
+    """Nanoseconds per instrumented stage (span + attribute + cache lookup)"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with tracer.span('stage', model='gemini') as span:
+            span.set(files=3)
+            tracer.cache('bench', True)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark tracing overhead')
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        modes = {
+            'disabled': {'enabled': False},
+            'metrics': {'enabled': True},
+            'jsonl': {'enabled': True, 'path': os.path.join(tmp, 'spans.jsonl')}
+        }
+        for mode, config in modes.items():
+            tracer = Tracer()
+            tracer.configure(**config)
+            ns = bench(tracer, args.iterations)
+            results[mode] = {"ns_per_span": ns, "us_per_turn": ns * SPANS_PER_TURN / 1000}
+            print(f"{mode:<9} {ns:>9.0f} ns/span  {results[mode]['us_per_turn']:>8.1f} us/turn")
+            tracer.configure(enabled=False)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Token usage report
+Top consumers of Gemini tokens from the usage ledger written by the
+chatbot and the HTTP service (agents/shared/usage.py)
+"""
+
+import sys
+import json
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from agents.shared.usage import DEFAULT_USAGE_DB, GROUP_COLUMNS, UsageLedger, ledger
+from agents.shared.mapping_store import open_mapping_store
+
+
+def print_table(rows: List[Dict[str, Any]], group_by: List[str], user_names: Dict[str, str]):
+    """Print report rows as an aligned table"""
+    headers = [*group_by, 'calls', 'prompt', 'cached', 'output', 'cost_usd']
+    lines = []
+    for row in rows:
+        cells = []
+        for column in group_by:
+            value = str(row[column])
+            if column == 'user_id' and value in user_names:
+                value = f"{user_names[value]} ({value})"
+            cells.append(value)
+        cost = row['cost_usd']
+        cells += [
+            f"{row['calls']:,}",
+            f"{row['prompt_tokens']:,}",
+            f"{row['cached_tokens']:,}",
+            f"{row['output_tokens']:,}",
+            f"{cost:.4f}" if cost is not None else "-"
+        ]
+        lines.append(cells)
+
+    widths = [max(len(header), *(len(cells[i]) for cells in lines)) for i, header in enumerate(headers)]
+    numeric = len(group_by)
+    print("  ".join(
+        header.rjust(width) if i >= numeric else header.ljust(width)
+        for i, (header, width) in enumerate(zip(headers, widths))
+    ))
+    for cells in lines:
+        print("  ".join(
+            cell.rjust(width) if i >= numeric else cell.ljust(width)
+            for i, (cell, width) in enumerate(zip(cells, widths))
+        ))
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Gemini token usage by user, agent, model and day')
+    parser.add_argument('--db', default=ledger.path or DEFAULT_USAGE_DB,
+                        help='Usage ledger (default: CHATBOT_USAGE_DB or usage.db)')
+    parser.add_argument('--by', nargs='+', choices=GROUP_COLUMNS, default=['user_id'],
+                        help='Group by these columns (default: user_id)')
+    parser.add_argument('--days', type=int, default=None,
+                        help='Only the last N days, today included (default: all)')
+    parser.add_argument('--since', help='Only days from YYYY-MM-DD on (overrides --days)')
+    parser.add_argument('--top', type=int, default=20,
+                        help='Rows to show, 0 for all (default: 20)')
+    parser.add_argument('--mapping', default='store_mapping.json',
+                        help='Store mapping used to show user names (default: store_mapping.json)')
+    parser.add_argument('--json', action='store_true', help='Print rows as JSON')
+
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"Usage ledger not found: {args.db}", file=sys.stderr)
+        sys.exit(1)
+
+    since = args.since
+    if since is None and args.days:
+        since = (datetime.now(timezone.utc) - timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+
+    report_ledger = UsageLedger(args.db)
+    rows = report_ledger.report(group_by=args.by, since=since, limit=args.top or None)
+    report_ledger.close()
+
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+        return
+
+    if not rows:
+        print("No usage recorded" + (f" since {since}" if since else ""))
+        return
+
+    user_names = {}
+    if 'user_id' in args.by and Path(args.mapping).exists():
+        store = open_mapping_store(args.mapping)
+        user_names = store.list_users()
+        store.close()
+
+    print_table(rows, args.by, user_names)
+
+
+if __name__ == '__main__':
+    main()